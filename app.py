@@ -3,12 +3,28 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date
+from contextlib import closing
+import buscador
+import config
 import db_adapter as db
+import db_async
+import estadisticas
+import exportacion
+import filtros
+import graficos
+import importacion
+import metricas
+import trayectorias
+from errores import ErrorBackend
+from esquema import fila_paciente
 
 # Paleta de colores coordinada para gráficos
 MEDICAL_COLORS = ['#0066cc', '#00a8e1', '#00c9a7', '#28a745', '#20c997', 
                   '#6610f2', '#e83e8c', '#fd7e14', '#ffc107', '#6c757d']
 
+# Notas de evolución por página en "Evolucionar Paciente"
+NOTAS_POR_PAGINA = 10
+
 # Configuración de la página
 st.set_page_config(
     page_title="Registro de Pacientes Neurocriticos - UTI",
@@ -19,6 +35,29 @@ st.set_page_config(
 
 # Inicializar base de datos
 db.init_db()
+# Las figuras memorizadas se descartan en cuanto se escribe un paciente
+db.registrar_al_escribir(graficos.invalidar)
+
+def leer(funcion, *args, **kwargs):
+    """Llama a una lectura de la base; si el backend falló muestra el error y detiene la página"""
+    try:
+        return funcion(*args, **kwargs)
+    except ErrorBackend as e:
+        st.error(f"❌ No se pudo {e.operacion}: la base de datos no responde. "
+                 "Intente nuevamente en unos segundos.")
+        st.stop()
+
+def escribir(funcion, *args, **kwargs):
+    """Llama a una escritura de la base; si el backend falló muestra el error y detiene la página"""
+    try:
+        return funcion(*args, **kwargs)
+    except ErrorBackend as e:
+        if db.es_transitorio(e.causa):
+            st.error(f"❌ No se pudo {e.operacion}: la base de datos no responde. "
+                     "Intente nuevamente en unos segundos.")
+        else:
+            st.error(f"❌ No se pudo {e.operacion}: la base de datos respondió con un error ({e.causa})")
+        st.stop()
 
 # CSS personalizado
 st.markdown("""
@@ -204,6 +243,27 @@ menu = st.sidebar.radio(
 if menu == "Cargar Paciente":
     st.header("📝 Registro de Nuevo Paciente")
     
+    if config.ESCRITURA_DIFERIDA:
+        diario = db.diario()
+        if 'alta_encolada' in st.session_state:
+            st.success(f"✅ Paciente {st.session_state.pop('alta_encolada')} registrado "
+                       "(se guarda en la base en segundo plano)")
+        conflictos = diario.conflictos()
+        rechazados = diario.rechazados()
+        if conflictos or rechazados:
+            st.error(f"❌ {len(conflictos) + len(rechazados)} alta(s) no se pudieron guardar:")
+            for registro in conflictos + rechazados:
+                st.write(f"- {registro['motivo']} (cargada el {registro['encolado'][:16].replace('T', ' ')})")
+            if rechazados and st.button("Reintentar las rechazadas"):
+                diario.reintentar_rechazados()
+                st.rerun()
+            if st.button("Entendido, descartar avisos"):
+                diario.descartar_conflictos()
+                st.rerun()
+        pendientes = diario.pendientes()
+        if pendientes:
+            st.caption(f"⏳ {pendientes} alta(s) esperando enviarse a la base de datos")
+    
     with st.form("formulario_paciente"):
         col1, col2 = st.columns(2)
         
@@ -337,8 +397,7 @@ if menu == "Cargar Paciente":
                 if otras_lesiones:
                     lesiones_str += f" | {otras_lesiones}" if lesiones_str else otras_lesiones
                 
-                # Guardar en la base de datos
-                exito = db.insertar_paciente(
+                campos = dict(
                     numero_historia=numero_historia,
                     edad=edad,
                     sexo=sexo,
@@ -362,7 +421,14 @@ if menu == "Cargar Paciente":
                     observaciones=observaciones
                 )
                 
-                if exito:
+                if config.ESCRITURA_DIFERIDA:
+                    # Se anota en el diario local y el hilo de envío lo guarda en la base
+                    if db.encolar_paciente(**campos):
+                        st.session_state['alta_encolada'] = numero_historia
+                        st.rerun()
+                    else:
+                        st.error(f"❌ La historia clínica {numero_historia} ya está pendiente de guardarse")
+                elif escribir(db.insertar_paciente, **campos):
                     st.success("✅ Paciente registrado exitosamente!")
                     st.info("👉 Recargando formulario para nuevo paciente...")
                     import time
@@ -370,35 +436,81 @@ if menu == "Cargar Paciente":
                     st.rerun()
                 else:
                     st.error("❌ Error: Ya existe un paciente con ese número de historia clínica")
+    
+    # Importación masiva de cohortes históricas
+    st.markdown("---")
+    with st.expander("📤 Importación masiva desde CSV o Excel"):
+        st.write("El archivo debe tener una fila de encabezado con los nombres de las columnas "
+                 "(numero_historia, edad, sexo, fecha_ingreso, diagnostico, origen_tec, dias_uti, "
+                 "glasgow_ingreso y opcionalmente el resto de los campos del formulario).")
+        archivo = st.file_uploader("Archivo de pacientes", type=["csv", "xlsx"])
+        
+        if archivo is not None and st.button("📥 Importar pacientes", type="primary"):
+            estado = st.empty()
+            
+            def mostrar_progreso(leidos, insertados):
+                estado.info(f"⏳ Filas procesadas: {leidos} — pacientes insertados: {insertados}")
+            
+            resumen, errores = leer(
+                importacion.importar_pacientes,
+                archivo, archivo.name,
+                tamano_lote=config.IMPORTACION_TAMANO_LOTE,
+                progreso=mostrar_progreso
+            )
+            
+            estado.success(f"✅ Importación finalizada: {resumen['insertados']} pacientes insertados "
+                           f"de {resumen['leidos']} filas leídas")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Ya existentes", resumen['existentes'])
+            with col2:
+                st.metric("Filas inválidas", resumen['invalidos'])
+            with col3:
+                st.metric("Fallidos (error de red)", resumen['fallidos'])
+            
+            if not errores.empty:
+                st.warning("⚠️ Algunas filas no se importaron:")
+                st.dataframe(errores, use_container_width=True, height=200)
 
 # ==================== EVOLUCIONAR PACIENTE ====================
 elif menu == "Evolucionar Paciente":
     st.header("📈 Evolución de Paciente")
     
-    # Obtener lista de pacientes
-    df = db.obtener_todos_pacientes()
+    # Seleccionar paciente
+    st.subheader("Seleccionar Paciente")
+    busqueda = st.text_input(
+        "Buscar por número de historia",
+        placeholder="Escriba el comienzo del número de historia...",
+        help=f"Se muestran hasta {buscador.LIMITE} coincidencias; sin búsqueda, los ingresos más recientes"
+    )
     
-    if df.empty:
-        st.warning("⚠️ No hay pacientes registrados aún.")
+    # Las filas encontradas ya traen todo lo que usa la página (perfil 'evolucion')
+    if config.BUSQUEDA_EN_SERVIDOR:
+        coincidencias = leer(db.buscar_pacientes, busqueda.strip(), buscador.LIMITE)
     else:
-        # Seleccionar paciente
-        st.subheader("Seleccionar Paciente")
-        
-        # Crear lista de opciones con HC y nombre para mejor identificación
-        opciones_pacientes = [f"{row['numero_historia']} - {row['diagnostico'][:50]}" for _, row in df.iterrows()]
-        paciente_seleccionado = st.selectbox(
+        pacientes = leer(db.obtener_todos_pacientes, 'evolucion')
+        coincidencias = buscador.buscar(pacientes, db.version_de(pacientes), busqueda)
+    
+    if coincidencias.empty:
+        if busqueda.strip():
+            st.warning("⚠️ No hay pacientes con ese número de historia.")
+        else:
+            st.warning("⚠️ No hay pacientes registrados aún.")
+    else:
+        diagnosticos = dict(zip(coincidencias['numero_historia'], coincidencias['diagnostico'].fillna('')))
+        numero_historia = st.selectbox(
             "Historia Clínica",
-            opciones_pacientes,
+            list(diagnosticos),
+            format_func=lambda hc: f"{hc} - {diagnosticos[hc][:50]}",
             help="Seleccione el paciente a evolucionar"
         )
         
-        if paciente_seleccionado:
-            # Extraer número de historia
-            numero_historia = paciente_seleccionado.split(" - ")[0]
-            paciente_df = db.obtener_paciente_por_historia(numero_historia)
+        if numero_historia:
+            paciente_df = coincidencias[coincidencias['numero_historia'] == numero_historia]
             
             if not paciente_df.empty:
-                paciente = paciente_df.iloc[0]
+                # None en lugar de NA: llevaba_casco es tri-estado y las categorías vacías son NaN
+                paciente = fila_paciente(paciente_df)
                 
                 # Mostrar información actual del paciente
                 st.markdown("---")
@@ -440,6 +552,43 @@ elif menu == "Evolucionar Paciente":
                 with col3:
                     st.write(f"Cognitiva: {'✅' if paciente.get('secuelas_cognitiva') else '❌'}")
                 
+                # Historial de notas: se lee de a páginas, la más reciente primero
+                st.markdown("---")
+                st.subheader("🗒️ Notas de Evolución")
+                clave_notas = f"notas_{numero_historia}"
+                if clave_notas not in st.session_state:
+                    notas = leer(db.obtener_notas_paciente, numero_historia, limite=NOTAS_POR_PAGINA)
+                    # Una página incompleta es la última
+                    st.session_state[clave_notas] = {
+                        'notas': notas, 'quedan': len(notas) == NOTAS_POR_PAGINA, 'ingreso': None
+                    }
+                historial = st.session_state[clave_notas]
+                notas = historial['notas']
+                
+                if notas.empty:
+                    st.info("Sin notas de evolución registradas")
+                for _, nota in notas.iterrows():
+                    fecha_nota = pd.Timestamp(nota['fecha_evolucion']).strftime("%Y-%m-%d %H:%M")
+                    st.markdown(f"**[{fecha_nota}]** {nota['observacion']}")
+                
+                quedan_notas = historial['quedan']
+                if historial['ingreso'] is not None:
+                    st.markdown(f"**Observaciones del ingreso:** {historial['ingreso'] or 'Sin observaciones'}")
+                elif st.button("📜 Cargar notas anteriores" if quedan_notas else "📜 Ver observaciones del ingreso"):
+                    if quedan_notas:
+                        anteriores = leer(
+                            db.obtener_notas_paciente, numero_historia,
+                            antes_de_id=int(notas['id'].iloc[-1]), limite=NOTAS_POR_PAGINA
+                        )
+                        historial['notas'] = pd.concat([notas, anteriores], ignore_index=True)
+                        historial['quedan'] = len(anteriores) == NOTAS_POR_PAGINA
+                    else:
+                        # Texto cargado al registrar al paciente (y el historial anterior a las notas)
+                        detalle = leer(db.obtener_paciente_por_historia, numero_historia)
+                        ingreso = detalle['observaciones'].iloc[0] if not detalle.empty else None
+                        historial['ingreso'] = ingreso if isinstance(ingreso, str) else ''
+                    st.rerun()
+                
                 # Formulario de evolución
                 st.markdown("---")
                 st.subheader("🔄 Actualizar Evolución")
@@ -556,26 +705,16 @@ elif menu == "Evolucionar Paciente":
                             value=bool(paciente.get('secuelas_cognitiva', False))
                         )
                     
-                    # Observaciones de evolución
+                    # Nota de evolución (se agrega al historial, no reescribe las anteriores)
                     st.markdown("---")
                     st.markdown("**Observaciones de Evolución**")
                     
-                    col1, col2 = st.columns([1, 1])
-                    with col1:
-                        st.text_area(
-                            "Observaciones anteriores (Solo lectura)",
-                            value=paciente['observaciones'] if paciente['observaciones'] else "Sin observaciones previas",
-                            disabled=True,
-                            height=100
-                        )
-                    
-                    with col2:
-                        nueva_observacion = st.text_area(
-                            "Nueva observación*",
-                            placeholder="Ej: Paciente presenta mejoría clínica, disminución de sedación...",
-                            help="Agregue notas sobre la evolución actual",
-                            height=100
-                        )
+                    nueva_observacion = st.text_area(
+                        "Nueva observación*",
+                        placeholder="Ej: Paciente presenta mejoría clínica, disminución de sedación...",
+                        help="Agregue notas sobre la evolución actual",
+                        height=100
+                    )
                     
                     st.markdown("---")
                     
@@ -591,13 +730,9 @@ elif menu == "Evolucionar Paciente":
                         if not nueva_observacion:
                             st.error("⚠️ Por favor agregue una observación de la evolución")
                         else:
-                            # Preparar observaciones actualizadas
-                            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-                            observaciones_actualizadas = paciente['observaciones'] if paciente['observaciones'] else ""
-                            observaciones_actualizadas += f"\n\n[{timestamp}] {nueva_observacion}"
-                            
-                            # Actualizar en base de datos
-                            exito = db.actualizar_paciente(
+                            # Actualizar en base de datos (la nota viaja sola, en la fila de evolución)
+                            exito = escribir(
+                                db.actualizar_paciente,
                                 numero_historia=numero_historia,
                                 dias_uti=nuevos_dias_uti,
                                 glasgow_actual=nuevo_glasgow,
@@ -611,39 +746,56 @@ elif menu == "Evolucionar Paciente":
                                 secuelas_motora=nueva_secuela_motora,
                                 secuelas_neurologica=nueva_secuela_neurologica,
                                 secuelas_cognitiva=nueva_secuela_cognitiva,
-                                observaciones=observaciones_actualizadas
+                                nota=nueva_observacion
                             )
                             
                             if exito:
+                                # Releer el historial con la nota nueva
+                                st.session_state.pop(clave_notas, None)
                                 st.success("✅ Evolución actualizada exitosamente!")
                                 st.rerun()
                             else:
-                                st.error("❌ Error al actualizar la evolución")
+                                st.error("❌ No se encontró el paciente para actualizar la evolución")
 
 # ==================== ESTADÍSTICAS ====================
 elif menu == "Ver Estadísticas":
     st.header("📊 Estadísticas y Análisis")
     
-    # Obtener datos
-    df = db.obtener_todos_pacientes()
+    # Período de ingreso: se filtra en la consulta, no sobre todos los pacientes
+    periodo = st.date_input("Período de ingreso (desde - hasta)", value=(),
+                            help="Vacío para ver todos los pacientes")
+    fecha_desde, fecha_hasta = periodo if len(periodo) == 2 else (None, None)
     
-    if df.empty:
+    # Las consultas se piden a la vez: la espera es la de la más lenta
+    datos = leer(db_async.en_paralelo,
+                 pacientes=db_async.obtener_todos_pacientes('estadisticas', fecha_desde, fecha_hasta),
+                 evoluciones=db_async.obtener_todas_evoluciones(),
+                 mensual=db_async.obtener_ingresos_mensuales(fecha_desde, fecha_hasta))
+    df = datos['pacientes']
+    # Los resúmenes y gráficos se memorizan por la versión con que se cargaron los
+    # datos recibidos (no por una leída antes de pedirlos) y por el período
+    version = (db.version_de(df), fecha_desde, fecha_hasta)
+    
+    if df.empty and fecha_desde is not None:
+        st.warning("⚠️ No hay pacientes ingresados en el período elegido.")
+    elif df.empty:
         st.warning("⚠️ No hay datos registrados aún. Comience cargando pacientes.")
     else:
+        resumen = estadisticas.obtener_resumen(df, version)
+        
         # Métricas principales
         col1, col2, col3, col4, col5 = st.columns(5)
         
         with col1:
-            st.metric("Total Pacientes", len(df))
+            st.metric("Total Pacientes", resumen.total)
         with col2:
-            st.metric("Con PIC", df['requiere_pic'].sum())
+            st.metric("Con PIC", resumen.intervenciones['PIC'])
         with col3:
-            st.metric("Con ARM", df['requiere_arm'].sum())
+            st.metric("Con ARM", resumen.intervenciones['ARM'])
         with col4:
-            st.metric("Craniectomía", df['requiere_cranectomia'].sum())
+            st.metric("Craniectomía", resumen.intervenciones['Craniectomía'])
         with col5:
-            drenajes = df['tiene_drenaje'].sum() if 'tiene_drenaje' in df.columns else 0
-            st.metric("Con Drenaje", drenajes)
+            st.metric("Con Drenaje", resumen.intervenciones.get('Drenaje', 0))
         
         st.markdown("---")
         
@@ -653,52 +805,56 @@ elif menu == "Ver Estadísticas":
         with col1:
             # Origen del TEC
             st.subheader("🚑 Origen del TEC")
-            origen_counts = df['origen_tec'].value_counts()
-            fig1 = px.pie(values=origen_counts.values, names=origen_counts.index, 
-                         hole=0.4, color_discrete_sequence=MEDICAL_COLORS)
-            fig1.update_traces(textposition='inside', textinfo='percent+label',
-                             textfont_size=14, marker=dict(line=dict(color='white', width=2)))
-            fig1.update_layout(font=dict(size=13))
-            st.plotly_chart(fig1, use_container_width=True)
+            def grafico_origen():
+                origen_counts = resumen.origen_counts
+                fig1 = px.pie(values=origen_counts.values, names=origen_counts.index, 
+                             hole=0.4, color_discrete_sequence=MEDICAL_COLORS)
+                fig1.update_traces(textposition='inside', textinfo='percent+label',
+                                 textfont_size=14, marker=dict(line=dict(color='white', width=2)))
+                fig1.update_layout(font=dict(size=13))
+                return fig1
+            st.plotly_chart(graficos.figura('origen', version, grafico_origen), use_container_width=True)
             
             # Distribución por sexo
             st.subheader("👥 Distribución por Sexo")
-            sexo_counts = df['sexo'].value_counts()
-            fig3 = px.bar(x=sexo_counts.index, y=sexo_counts.values,
-                         labels={'x': 'Sexo', 'y': 'Cantidad'},
-                         color=sexo_counts.index,
-                         color_discrete_map={'Masculino': '#0066cc', 'Femenino': '#e83e8c'})
-            fig3.update_layout(showlegend=False, font=dict(size=13))
-            fig3.update_traces(marker=dict(line=dict(color='white', width=2)))
-            st.plotly_chart(fig3, use_container_width=True)
+            def grafico_sexo():
+                sexo_counts = resumen.sexo_counts
+                fig3 = px.bar(x=sexo_counts.index, y=sexo_counts.values,
+                             labels={'x': 'Sexo', 'y': 'Cantidad'},
+                             color=sexo_counts.index,
+                             color_discrete_map={'Masculino': '#0066cc', 'Femenino': '#e83e8c'})
+                fig3.update_layout(showlegend=False, font=dict(size=13))
+                fig3.update_traces(marker=dict(line=dict(color='white', width=2)))
+                return fig3
+            st.plotly_chart(graficos.figura('sexo', version, grafico_sexo), use_container_width=True)
         
         with col2:
             # Intervenciones
             st.subheader("⚕️ Intervenciones Realizadas")
-            intervenciones = {
-                'PIC': df['requiere_pic'].sum(),
-                'ARM': df['requiere_arm'].sum(),
-                'Craniectomía': df['requiere_cranectomia'].sum()
-            }
-            if 'tiene_drenaje' in df.columns:
-                intervenciones['Drenaje'] = df['tiene_drenaje'].sum()
-            
-            fig2 = px.bar(x=list(intervenciones.keys()), y=list(intervenciones.values()),
-                         labels={'x': 'Intervención', 'y': 'Cantidad de Pacientes'},
-                         color=list(intervenciones.keys()),
-                         color_discrete_sequence=MEDICAL_COLORS)
-            fig2.update_layout(showlegend=False, font=dict(size=13))
-            fig2.update_traces(marker=dict(line=dict(color='white', width=2)))
-            st.plotly_chart(fig2, use_container_width=True)
+            def grafico_intervenciones():
+                intervenciones = resumen.intervenciones
+                
+                fig2 = px.bar(x=list(intervenciones.keys()), y=list(intervenciones.values()),
+                             labels={'x': 'Intervención', 'y': 'Cantidad de Pacientes'},
+                             color=list(intervenciones.keys()),
+                             color_discrete_sequence=MEDICAL_COLORS)
+                fig2.update_layout(showlegend=False, font=dict(size=13))
+                fig2.update_traces(marker=dict(line=dict(color='white', width=2)))
+                return fig2
+            st.plotly_chart(graficos.figura('intervenciones', version, grafico_intervenciones),
+                            use_container_width=True)
             
             # Distribución de edad
             st.subheader("📊 Distribución por Edad")
-            fig4 = px.histogram(df, x='edad', nbins=20,
-                              labels={'edad': 'Edad', 'count': 'Frecuencia'},
-                              color_discrete_sequence=['#0066cc'])
-            fig4.update_layout(font=dict(size=13))
-            fig4.update_traces(marker=dict(line=dict(color='white', width=1)))
-            st.plotly_chart(fig4, use_container_width=True)
+            def grafico_edad(nbins):
+                fig4 = px.histogram(resumen.distribuciones, x='edad', nbins=nbins,
+                                  labels={'edad': 'Edad', 'count': 'Frecuencia'},
+                                  color_discrete_sequence=['#0066cc'])
+                fig4.update_layout(font=dict(size=13))
+                fig4.update_traces(marker=dict(line=dict(color='white', width=1)))
+                return fig4
+            st.plotly_chart(graficos.figura('edad', version, lambda: grafico_edad(20), nbins=20),
+                            use_container_width=True)
         
         st.markdown("---")
         
@@ -708,32 +864,35 @@ elif menu == "Ver Estadísticas":
         with col1:
             # Glasgow al ingreso
             st.subheader("Glasgow al Ingreso")
-            fig5 = px.histogram(df, x='glasgow_ingreso', nbins=13,
-                              labels={'glasgow_ingreso': 'Puntaje Glasgow', 'count': 'Frecuencia'},
-                              color_discrete_sequence=['#bcbd22'])
-            st.plotly_chart(fig5, use_container_width=True)
+            def grafico_glasgow(nbins):
+                return px.histogram(resumen.distribuciones, x='glasgow_ingreso', nbins=nbins,
+                                    labels={'glasgow_ingreso': 'Puntaje Glasgow', 'count': 'Frecuencia'},
+                                    color_discrete_sequence=['#bcbd22'])
+            st.plotly_chart(graficos.figura('glasgow_ingreso', version, lambda: grafico_glasgow(13), nbins=13),
+                            use_container_width=True)
         
         with col2:
             # Días en UTI
             st.subheader("Días de Evolución en UTI")
-            fig6 = px.box(df, y='dias_uti',
-                         labels={'dias_uti': 'Días'},
-                         color_discrete_sequence=['#e377c2'])
-            st.plotly_chart(fig6, use_container_width=True)
+            def grafico_dias_uti():
+                return px.box(resumen.distribuciones, y='dias_uti',
+                              labels={'dias_uti': 'Días'},
+                              color_discrete_sequence=['#e377c2'])
+            st.plotly_chart(graficos.figura('dias_uti', version, grafico_dias_uti), use_container_width=True)
         
         st.markdown("---")
         
         # Evolución temporal
         st.subheader("Ingresos a lo largo del tiempo")
-        df['fecha_ingreso'] = pd.to_datetime(df['fecha_ingreso'])
-        ingresos_tiempo = df.groupby(df['fecha_ingreso'].dt.to_period('M')).size().reset_index()
-        ingresos_tiempo.columns = ['Mes', 'Cantidad']
-        ingresos_tiempo['Mes'] = ingresos_tiempo['Mes'].astype(str)
-        
-        fig7 = px.line(ingresos_tiempo, x='Mes', y='Cantidad',
-                      labels={'Mes': 'Mes', 'Cantidad': 'Número de Ingresos'},
-                      markers=True)
-        st.plotly_chart(fig7, use_container_width=True)
+        # Una fila por mes del resumen ingresos_mensuales (meses completos del período)
+        def grafico_ingresos():
+            series = {'ingresos': 'Ingresos', 'con_pic': 'Con PIC', 'con_arm': 'Con ARM', 'obitos': 'Óbitos'}
+            mensual = datos['mensual'].rename(columns={'mes': 'Mes', **series})
+            return px.line(mensual, x='Mes', y=list(series.values()),
+                           labels={'value': 'Pacientes', 'variable': ''},
+                           markers=True)
+        st.plotly_chart(graficos.figura('ingresos_por_mes', (db.version_de(datos['mensual']), fecha_desde, fecha_hasta),
+                                        grafico_ingresos), use_container_width=True)
         
         # Nuevos gráficos para campos agregados
         st.markdown("---")
@@ -743,25 +902,27 @@ elif menu == "Ver Estadísticas":
         
         with col1:
             # Destino post-UTI
-            if 'destino_post_uti' in df.columns:
+            if resumen.destino_counts is not None:
                 st.subheader("Destino después de UTI")
-                destino_counts = df['destino_post_uti'].value_counts()
-                fig8 = px.pie(values=destino_counts.values, names=destino_counts.index,
-                            hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel)
-                fig8.update_traces(textposition='inside', textinfo='percent+label')
-                st.plotly_chart(fig8, use_container_width=True)
+                def grafico_destino():
+                    destino_counts = resumen.destino_counts
+                    fig8 = px.pie(values=destino_counts.values, names=destino_counts.index,
+                                hole=0.4, color_discrete_sequence=px.colors.qualitative.Pastel)
+                    fig8.update_traces(textposition='inside', textinfo='percent+label')
+                    return fig8
+                st.plotly_chart(graficos.figura('destino', version, grafico_destino), use_container_width=True)
             
             # Tipos de drenaje
-            if 'tipo_drenaje' in df.columns:
+            if resumen.drenaje_counts is not None:
                 st.subheader("Tipos de Drenaje Utilizados")
-                df_con_drenaje = df[df['tiene_drenaje'] == True]
-                if len(df_con_drenaje) > 0:
-                    drenaje_counts = df_con_drenaje['tipo_drenaje'].value_counts()
-                    fig9 = px.bar(x=drenaje_counts.index, y=drenaje_counts.values,
-                                labels={'x': 'Tipo de Drenaje', 'y': 'Cantidad'},
-                                color=drenaje_counts.index,
-                                color_discrete_sequence=['#ff9999', '#66b3ff'])
-                    st.plotly_chart(fig9, use_container_width=True)
+                if len(resumen.drenaje_counts) > 0:
+                    def grafico_drenaje():
+                        drenaje_counts = resumen.drenaje_counts
+                        return px.bar(x=drenaje_counts.index, y=drenaje_counts.values,
+                                      labels={'x': 'Tipo de Drenaje', 'y': 'Cantidad'},
+                                      color=drenaje_counts.index,
+                                      color_discrete_sequence=['#ff9999', '#66b3ff'])
+                    st.plotly_chart(graficos.figura('drenaje', version, grafico_drenaje), use_container_width=True)
                 else:
                     st.info("No hay pacientes con drenaje registrado")
         
@@ -769,11 +930,10 @@ elif menu == "Ver Estadísticas":
             # Uso de casco en accidentes de moto
             if 'llevaba_casco' in df.columns:
                 st.subheader("Uso de Casco en Accidentes de Moto")
-                df_motos = df[df['origen_tec'].str.contains('moto', case=False, na=False)]
                 
-                if len(df_motos) > 0:
+                if resumen.total_motos > 0 and resumen.casco_counts is not None:
                     # Contar casos con y sin casco
-                    casco_counts = df_motos['llevaba_casco'].value_counts()
+                    casco_counts = resumen.casco_counts
                     
                     # Crear labels personalizados
                     labels = []
@@ -790,51 +950,52 @@ elif menu == "Ver Estadísticas":
                         values.append(casco_counts[False])
                         colors.append('#e74c3c')  # Rojo
                     
-                    fig_casco = px.pie(
-                        values=values, 
-                        names=labels,
-                        title=f"Total accidentes de moto: {len(df_motos)}",
-                        color_discrete_sequence=colors
-                    )
-                    fig_casco.update_traces(textposition='inside', textinfo='percent+label')
-                    st.plotly_chart(fig_casco, use_container_width=True)
+                    def grafico_casco():
+                        fig_casco = px.pie(
+                            values=values, 
+                            names=labels,
+                            title=f"Total accidentes de moto: {resumen.total_motos}",
+                            color_discrete_sequence=colors
+                        )
+                        fig_casco.update_traces(textposition='inside', textinfo='percent+label')
+                        return fig_casco
+                    st.plotly_chart(graficos.figura('casco', version, grafico_casco), use_container_width=True)
                     
                     # Métricas adicionales
                     col_a, col_b = st.columns(2)
                     with col_a:
-                        pct_con_casco = (casco_counts.get(True, 0) / len(df_motos) * 100)
+                        pct_con_casco = (casco_counts.get(True, 0) / resumen.total_motos * 100)
                         st.metric("% Con casco", f"{pct_con_casco:.1f}%")
                     with col_b:
-                        pct_sin_casco = (casco_counts.get(False, 0) / len(df_motos) * 100)
+                        pct_sin_casco = (casco_counts.get(False, 0) / resumen.total_motos * 100)
                         st.metric("% Sin casco", f"{pct_sin_casco:.1f}%")
                 else:
                     st.info("No hay accidentes de moto registrados")
             
             # Secuelas
-            if all(col in df.columns for col in ['secuelas_motora', 'secuelas_neurologica', 'secuelas_cognitiva']):
+            if resumen.secuelas is not None:
                 st.subheader("Secuelas Presentadas")
-                secuelas_data = {
-                    'Motora': df['secuelas_motora'].sum(),
-                    'Neurológica': df['secuelas_neurologica'].sum(),
-                    'Cognitiva': df['secuelas_cognitiva'].sum()
-                }
-                fig10 = px.bar(x=list(secuelas_data.keys()), y=list(secuelas_data.values()),
-                             labels={'x': 'Tipo de Secuela', 'y': 'Cantidad de Pacientes'},
-                             color=list(secuelas_data.keys()),
-                             color_discrete_sequence=['#ff6b6b', '#4ecdc4', '#45b7d1'])
-                st.plotly_chart(fig10, use_container_width=True)
+                def grafico_secuelas():
+                    secuelas_data = resumen.secuelas
+                    return px.bar(x=list(secuelas_data.keys()), y=list(secuelas_data.values()),
+                                  labels={'x': 'Tipo de Secuela', 'y': 'Cantidad de Pacientes'},
+                                  color=list(secuelas_data.keys()),
+                                  color_discrete_sequence=['#ff6b6b', '#4ecdc4', '#45b7d1'])
+                st.plotly_chart(graficos.figura('secuelas', version, grafico_secuelas), use_container_width=True)
             
             # Uso de casco en accidentes de moto
             if 'llevaba_casco' in df.columns:
                 st.subheader("Uso de Casco en Accidentes de Moto")
-                df_motos = df[df['origen_tec'].str.contains('moto', case=False, na=False)]
-                if len(df_motos) > 0 and df_motos['llevaba_casco'].notna().any():
-                    casco_counts = df_motos['llevaba_casco'].value_counts()
-                    labels_casco = ['Con Casco' if x else 'Sin Casco' for x in casco_counts.index]
-                    fig11 = px.pie(values=casco_counts.values, names=labels_casco,
-                                 color_discrete_map={'Con Casco': '#2ecc71', 'Sin Casco': '#e74c3c'})
-                    fig11.update_traces(textposition='inside', textinfo='percent+label')
-                    st.plotly_chart(fig11, use_container_width=True)
+                if resumen.total_motos > 0 and resumen.casco_counts is not None:
+                    def grafico_casco_resumen():
+                        casco_counts = resumen.casco_counts
+                        labels_casco = ['Con Casco' if x else 'Sin Casco' for x in casco_counts.index]
+                        fig11 = px.pie(values=casco_counts.values, names=labels_casco,
+                                     color_discrete_map={'Con Casco': '#2ecc71', 'Sin Casco': '#e74c3c'})
+                        fig11.update_traces(textposition='inside', textinfo='percent+label')
+                        return fig11
+                    st.plotly_chart(graficos.figura('casco_resumen', version, grafico_casco_resumen),
+                                    use_container_width=True)
                 else:
                     st.info("No hay datos de uso de casco registrados")
         
@@ -846,55 +1007,193 @@ elif menu == "Ver Estadísticas":
         
         with col1:
             st.write("**Edad**")
-            st.write(f"Media: {df['edad'].mean():.1f} años")
-            st.write(f"Mediana: {df['edad'].median():.1f} años")
-            st.write(f"Rango: {df['edad'].min()}-{df['edad'].max()} años")
+            st.write(f"Media: {resumen.edad['mean']:.1f} años")
+            st.write(f"Mediana: {resumen.edad['median']:.1f} años")
+            st.write(f"Rango: {resumen.edad['min']}-{resumen.edad['max']} años")
         
         with col2:
             st.write("**Días en UTI**")
-            st.write(f"Media: {df['dias_uti'].mean():.1f} días")
-            st.write(f"Mediana: {df['dias_uti'].median():.1f} días")
-            st.write(f"Máximo: {df['dias_uti'].max()} días")
+            st.write(f"Media: {resumen.dias_uti['mean']:.1f} días")
+            st.write(f"Mediana: {resumen.dias_uti['median']:.1f} días")
+            st.write(f"Máximo: {resumen.dias_uti['max']} días")
         
         with col3:
             st.write("**Glasgow al Ingreso**")
-            st.write(f"Media: {df['glasgow_ingreso'].mean():.1f}")
-            st.write(f"Mediana: {df['glasgow_ingreso'].median():.1f}")
-            st.write(f"Moda: {df['glasgow_ingreso'].mode()[0]}")
+            st.write(f"Media: {resumen.glasgow_ingreso['mean']:.1f}")
+            st.write(f"Mediana: {resumen.glasgow_ingreso['median']:.1f}")
+            st.write(f"Moda: {resumen.glasgow_ingreso['mode']}")
+
+        # Trayectorias de la cohorte (tabla evoluciones)
+        st.markdown("---")
+        st.subheader("📉 Trayectorias de la Cohorte")
+
+        evoluciones = datos['evoluciones']
+        if not evoluciones.empty:
+            # Depende de pacientes y evoluciones: se memoriza por las dos versiones
+            version_tray = (version, db.version_de(evoluciones))
+            tray = trayectorias.obtener_trayectorias(evoluciones, df, version_tray)
+
+        if evoluciones.empty:
+            st.info("No hay evoluciones registradas todavía")
+        elif not tray.pacientes:
+            # Las evoluciones son de pacientes fuera del período o sin fecha de ingreso
+            st.info("Ningún paciente ingresado en el período tiene evoluciones registradas")
+        else:
+            por_paciente = tray.por_paciente
+
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Pacientes con evoluciones", tray.pacientes)
+            with col2:
+                dias_arm = por_paciente.loc[por_paciente['dias_arm'] > 0, 'dias_arm']
+                st.metric("Mediana días en ARM", f"{dias_arm.median():.1f}" if len(dias_arm) else "-")
+            with col3:
+                dias_pic = por_paciente.loc[por_paciente['dias_pic'] > 0, 'dias_pic']
+                st.metric("Mediana días con PIC", f"{dias_pic.median():.1f}" if len(dias_pic) else "-")
+            with col4:
+                mejoraron = por_paciente['dias_hasta_mejoria'].dropna()
+                st.metric(f"Mejoraron (Glasgow +{trayectorias.MEJORA_GLASGOW})",
+                          f"{len(mejoraron) / tray.pacientes * 100:.1f}%",
+                          help=f"Mediana: {mejoraron.median():.0f} días" if len(mejoraron) else None)
+
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.write("**Glasgow por día de internación según gravedad al ingreso**")
+                def grafico_trayectoria_glasgow():
+                    fig = go.Figure()
+                    colores = dict(zip(trayectorias.GRAVEDAD.categories, ['#d62728', '#ff7f0e', '#2ca02c']))
+                    for grupo, curva in tray.curva_glasgow.groupby('grupo', observed=True):
+                        # Banda intercuartil y mediana
+                        fig.add_trace(go.Scatter(x=curva['dia'], y=curva['q3'], mode='lines',
+                                                 line=dict(width=0), showlegend=False, hoverinfo='skip'))
+                        fig.add_trace(go.Scatter(x=curva['dia'], y=curva['q1'], mode='lines',
+                                                 line=dict(width=0), fill='tonexty', opacity=0.2,
+                                                 fillcolor=colores[grupo], showlegend=False, hoverinfo='skip'))
+                        fig.add_trace(go.Scatter(x=curva['dia'], y=curva['mediana'], mode='lines+markers',
+                                                 name=grupo, line=dict(color=colores[grupo]),
+                                                 customdata=curva['pacientes'],
+                                                 hovertemplate='Día %{x}: %{y} (n=%{customdata})'))
+                    fig.update_layout(xaxis_title='Día de internación', yaxis_title='Glasgow (mediana)',
+                                      yaxis_range=[3, 15])
+                    return fig
+                st.plotly_chart(graficos.figura('trayectoria_glasgow', version_tray, grafico_trayectoria_glasgow),
+                                use_container_width=True)
+
+            with col2:
+                st.write("**Pacientes con mejoría del Glasgow (acumulado)**")
+                def grafico_mejoria():
+                    return px.line(tray.curva_mejoria, x='dia', y='porcentaje', line_shape='hv',
+                                   labels={'dia': 'Día de internación', 'porcentaje': '% de pacientes'})
+                st.plotly_chart(graficos.figura('mejoria', version_tray, grafico_mejoria), use_container_width=True)
 
 # ==================== BASE DE DATOS ====================
 elif menu == "Base de Datos":
     st.header("🗃️ Base de Datos de Pacientes")
     
-    df = db.obtener_todos_pacientes()
+    # Paginada: se trae del servidor solo la página visible, ya filtrada y ordenada
+    modo = st.radio("Vista", ["Tabla completa", "Paginada"], horizontal=True,
+                    help="La vista paginada mantiene liviana la página con registros grandes")
+    paginada = modo == "Paginada"
+    en_servidor = config.FILTROS_EN_SERVIDOR or paginada
+    
+    if en_servidor:
+        # Opciones y límites de los filtros desde el resumen agregado, sin cargar pacientes
+        stats = leer(db.obtener_estadisticas)
+        total = stats.get('total_pacientes', 0)
+        opciones = {col: sorted(stats.get(f'por_{col}', {})) for col in ['sexo', 'origen_tec', 'destino_post_uti']}
+        edad_max = int(stats.get('edad_max', 0))
+        dias_max = int(stats.get('dias_uti_max', 0))
+    else:
+        df = leer(db.obtener_todos_pacientes)
+        version = db.version_de(df)
+        total = len(df)
+        if not df.empty:
+            indice = filtros.obtener_indice(df, version)
+            opciones = {col: indice.valores(col) for col in ['sexo', 'origen_tec', 'destino_post_uti']}
+            edad_max = int(indice.limites('edad')[1])
+            dias_max = int(indice.limites('dias_uti')[1])
     
-    if df.empty:
+    if not total:
         st.info("ℹ️ No hay pacientes registrados aún.")
     else:
-        st.write(f"**Total de registros:** {len(df)}")
+        st.write(f"**Total de registros:** {total}")
+        edad_max, dias_max = max(edad_max, 1), max(dias_max, 1)
         
         # Filtros
         with st.expander("🔍 Filtros"):
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                filtro_sexo = st.multiselect("Sexo", df['sexo'].unique())
+                filtro_sexo = st.multiselect("Sexo", opciones['sexo'])
             with col2:
-                filtro_pic = st.selectbox("PIC", ["Todos", "Sí", "No"])
+                filtro_origen = st.multiselect("Origen TEC", opciones['origen_tec'])
             with col3:
-                filtro_arm = st.selectbox("ARM", ["Todos", "Sí", "No"])
-        
-        # Aplicar filtros
-        df_filtrado = df.copy()
+                filtro_destino = st.multiselect("Destino post-UTI", opciones['destino_post_uti'])
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                filtro_edad = st.slider("Edad", 0, edad_max, (0, edad_max))
+                filtro_dias = st.slider("Días en UTI", 0, dias_max, (0, dias_max))
+            with col2:
+                filtro_glasgow_ingreso = st.slider("Glasgow al ingreso", 3, 15, (3, 15))
+                filtro_glasgow_actual = st.slider("Glasgow actual", 3, 15, (3, 15))
+            with col3:
+                filtro_fecha = st.date_input("Fecha de ingreso (desde - hasta)", value=())
+            
+            columnas = st.columns(4)
+            filtros_si_no = {}
+            for i, (col, nombre) in enumerate(filtros.BOOLEANAS.items()):
+                with columnas[i % 4]:
+                    filtros_si_no[col] = st.selectbox(nombre, ["Todos", "Sí", "No"], key=f"filtro_{col}")
         
-        if filtro_sexo:
-            df_filtrado = df_filtrado[df_filtrado['sexo'].isin(filtro_sexo)]
+        # Armar el filtro: solo las condiciones que el usuario cambió
+        seleccion = {}
+        for col, valores in [('sexo', filtro_sexo), ('origen_tec', filtro_origen), ('destino_post_uti', filtro_destino)]:
+            if valores:
+                seleccion[col] = valores
+        for col, valor in filtros_si_no.items():
+            if valor != "Todos":
+                seleccion[col] = valor == "Sí"
+        for col, rango, completo in [('edad', filtro_edad, (0, edad_max)), ('dias_uti', filtro_dias, (0, dias_max)),
+                                     ('glasgow_ingreso', filtro_glasgow_ingreso, (3, 15)),
+                                     ('glasgow_actual', filtro_glasgow_actual, (3, 15))]:
+            if tuple(rango) != completo:
+                seleccion[col] = tuple(rango)
+        if len(filtro_fecha) == 2:
+            seleccion['fecha_ingreso'] = tuple(filtro_fecha)
         
-        if filtro_pic != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['requiere_pic'] == (filtro_pic == "Sí")]
+        # Aplicar filtros
+        if paginada:
+            col1, col2, col3 = st.columns([2, 1, 1])
+            with col1:
+                orden = st.selectbox("Ordenar por", list(filtros.ORDENABLES), format_func=filtros.ORDENABLES.get)
+            with col2:
+                descendente = st.radio("Sentido", ["Descendente", "Ascendente"]) == "Descendente"
+            
+            # Conteo sin traer filas; el total sin filtros ya está en el resumen
+            cantidad = leer(db.contar_pacientes, seleccion) if seleccion else total
+            paginas = max(-(-cantidad // config.TABLA_TAMANO_PAGINA), 1)
+            with col3:
+                pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1)
+            
+            df_filtrado = leer(
+                db.obtener_pagina_pacientes, seleccion, orden, descendente, pagina - 1, config.TABLA_TAMANO_PAGINA
+            )
+            st.caption(f"Página {pagina} de {paginas}")
+        elif not config.FILTROS_EN_SERVIDOR:
+            df_filtrado = filtros.filtrar(df, version, seleccion)
+            cantidad = len(df_filtrado)
+        elif seleccion:
+            df_filtrado = leer(db.obtener_pacientes_filtrados, seleccion)
+            cantidad = len(df_filtrado)
+        else:
+            df_filtrado = leer(db.obtener_todos_pacientes)
+            cantidad = len(df_filtrado)
         
-        if filtro_arm != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['requiere_arm'] == (filtro_arm == "Sí")]
+        if seleccion:
+            st.write(f"**Registros que cumplen los filtros:** {cantidad}")
         
         # Mostrar tabla
         st.dataframe(df_filtrado, use_container_width=True, height=400)
@@ -903,11 +1202,15 @@ elif menu == "Base de Datos":
         st.markdown("---")
         st.subheader("Ver Detalle del Paciente")
         
-        historias = df_filtrado['numero_historia'].tolist()
+        historias = df_filtrado['numero_historia'].tolist() if not df_filtrado.empty else []
         if historias:
             historia_seleccionada = st.selectbox("Seleccionar Historia Clínica", historias)
             
-            paciente = df_filtrado[df_filtrado['numero_historia'] == historia_seleccionada].iloc[0]
+            paciente = fila_paciente(df_filtrado[df_filtrado['numero_historia'] == historia_seleccionada])
+            if 'observaciones' not in paciente.index:
+                # La vista paginada no trae las observaciones: solo las del paciente elegido
+                detalle = leer(db.obtener_paciente_por_historia, historia_seleccionada)
+                paciente['observaciones'] = detalle['observaciones'].iloc[0] if not detalle.empty else None
             
             col1, col2 = st.columns(2)
             
@@ -915,7 +1218,7 @@ elif menu == "Base de Datos":
                 st.write(f"**Historia Clínica:** {paciente['numero_historia']}")
                 st.write(f"**Edad:** {paciente['edad']} años")
                 st.write(f"**Sexo:** {paciente['sexo']}")
-                st.write(f"**Fecha Ingreso:** {paciente['fecha_ingreso']}")
+                st.write(f"**Fecha Ingreso:** {pd.Timestamp(paciente['fecha_ingreso']).date()}")
                 st.write(f"**Diagnóstico:** {paciente['diagnostico']}")
                 st.write(f"**Origen TEC:** {paciente['origen_tec']}")
             
@@ -972,29 +1275,55 @@ elif menu == "Base de Datos":
 elif menu == "Exportar Datos":
     st.header("📥 Exportar Datos")
     
-    df = db.obtener_todos_pacientes()
+    # Conteo liviano: la tabla completa nunca se carga entera en memoria
+    total = leer(db.obtener_estadisticas).get('total_pacientes', 0)
     
-    if df.empty:
+    if not total:
         st.warning("⚠️ No hay datos para exportar.")
     else:
-        st.write(f"**Total de registros:** {len(df)}")
+        st.write(f"**Total de registros:** {total}")
         
-        # Exportar a CSV
-        csv = df.to_csv(index=False).encode('utf-8')
+        formatos = ["CSV", "Parquet"] if exportacion.PARQUET_AVAILABLE else ["CSV"]
+        formato = st.radio("Formato", formatos, horizontal=True)
         
-        st.download_button(
-            label="📊 Descargar CSV",
-            data=csv,
-            file_name=f"pacientes_tec_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv",
-            use_container_width=True
-        )
+        if st.button("⚙️ Generar archivo", use_container_width=True):
+            # Se escribe página por página en un archivo temporal; el generador
+            # se cierra aunque la lectura falle a mitad de camino
+            with closing(db.iterar_paginas_pacientes()) as paginas:
+                contenido, filas = leer(exportacion.exportar, paginas, formato)
+            extension, mime = exportacion.FORMATOS[formato]
+            
+            st.download_button(
+                label=f"📊 Descargar {formato} ({filas} registros)",
+                data=contenido,
+                file_name=f"pacientes_tec_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                mime=mime,
+                use_container_width=True
+            )
         
-        st.info("💡 El archivo CSV se puede abrir en Excel, Google Sheets o cualquier software de análisis estadístico.")
+        st.info("💡 El archivo CSV se puede abrir en Excel, Google Sheets o cualquier software de análisis estadístico. "
+                "Parquet es un formato columnar comprimido, ideal para R, Python o herramientas estadísticas.")
         
-        # Vista previa
+        # Vista previa: diez filas sin las observaciones (texto largo)
         st.subheader("Vista previa de los datos")
-        st.dataframe(df.head(10), use_container_width=True)
+        vista_previa = leer(db.obtener_pagina_pacientes, tamano=10)
+        if not vista_previa.empty:
+            st.dataframe(vista_previa, use_container_width=True)
+
+# Métricas de la capa de datos (se activan con mostrar_metricas en secrets)
+if config.METRICAS_VISIBLES:
+    with st.sidebar.expander("⏱️ Métricas de datos"):
+        tabla_metricas = metricas.resumen()
+        if tabla_metricas.empty:
+            st.caption("Todavía no hay llamadas registradas")
+        else:
+            st.dataframe(tabla_metricas, hide_index=True)
+            st.download_button(
+                label="Descargar JSON",
+                data=metricas.volcar_json(),
+                file_name=f"metricas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                mime="application/json"
+            )
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,100 @@
+"""
+Generador de cohortes sintéticas de pacientes con TEC para benchmarks
+Los valores respetan los dominios del formulario de carga
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+ORIGENES_TEC = [
+    "Accidente de tránsito (moto)", "Accidente de tránsito (auto)",
+    "Accidente de tránsito (peatón)", "Caída de altura", "Caída mismo nivel",
+    "Agresión", "Accidente laboral", "Otro"
+]
+PROBABILIDAD_ORIGEN = [0.35, 0.15, 0.08, 0.14, 0.12, 0.08, 0.05, 0.03]
+
+DESTINOS_POST_UTI = ["Aún en UTI", "Cuidados Generales", "UTIM", "Derivado a otro centro", "Óbito"]
+PROBABILIDAD_DESTINO = [0.15, 0.45, 0.15, 0.1, 0.15]
+
+LESIONES = [
+    "Hematoma subdural", "Hematoma epidural", "Contusión cerebral",
+    "Hemorragia subaracnoidea", "Fractura de cráneo", "Trauma torácico",
+    "Trauma abdominal", "Fracturas de extremidades", "Trauma facial", "Lesión medular"
+]
+
+TIPOS_DRENAJE = ["DVE (Drenaje Ventricular Externo)", "Aspirativo"]
+
+def _lesiones(rng, n):
+    """Combinaciones de 0 a 3 lesiones unidas con ', ' como en el formulario"""
+    cantidad = rng.integers(0, 4, n)
+    elegidas = rng.integers(0, len(LESIONES), (n, 3))
+    nombres = np.array(LESIONES, dtype=object)[elegidas]
+    texto = pd.Series(nombres[:, 0])
+    for k in (1, 2):
+        texto = texto.where(cantidad <= k, texto + ", " + nombres[:, k])
+    return texto.where(cantidad > 0, "Sin otras lesiones")
+
+def generar_pacientes(n, semilla=0):
+    """DataFrame con n pacientes tal como los devuelve la tabla pacientes"""
+    rng = np.random.default_rng(semilla)
+    origen = rng.choice(ORIGENES_TEC, n, p=PROBABILIDAD_ORIGEN)
+    es_moto = origen == ORIGENES_TEC[0]
+    tiene_drenaje = rng.random(n) < 0.25
+    glasgow_ingreso = rng.integers(3, 16, n)
+    # La mayoría mejora algunos puntos, sin salir del rango 3-15
+    glasgow_actual = np.clip(glasgow_ingreso + rng.integers(-2, 6, n), 3, 15)
+
+    fecha_ingreso = pd.Timestamp(date(2015, 1, 1)) + pd.to_timedelta(rng.integers(0, 11 * 365, n), unit='D')
+    actualizacion = fecha_ingreso + pd.to_timedelta(rng.integers(0, 30 * 24 * 3600, n), unit='s')
+
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'numero_historia': pd.Series(np.arange(n) + 100000).astype(str).radd('HC'),
+        'edad': rng.integers(1, 96, n),
+        'sexo': rng.choice(["Masculino", "Femenino"], n, p=[0.72, 0.28]),
+        'fecha_ingreso': fecha_ingreso.strftime('%Y-%m-%d'),
+        'diagnostico': pd.Series(rng.integers(0, 50, n)).astype(str).radd("TEC grave con lesión tipo "),
+        'origen_tec': origen,
+        'lesiones_asociadas': _lesiones(rng, n),
+        'requiere_pic': rng.random(n) < 0.35,
+        'requiere_arm': rng.random(n) < 0.6,
+        'requiere_cranectomia': rng.random(n) < 0.15,
+        'dias_uti': rng.integers(0, 60, n),
+        'glasgow_ingreso': glasgow_ingreso,
+        'glasgow_actual': glasgow_actual,
+        'destino_post_uti': rng.choice(DESTINOS_POST_UTI, n, p=PROBABILIDAD_DESTINO),
+        'tiene_drenaje': tiene_drenaje,
+        'tipo_drenaje': np.where(tiene_drenaje, rng.choice(TIPOS_DRENAJE, n), None),
+        'llevaba_casco': np.where(es_moto, rng.random(n) < 0.55, None),
+        'secuelas_motora': rng.random(n) < 0.2,
+        'secuelas_neurologica': rng.random(n) < 0.25,
+        'secuelas_cognitiva': rng.random(n) < 0.2,
+        'observaciones': pd.Series(rng.integers(0, 5, n)).map(lambda k: "Paciente estable. " * k),
+        'fecha_ultima_actualizacion': actualizacion.strftime('%Y-%m-%dT%H:%M:%S')
+    })
+
+def generar_evoluciones(pacientes, por_paciente=4, semilla=0):
+    """DataFrame de evoluciones: por_paciente filas promedio por paciente"""
+    rng = np.random.default_rng(semilla + 1)
+    n = len(pacientes)
+    cantidad = rng.poisson(por_paciente, n)
+    indice = np.repeat(np.arange(n), cantidad)
+    # Número de evolución dentro de cada paciente (0, 1, 2, ...)
+    orden = np.arange(len(indice)) - np.repeat(np.cumsum(cantidad) - cantidad, cantidad)
+
+    base = pacientes.iloc[indice].reset_index(drop=True)
+    ingreso = pd.to_datetime(base['fecha_ingreso'])
+    glasgow = np.clip(base['glasgow_ingreso'].to_numpy() + orden + rng.integers(-1, 2, len(indice)), 3, 15)
+
+    return pd.DataFrame({
+        'id': np.arange(1, len(indice) + 1),
+        'numero_historia': base['numero_historia'],
+        'fecha_evolucion': (ingreso + pd.to_timedelta(orden + 1, unit='D')).dt.strftime('%Y-%m-%dT%H:%M:%S'),
+        'dias_uti': orden + 1,
+        'glasgow_actual': glasgow,
+        'requiere_pic': base['requiere_pic'] & (orden < 3),
+        'requiere_arm': base['requiere_arm'] & (orden < 5),
+        'requiere_cranectomia': base['requiere_cranectomia'],
+        'observacion': "Evolución diaria"
+    })
@@ -0,0 +1,159 @@
+"""
+Benchmarks de las rutas de datos de la app sobre cohortes sintéticas
+
+Uso:
+    python benchmarks/run_benchmarks.py                         # 1k, 10k, 100k y 1M filas
+    python benchmarks/run_benchmarks.py --tamanos 1000 10000    # solo algunos tamaños
+    python benchmarks/run_benchmarks.py --guardar benchmarks/resultados/baseline.json
+    python benchmarks/run_benchmarks.py --comparar benchmarks/resultados/baseline.json
+
+Con --comparar el proceso termina con código 1 si alguna ruta es más lenta que
+la línea base por encima de la tolerancia.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import buscador
+import estadisticas
+import exportacion
+import filtros
+import trayectorias
+from cohorte_sintetica import generar_evoluciones, generar_pacientes
+from esquema import normalizar_evoluciones, normalizar_pacientes
+
+TAMANOS = [1_000, 10_000, 100_000, 1_000_000]
+
+def medir(funcion, repeticiones):
+    """Mejor tiempo (segundos) de varias ejecuciones"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+def ruta_normalizacion(registros):
+    # Lo que hace obtener_todos_pacientes con la respuesta JSON de Supabase
+    return lambda: normalizar_pacientes(pd.DataFrame(registros))
+
+def ruta_estadisticas(df):
+    return lambda: estadisticas.calcular_resumen(df)
+
+FILTRO_BASE_DATOS = {
+    'sexo': ["Femenino"], 'requiere_pic': True, 'requiere_arm': False,
+    'origen_tec': ["Caída de altura", "Agresión"], 'edad': (18, 65), 'glasgow_ingreso': (3, 8)
+}
+
+def ruta_indice_filtros(df):
+    # Construcción de los bitmaps (una vez por versión de datos)
+    return lambda: filtros.IndiceFiltros(df)
+
+def ruta_filtrado(df):
+    # Filtros de "Base de Datos" sobre el índice ya construido
+    indice = filtros.IndiceFiltros(df)
+    return lambda: df.iloc[indice.posiciones(FILTRO_BASE_DATOS)]
+
+def ruta_exportacion_csv(df, tamano_pagina=1000):
+    def exportar():
+        paginas = (df.iloc[i:i + tamano_pagina] for i in range(0, len(df), tamano_pagina))
+        with tempfile.TemporaryFile() as destino:
+            exportacion.escribir_csv(paginas, destino)
+    return exportar
+
+def ruta_selector(df):
+    # Selector de "Evolucionar Paciente": índice de prefijos + búsqueda + etiquetas
+    def seleccionar():
+        coincidencias = buscador.IndicePacientes(df['numero_historia'].astype(str).to_numpy()).buscar('HC1000')
+        filas = df.iloc[coincidencias]
+        return [f"{hc} - {dx[:50]}" for hc, dx in zip(filas['numero_historia'], filas['diagnostico'])]
+    return seleccionar
+
+def ruta_trayectorias(df):
+    # Trayectorias de la cohorte: ~4 evoluciones por paciente
+    evoluciones = normalizar_evoluciones(generar_evoluciones(df))
+    return lambda: trayectorias.calcular_trayectorias(evoluciones, df)
+
+def ejecutar(tamanos, repeticiones):
+    resultados = {}
+    for n in tamanos:
+        crudo = generar_pacientes(n)
+        registros = crudo.to_dict('records')
+        df = normalizar_pacientes(crudo.copy())
+        # Las rutas lentas se miden una sola vez en los tamaños grandes
+        rep = repeticiones if n <= 100_000 else 1
+
+        rutas = {
+            'normalizacion': ruta_normalizacion(registros),
+            'estadisticas': ruta_estadisticas(df),
+            'indice_filtros': ruta_indice_filtros(df),
+            'filtrado_base_datos': ruta_filtrado(df),
+            'exportacion_csv': ruta_exportacion_csv(df),
+            'selector_pacientes': ruta_selector(df),
+            'trayectorias': ruta_trayectorias(df)
+        }
+        resultados[str(n)] = {}
+        for nombre, funcion in rutas.items():
+            segundos = medir(funcion, rep)
+            resultados[str(n)][nombre] = round(segundos, 6)
+            print(f"{n:>9} filas  {nombre:<22} {segundos * 1000:10.2f} ms")
+        del registros, crudo, df
+    return resultados
+
+def comparar(resultados, base, tolerancia):
+    """Retorna la lista de regresiones (tamaño, ruta, base, actual)"""
+    regresiones = []
+    for n, rutas in resultados.items():
+        for nombre, segundos in rutas.items():
+            referencia = base.get('resultados', {}).get(n, {}).get(nombre)
+            if referencia and segundos > referencia * (1 + tolerancia):
+                regresiones.append((n, nombre, referencia, segundos))
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de rutas de datos")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--guardar', help="Archivo JSON donde guardar los resultados")
+    parser.add_argument('--comparar', help="Línea base JSON contra la cual comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Fracción de lentitud tolerada antes de marcar regresión")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.tamanos, args.repeticiones)
+    salida = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'resultados': resultados
+    }
+
+    if args.guardar:
+        os.makedirs(os.path.dirname(os.path.abspath(args.guardar)), exist_ok=True)
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump(salida, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        regresiones = comparar(resultados, base, args.tolerancia)
+        for n, nombre, referencia, segundos in regresiones:
+            print(f"REGRESIÓN {nombre} ({n} filas): {referencia * 1000:.2f} ms -> {segundos * 1000:.2f} ms")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto de la línea base")
+
+if __name__ == '__main__':
+    main()
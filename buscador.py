@@ -0,0 +1,41 @@
+"""
+Búsqueda de pacientes por número de historia para el selector de "Evolucionar Paciente"
+Índice de prefijos en memoria: claves ordenadas + búsqueda binaria (np.searchsorted)
+"""
+import numpy as np
+
+from memo import memo_por_version
+
+LIMITE = 20
+
+class IndicePacientes:
+    """Índice de prefijos sobre numero_historia (sin distinguir mayúsculas)"""
+    def __init__(self, historias):
+        claves = np.char.lower(np.asarray(historias, dtype=str))
+        self.orden = np.argsort(claves, kind='stable')
+        self.claves = claves[self.orden]
+        self.total = len(claves)
+
+    def buscar(self, prefijo, limite=LIMITE):
+        """Posiciones (en el DataFrame original) de las historias que empiezan con el prefijo"""
+        prefijo = prefijo.strip().lower()
+        # Todas las claves con ese prefijo caen entre prefijo y prefijo + el mayor carácter
+        inicio = np.searchsorted(self.claves, prefijo, side='left')
+        fin = np.searchsorted(self.claves, prefijo + '\U0010ffff', side='left')
+        return self.orden[inicio:min(fin, inicio + limite)]
+
+def _construir_indice(df):
+    return IndicePacientes(df['numero_historia'].astype(str).to_numpy())
+
+# Índices por (perfil, versión de datos), compartidos entre sesiones
+_indices = memo_por_version(_construir_indice, vigente=lambda indice, df: indice.total == len(df))
+
+def obtener_indice(df, version, perfil='evolucion'):
+    """Retorna el índice memorizado para esa versión de datos o lo construye"""
+    return _indices((perfil, version), df)
+
+def buscar(df, version, prefijo, limite=LIMITE, perfil='evolucion'):
+    """Filas de df cuyo numero_historia empieza con el prefijo (sin prefijo: las más recientes)"""
+    if df.empty or not prefijo.strip():
+        return df.head(limite)
+    return df.iloc[obtener_indice(df, version, perfil).buscar(prefijo, limite)]
@@ -1,8 +1,64 @@
 """
-Configuración de conexión a Supabase
+Configuración de conexión a la base de datos
 """
 import streamlit as st
 
+# Backend activo: "supabase" (cloud) o "sqlite" (embebido, sin conexión)
+DB_BACKEND = st.secrets.get("db_backend", "supabase")
+SQLITE_RUTA = st.secrets.get("sqlite_ruta", "neurocriticos.db")
+
 # Configuración para Supabase
 SUPABASE_URL = st.secrets.get("supabase_url", None)
 SUPABASE_KEY = st.secrets.get("supabase_key", None)
+
+# Caché de pacientes en memoria (compartido por todas las sesiones del proceso)
+CACHE_TTL_SEGUNDOS = st.secrets.get("cache_ttl_segundos", 60)
+CACHE_MAX_ENTRADAS = st.secrets.get("cache_max_entradas", 8)
+# Tope de memoria de los DataFrames cacheados (df.memory_usage(deep=True))
+CACHE_MAX_MB = st.secrets.get("cache_max_mb", 512)
+
+# Refrescar el caché pidiendo solo los pacientes modificados desde la última carga
+SINCRONIZACION_INCREMENTAL = st.secrets.get("sincronizacion_incremental", True)
+
+# La sincronización vuelve a pedir lo modificado en este margen antes de la última marca
+# vista: una escritura que confirma después de otra posterior queda con una marca menor
+# (debe superar la demora de una escritura y la diferencia de reloj entre instancias)
+SINCRONIZACION_SOLAPAMIENTO_SEGUNDOS = st.secrets.get("sincronizacion_solapamiento_segundos", 120)
+
+# Antes de refrescar el caché vencido, consultar una firma de cada tabla (contador de
+# escrituras mantenido por triggers); si no cambió, se renueva sin volver a descargar
+SONDA_VERSION = st.secrets.get("sonda_version", True)
+
+# Filas por página al leer la tabla de pacientes (no superar el max-rows de PostgREST)
+PAGINA_TAMANO = st.secrets.get("pagina_tamano", 1000)
+
+# Pacientes por petición en la importación masiva desde CSV/Excel
+IMPORTACION_TAMANO_LOTE = st.secrets.get("importacion_tamano_lote", 500)
+
+# Selector de "Evolucionar Paciente": buscar en el servidor (ilike) en lugar de cargar
+# todos los pacientes en memoria; conviene con muchos miles de pacientes
+BUSQUEDA_EN_SERVIDOR = st.secrets.get("busqueda_en_servidor", False)
+
+# Filtros de "Base de Datos": resolverlos en la consulta al servidor en lugar de
+# filtrar en memoria los pacientes cacheados
+FILTROS_EN_SERVIDOR = st.secrets.get("filtros_en_servidor", False)
+
+# Filas por página en la vista paginada de "Base de Datos"
+TABLA_TAMANO_PAGINA = st.secrets.get("tabla_tamano_pagina", 50)
+
+# Mostrar en la barra lateral las métricas de latencia y tamaño de la capa de datos
+METRICAS_VISIBLES = st.secrets.get("mostrar_metricas", False)
+
+# Cliente HTTP de Supabase: conexiones keep-alive reutilizadas por todo el proceso,
+# timeouts en segundos y reintentos con espera exponencial (solo en lecturas)
+SUPABASE_CONEXIONES = st.secrets.get("supabase_conexiones", 10)
+SUPABASE_TIMEOUT_CONEXION = st.secrets.get("supabase_timeout_conexion", 5)
+SUPABASE_TIMEOUT_LECTURA = st.secrets.get("supabase_timeout_lectura", 15)
+SUPABASE_REINTENTOS = st.secrets.get("supabase_reintentos", 3)
+
+# Escritura diferida de "Cargar Paciente": el alta se anota en un diario local y
+# un hilo la envía a la base en lotes (la carga responde al instante aunque la red sea lenta)
+ESCRITURA_DIFERIDA = st.secrets.get("escritura_diferida", False)
+DIARIO_RUTA = st.secrets.get("diario_ruta", "diario_altas.jsonl")
+DIARIO_INTERVALO_SEGUNDOS = st.secrets.get("diario_intervalo_segundos", 2)
+DIARIO_TAMANO_LOTE = st.secrets.get("diario_tamano_lote", 100)
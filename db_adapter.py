@@ -1,47 +1,447 @@
 """
-Adaptador de base de datos - Solo Supabase
+Adaptador de base de datos - Supabase (cloud) o SQLite (local)
 """
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+import pandas as pd
+
 import config
-from supabase_db import SupabaseDB
+import metricas
+from diario import Diario
+from errores import ErrorBackend
+from esquema import ingresos_mensuales, normalizar_pacientes
+
+if config.DB_BACKEND == "sqlite":
+    from sqlite_db import SQLiteDB
+    _db = SQLiteDB(config.SQLITE_RUTA, tamano_pagina=config.PAGINA_TAMANO)
+else:
+    from supabase_db import SupabaseDB
+    _db = SupabaseDB(
+        config.SUPABASE_URL, config.SUPABASE_KEY,
+        tamano_pagina=config.PAGINA_TAMANO,
+        conexiones=config.SUPABASE_CONEXIONES,
+        timeout_conexion=config.SUPABASE_TIMEOUT_CONEXION,
+        timeout_lectura=config.SUPABASE_TIMEOUT_LECTURA,
+        reintentos=config.SUPABASE_REINTENTOS
+    )
+
+# Caché de lecturas compartido por todas las sesiones de Streamlit del proceso.
+# Cada entrada guarda (momento_de_carga, DataFrame, versión, bytes) y se expulsa por TTL
+# o, cuando se supera CACHE_MAX_ENTRADAS o CACHE_MAX_MB, la menos usada recientemente.
+# Las entradas vencidas se conservan para poder sincronizarlas por delta.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_bytes = 0
+
+# Versión de los datos: contador que avanza con cada escritura o recarga con cambios.
+# Cada entrada del caché guarda el valor con que se cargó su contenido y las lecturas
+# lo devuelven en df.attrs['version'] (ver version_de): los cálculos derivados
+# (estadísticas, gráficos, índices) se memorizan por esa versión, no por version_datos(),
+# que puede avanzar entre que la página la lee y recibe los datos.
+_version = 0
+
+def version_datos():
+    """Retorna la versión actual (la última asignada a algún dato cacheado)"""
+    return _version
+
+def version_de(df):
+    """Versión con que se cargó un DataFrame devuelto por la capa de datos"""
+    return df.attrs.get('version', _version)
+
+def _nueva_version():
+    """Avanza la versión y retorna el nuevo valor"""
+    global _version
+    with _cache_lock:
+        _version += 1
+        return _version
+
+def _con_version(df, version):
+    """Copia para que las páginas puedan modificar el DataFrame sin tocar el caché"""
+    copia = df.copy()
+    copia.attrs['version'] = version
+    return copia
+
+def _cache_obtener(clave):
+    """Retorna (DataFrame, vigente, versión) o (None, False, None) si no hay entrada"""
+    with _cache_lock:
+        entrada = _cache.get(clave)
+        if entrada is None:
+            return None, False, None
+        cargado, df, version, _ = entrada
+        _cache.move_to_end(clave)
+        return df, time.monotonic() - cargado <= config.CACHE_TTL_SEGUNDOS, version
+
+def _tamano(valor):
+    """Bytes que ocupa un DataFrame cacheado (el resumen de estadísticas es un dict chico)"""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    return 0
+
+def _cache_guardar(clave, df, version=None):
+    global _cache_bytes
+    tamano = _tamano(df)
+    with _cache_lock:
+        anterior = _cache.get(clave)
+        if anterior is not None:
+            _cache_bytes -= anterior[3]
+        _cache[clave] = (time.monotonic(), df, version, tamano)
+        _cache_bytes += tamano
+        _cache.move_to_end(clave)
+        while _cache and (len(_cache) > config.CACHE_MAX_ENTRADAS
+                          or _cache_bytes > config.CACHE_MAX_MB * 1024 * 1024):
+            _, descartada = _cache.popitem(last=False)
+            _cache_bytes -= descartada[3]
 
-_db = SupabaseDB(config.SUPABASE_URL, config.SUPABASE_KEY)
+def _cache_renovar(clave):
+    """Vuelve a dar por vigente una entrada que la sonda mostró sin cambios"""
+    with _cache_lock:
+        if clave in _cache:
+            _cache[clave] = (time.monotonic(),) + _cache[clave][1:]
+
+def invalidar_cache():
+    """Descarta todas las lecturas cacheadas"""
+    global _sonda, _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+        _firmas.clear()
+        _sonda = None
+
+# Sonda de versión: firma de cada tabla ({'cambios'}, contador de escrituras que
+# mantienen triggers en la base) con la que se cargó cada entrada del caché. Si al
+# vencer la entrada la firma sigue igual, la tabla no cambió y alcanza con renovarla
+# (una consulta de pocos bytes en vez de la tabla).
+_firmas = {}
+# Última sonda (momento, resultado): las lecturas de un mismo rerun la comparten
+_sonda = None
+SONDA_VALIDEZ_SEGUNDOS = 1
+
+def _sondear(tabla):
+    """Firma actual de la tabla, o None si la sonda está desactivada, no está instalada o falló"""
+    global _sonda
+    if not config.SONDA_VERSION:
+        return None
+    with _cache_lock:
+        sonda = _sonda
+    if sonda is None or time.monotonic() - sonda[0] > SONDA_VALIDEZ_SEGUNDOS:
+        try:
+            sonda = (time.monotonic(), _db.sondear_version())
+        except ErrorBackend:
+            # Sin sonda se sigue por el camino de siempre (delta o carga completa)
+            return None
+        with _cache_lock:
+            _sonda = sonda
+    return sonda[1].get(tabla) if sonda[1] else None
+
+def _sin_cambios(clave, firma):
+    """True si la entrada se cargó con esta misma firma (y entonces se renueva)"""
+    with _cache_lock:
+        igual = firma is not None and _firmas.get(clave) == firma
+    if igual:
+        _cache_renovar(clave)
+    return igual
+
+def _recordar_firma(clave, firma):
+    with _cache_lock:
+        _firmas[clave] = firma
+
+# Funciones a llamar después de cada escritura (p. ej. descartar cachés derivados)
+_al_escribir = []
+
+def registrar_al_escribir(funcion):
+    """Registra una función sin argumentos que se llama después de cada escritura"""
+    if funcion not in _al_escribir:
+        _al_escribir.append(funcion)
+
+def marcar_cache_vencido():
+    """Vence las lecturas cacheadas para que la próxima se sincronice"""
+    global _sonda
+    with _cache_lock:
+        for clave, entrada in _cache.items():
+            _cache[clave] = (float('-inf'),) + entrada[1:]
+        # La sonda anterior a esta escritura ya no sirve
+        _sonda = None
+    _nueva_version()
+    for funcion in _al_escribir:
+        funcion()
+
+def _marca_de_agua(df):
+    """Desde qué fecha_ultima_actualizacion pedir cambios (Timestamp)
+
+    La mayor marca del DataFrame menos el solapamiento: una escritura que confirmó
+    después de la última sincronización puede tener una marca menor que esa.
+    """
+    if 'fecha_ultima_actualizacion' not in df.columns:
+        return None
+    marcas = df['fecha_ultima_actualizacion'].dropna()
+    if marcas.empty:
+        return None
+    return marcas.max() - pd.Timedelta(seconds=config.SINCRONIZACION_SOLAPAMIENTO_SEGUNDOS)
+
+def _fusionar_pacientes(df, cambios):
+    """Reemplaza en df las filas modificadas (por numero_historia) y agrega las nuevas"""
+    if cambios.empty:
+        return df
+    # El solapamiento vuelve a traer filas que ya teníamos: solo cuentan las que
+    # no estaban o llegan con otra marca
+    previas = cambios['numero_historia'].map(df.set_index('numero_historia')['fecha_ultima_actualizacion'])
+    nuevos = previas.isna() | (cambios['fecha_ultima_actualizacion'] != previas)
+    if not nuevos.any():
+        return df
+    df = pd.concat([df, cambios[nuevos]], ignore_index=True)
+    df = df.drop_duplicates(subset='numero_historia', keep='last')
+    # concat de categorías distintas da object: volver a los tipos compactos
+    df = normalizar_pacientes(df)
+    return df.sort_values('fecha_ingreso', ascending=False, kind='stable').reset_index(drop=True)
 
 def init_db():
     return _db.init_db()
 
 def insertar_paciente(**kwargs):
-    return _db.insertar_paciente(**kwargs)
+    exito = _db.insertar_paciente(**kwargs)
+    if exito:
+        marcar_cache_vencido()
+    return exito
+
+def insertar_pacientes_lote(lista_campos, propagar=False):
+    """Inserta un lote de pacientes; retorna los numero_historia insertados o None si falló
 
-def obtener_todos_pacientes():
-    return _db.obtener_todos_pacientes()
+    Con propagar=True el error del backend se levanta (ver es_transitorio).
+    """
+    insertados = _db.insertar_pacientes_lote(lista_campos, propagar=propagar)
+    if insertados:
+        marcar_cache_vencido()
+    return insertados
+
+def es_transitorio(error):
+    """True si el error de una escritura puede salir bien al reintentar (red, base ocupada)"""
+    return _db.es_transitorio(error)
+
+# Diario de escritura diferida (solo si está activada), compartido por el proceso
+_diario = None
+_diario_lock = threading.Lock()
+
+def diario():
+    """Retorna el diario de altas, creándolo y arrancando su hilo la primera vez"""
+    global _diario
+    with _diario_lock:
+        if _diario is None:
+            _diario = Diario(config.DIARIO_RUTA, partial(insertar_pacientes_lote, propagar=True),
+                             es_transitorio,
+                             intervalo=config.DIARIO_INTERVALO_SEGUNDOS,
+                             tamano_lote=config.DIARIO_TAMANO_LOTE)
+            _diario.iniciar()
+        return _diario
+
+def encolar_paciente(**campos):
+    """Anota el alta en el diario local y retorna enseguida (False si ya está pendiente)"""
+    return diario().encolar(campos)
+
+def _fecha(valor):
+    """Fecha como texto 'AAAA-MM-DD' (o None) para las consultas y las claves del caché"""
+    return None if valor is None else pd.Timestamp(valor).strftime('%Y-%m-%d')
+
+def _en_periodo(df, fecha_desde, fecha_hasta):
+    """Filas de df ingresadas en el período (para recortar lo que trae la sincronización)"""
+    if fecha_desde is None and fecha_hasta is None:
+        return df
+    fechas = df['fecha_ingreso']
+    dentro = fechas.notna()
+    if fecha_desde is not None:
+        dentro &= fechas >= pd.Timestamp(fecha_desde)
+    if fecha_hasta is not None:
+        dentro &= fechas <= pd.Timestamp(fecha_hasta)
+    return df if dentro.all() else df[dentro].reset_index(drop=True)
+
+@metricas.instrumentar
+def obtener_todos_pacientes(perfil='completo', fecha_desde=None, fecha_hasta=None):
+    """Obtiene los pacientes con las columnas del perfil ('completo', 'estadisticas', 'selector')
+
+    Con fecha_desde/fecha_hasta se piden solo los ingresados en ese período
+    (el filtro va en la consulta) y se cachean aparte.
+    """
+    fecha_desde, fecha_hasta = _fecha(fecha_desde), _fecha(fecha_hasta)
+    periodo = () if fecha_desde is None and fecha_hasta is None else (fecha_desde, fecha_hasta)
+    clave = ('pacientes', perfil) + periodo
+    df, vigente, version = _cache_obtener(clave)
+    if df is None or not vigente:
+        # La firma se toma antes de leer: un cambio posterior se ve en la próxima sonda
+        firma = _sondear('pacientes')
+        if df is not None and _sin_cambios(clave, firma):
+            return _con_version(df, version)
+        marca = _marca_de_agua(df) if df is not None else None
+        if marca is not None and config.SINCRONIZACION_INCREMENTAL:
+            # Pedir solo lo insertado o modificado desde la última carga
+            try:
+                cambios = _db.obtener_pacientes_modificados_desde(marca.isoformat(), perfil)
+            except ErrorBackend:
+                # Mejor datos de hace un rato que ninguno: se reintenta en la próxima lectura
+                return _con_version(df, version)
+            fusionado = _fusionar_pacientes(df, cambios)
+            if fusionado is not df:
+                # Los cambios vienen sin filtrar: un paciente pudo entrar o salir del período
+                df = _en_periodo(fusionado, fecha_desde, fecha_hasta)
+                version = _nueva_version()
+        else:
+            recargado = _db.obtener_todos_pacientes(perfil, fecha_desde, fecha_hasta)
+            # Una recarga igual a lo cacheado (p. ej. la tabla sigue vacía) conserva la versión
+            if df is None or not recargado.equals(df):
+                version = _nueva_version()
+            df = recargado
+        # Un fallo del backend levanta ErrorBackend: lo que llega acá son datos reales,
+        # también una tabla vacía
+        _cache_guardar(clave, df, version)
+        _recordar_firma(clave, firma)
+    return _con_version(df, version)
+
+def obtener_pacientes_filtrados(filtros, perfil='completo'):
+    """Resuelve los filtros (ver filtros.py) en el servidor en lugar de en memoria (no usa el caché)"""
+    return _db.obtener_pacientes_filtrados(filtros, perfil)
+
+def contar_pacientes(filtros=None):
+    """Cantidad de pacientes que cumplen los filtros, contada en el servidor"""
+    return _db.contar_pacientes(filtros)
+
+def obtener_pagina_pacientes(filtros=None, orden='fecha_ingreso', descendente=True, pagina=0, tamano=50):
+    """Una página de pacientes filtrada y ordenada en el servidor (no usa el caché)"""
+    return _db.obtener_pagina_pacientes(filtros, orden, descendente, pagina, tamano)
+
+def iterar_paginas_pacientes(perfil='completo'):
+    """Recorre los pacientes página por página sin armar el DataFrame completo (no usa el caché)"""
+    return _db.iterar_paginas_pacientes(perfil)
+
+def buscar_pacientes(prefijo, limite=20, perfil='evolucion'):
+    """Busca en el servidor los pacientes cuyo numero_historia empieza con el prefijo (no usa el caché)"""
+    return _db.buscar_pacientes(prefijo, limite, perfil)
 
 def obtener_paciente_por_historia(numero_historia):
     return _db.obtener_paciente_por_historia(numero_historia)
 
 def actualizar_paciente(numero_historia, **campos):
-    return _db.actualizar_paciente(numero_historia, **campos)
+    exito = _db.actualizar_paciente(numero_historia, **campos)
+    if exito:
+        marcar_cache_vencido()
+    return exito
 
 def obtener_evoluciones_paciente(numero_historia):
     return _db.obtener_evoluciones_paciente(numero_historia)
 
+def obtener_notas_paciente(numero_historia, antes_de_id=None, limite=20):
+    """Una página de notas de evolución del paciente, más recientes primero (no usa el caché)"""
+    return _db.obtener_notas_paciente(numero_historia, antes_de_id, limite)
+
+@metricas.instrumentar
+def obtener_todas_evoluciones():
+    """Obtiene todas las evoluciones (sin observaciones) para el motor de trayectorias"""
+    clave = ('evoluciones',)
+    df, vigente, version = _cache_obtener(clave)
+    if df is None or not vigente:
+        firma = _sondear('evoluciones')
+        if df is not None and _sin_cambios(clave, firma):
+            return _con_version(df, version)
+        if df is not None and config.SINCRONIZACION_INCREMENTAL:
+            # Las evoluciones solo se agregan: pedir las de id mayor al último cacheado
+            try:
+                nuevas = _db.obtener_evoluciones(int(df['id'].max()) if not df.empty else 0)
+            except ErrorBackend:
+                return _con_version(df, version)
+            if not nuevas.empty:
+                df = pd.concat([df, nuevas], ignore_index=True)
+                version = _nueva_version()
+        else:
+            recargadas = _db.obtener_evoluciones()
+            if df is None or not recargadas.equals(df):
+                version = _nueva_version()
+            df = recargadas
+        _cache_guardar(clave, df, version)
+        _recordar_firma(clave, firma)
+    return _con_version(df, version)
+
 def eliminar_paciente(numero_historia):
     # No implementado
     return False
 
-def obtener_estadisticas():
-    df = obtener_todos_pacientes()
-    if df.empty:
+def _conteos(df, col):
+    if col not in df.columns:
         return {}
+    # En columnas category value_counts también lista las categorías sin filas
+    return {str(k): int(v) for k, v in df[col].value_counts().items() if v}
+
+def _estadisticas_locales(df):
+    """Equivalente local de la función estadisticas_pacientes() de Postgres"""
+    def momento(col, funcion):
+        if col not in df.columns or df.empty:
+            return 0
+        valor = getattr(df[col], funcion)()
+        return 0 if pd.isna(valor) else float(valor)
+    
+    def cantidad(col):
+        return int(df[col].sum()) if col in df.columns else 0
     
     return {
         'total_pacientes': len(df),
-        'con_pic': df['requiere_pic'].sum() if 'requiere_pic' in df.columns else 0,
-        'con_arm': df['requiere_arm'].sum() if 'requiere_arm' in df.columns else 0,
-        'con_cranectomia': df['requiere_cranectomia'].sum() if 'requiere_cranectomia' in df.columns else 0,
-        'edad_promedio': df['edad'].mean() if 'edad' in df.columns else 0,
-        'dias_uti_promedio': df['dias_uti'].mean() if 'dias_uti' in df.columns else 0
+        'con_pic': cantidad('requiere_pic'),
+        'con_arm': cantidad('requiere_arm'),
+        'con_cranectomia': cantidad('requiere_cranectomia'),
+        'con_drenaje': cantidad('tiene_drenaje'),
+        'edad_promedio': momento('edad', 'mean'),
+        'edad_desvio': momento('edad', 'std'),
+        'edad_min': momento('edad', 'min'),
+        'edad_max': momento('edad', 'max'),
+        'dias_uti_promedio': momento('dias_uti', 'mean'),
+        'dias_uti_desvio': momento('dias_uti', 'std'),
+        'dias_uti_max': momento('dias_uti', 'max'),
+        'por_origen_tec': _conteos(df, 'origen_tec'),
+        'por_sexo': _conteos(df, 'sexo'),
+        'por_destino_post_uti': _conteos(df, 'destino_post_uti')
     }
 
+def obtener_estadisticas():
+    """Resumen agregado de pacientes, calculado en el servidor cuando es posible"""
+    clave = ('estadisticas',)
+    stats, vigente, _ = _cache_obtener(clave)
+    if stats is None or not vigente:
+        firma = _sondear('pacientes')
+        if stats is None or not _sin_cambios(clave, firma):
+            stats = _db.obtener_estadisticas()
+            if stats is None:
+                # La función SQL no está instalada: calcular sobre el perfil liviano
+                stats = _estadisticas_locales(obtener_todos_pacientes('estadisticas'))
+            _cache_guardar(clave, stats)
+            _recordar_firma(clave, firma)
+    
+    if not stats.get('total_pacientes'):
+        return {}
+    return stats
+
+def obtener_ingresos_mensuales(fecha_desde=None, fecha_hasta=None):
+    """Ingresos, intervenciones y desenlaces por mes, de los meses que abarca el período
+
+    Lee la tabla ingresos_mensuales (una fila por mes, mantenida por triggers);
+    si no existe, la calcula en memoria sobre los pacientes de esos meses.
+    """
+    fecha_desde, fecha_hasta = _fecha(fecha_desde), _fecha(fecha_hasta)
+    clave = ('ingresos_mensuales', fecha_desde, fecha_hasta)
+    df, vigente, version = _cache_obtener(clave)
+    if df is None or not vigente:
+        firma = _sondear('pacientes')
+        if df is None or not _sin_cambios(clave, firma):
+            df = _db.obtener_ingresos_mensuales(fecha_desde, fecha_hasta)
+            if df is None:
+                # Meses completos, igual que la tabla
+                desde = pd.Timestamp(fecha_desde).replace(day=1) if fecha_desde else None
+                hasta = (pd.Timestamp(fecha_hasta) + pd.offsets.MonthEnd(0)) if fecha_hasta else None
+                df = ingresos_mensuales(obtener_todos_pacientes('estadisticas', desde, hasta))
+            version = _nueva_version()
+            _cache_guardar(clave, df, version)
+            _recordar_firma(clave, firma)
+    return _con_version(df, version)
+
 def get_db_info():
     """Retorna información sobre el tipo de BD activo"""
+    if config.DB_BACKEND == "sqlite":
+        return "💾 SQLite local (sin conexión)", "sqlite"
     return "☁️ Supabase (PostgreSQL)", "supabase"
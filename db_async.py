@@ -0,0 +1,58 @@
+"""
+Lecturas concurrentes de la capa de datos
+Versión asyncio de las lecturas de db_adapter: cada consulta corre en un hilo
+(asyncio.to_thread) sobre el mismo cliente y caché, así varias consultas de una
+página se pueden reunir con asyncio.gather y la latencia total es la de la más
+lenta en lugar de la suma. en_paralelo() es la fachada síncrona para Streamlit.
+"""
+import asyncio
+import concurrent.futures
+
+import db_adapter as db
+
+async def obtener_todos_pacientes(perfil='completo', fecha_desde=None, fecha_hasta=None):
+    return await asyncio.to_thread(db.obtener_todos_pacientes, perfil, fecha_desde, fecha_hasta)
+
+async def obtener_paciente_por_historia(numero_historia):
+    return await asyncio.to_thread(db.obtener_paciente_por_historia, numero_historia)
+
+async def obtener_evoluciones_paciente(numero_historia):
+    return await asyncio.to_thread(db.obtener_evoluciones_paciente, numero_historia)
+
+async def obtener_notas_paciente(numero_historia, antes_de_id=None, limite=20):
+    return await asyncio.to_thread(db.obtener_notas_paciente, numero_historia, antes_de_id, limite)
+
+async def obtener_todas_evoluciones():
+    return await asyncio.to_thread(db.obtener_todas_evoluciones)
+
+async def obtener_ingresos_mensuales(fecha_desde=None, fecha_hasta=None):
+    return await asyncio.to_thread(db.obtener_ingresos_mensuales, fecha_desde, fecha_hasta)
+
+async def obtener_estadisticas():
+    return await asyncio.to_thread(db.obtener_estadisticas)
+
+async def contar_pacientes(filtros=None):
+    return await asyncio.to_thread(db.contar_pacientes, filtros)
+
+async def reunir(**consultas):
+    """Espera varias corrutinas a la vez y retorna {nombre: resultado}
+
+    Si alguna falla se propaga su excepción (p. ej. ErrorBackend).
+    """
+    resultados = await asyncio.gather(*consultas.values())
+    return dict(zip(consultas, resultados))
+
+def en_paralelo(**consultas):
+    """Fachada síncrona: ejecuta las corrutinas en paralelo y retorna {nombre: resultado}
+
+    Uso: en_paralelo(pacientes=db_async.obtener_todos_pacientes('estadisticas'),
+                     evoluciones=db_async.obtener_todas_evoluciones())
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Caso normal en Streamlit: el script corre en un hilo sin event loop
+        return asyncio.run(reunir(**consultas))
+    # Ya hay un loop en este hilo: correr el nuestro en otro hilo
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ejecutor:
+        return ejecutor.submit(asyncio.run, reunir(**consultas)).result()
@@ -0,0 +1,196 @@
+"""
+Diario local de altas de pacientes (escritura diferida)
+"Cargar Paciente" anota el alta en un archivo JSONL local (con fsync) y responde
+al instante; un hilo en segundo plano las manda a la base en lotes, reintenta
+si falla la red y deja registrados los conflictos (historia clínica repetida)
+para mostrarlos en la página. Si la base rechaza un lote por sus datos (una
+restricción CHECK o NOT NULL), el lote se parte en mitades hasta aislar las
+altas inválidas, que quedan como rechazadas en lugar de trabar a las demás.
+
+El archivo guarda el estado vigente: una línea por alta pendiente o en
+conflicto. Las altas nuevas se agregan al final y, después de cada envío,
+el archivo se reescribe de forma atómica sin las que ya se aplicaron.
+"""
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+import metricas
+
+PENDIENTE = 'pendiente'
+CONFLICTO = 'conflicto'
+RECHAZADO = 'rechazado'
+
+# Espera máxima entre reintentos cuando la base no responde (segundos)
+ESPERA_MAXIMA = 60
+
+class Diario:
+    """Cola durable de altas con un hilo que las envía en lotes"""
+    def __init__(self, ruta, insertar_lote, es_transitorio, intervalo=2, tamano_lote=100):
+        self.ruta = ruta
+        # insertar_lote(lista_campos) -> numero_historia insertados; levanta si falló
+        self.insertar_lote = insertar_lote
+        # es_transitorio(error) -> True si vale la pena reintentar (red, base ocupada)
+        self.es_transitorio = es_transitorio
+        self.intervalo = intervalo
+        self.tamano_lote = tamano_lote
+        self.lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._fallos = 0
+        self.registros = self._leer()
+
+    def _leer(self):
+        """Registros vigentes del archivo (si una línea se repite por id, gana la última)"""
+        registros = {}
+        if not os.path.exists(self.ruta):
+            return registros
+        with open(self.ruta, encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    registro = json.loads(linea)
+                except json.JSONDecodeError:
+                    # Última línea a medio escribir por un corte: se descarta
+                    continue
+                registros[registro['id']] = registro
+        return registros
+
+    def _agregar(self, registro):
+        with open(self.ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+    def _reescribir(self):
+        """Reemplaza el archivo por los registros vigentes (archivo temporal + os.replace)"""
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as archivo:
+            for registro in self.registros.values():
+                archivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self.ruta)
+
+    def encolar(self, campos):
+        """Anota un alta en el diario; retorna False si esa historia ya está pendiente"""
+        with self.lock:
+            historia = campos['numero_historia']
+            if any(r['campos']['numero_historia'] == historia and r['estado'] == PENDIENTE
+                   for r in self.registros.values()):
+                return False
+            registro = {
+                'id': uuid.uuid4().hex,
+                'estado': PENDIENTE,
+                'encolado': datetime.now().isoformat(),
+                'campos': campos
+            }
+            self._agregar(registro)
+            self.registros[registro['id']] = registro
+        self._despertar.set()
+        return True
+
+    def pendientes(self):
+        """Cantidad de altas que todavía no llegaron a la base"""
+        with self.lock:
+            return sum(r['estado'] == PENDIENTE for r in self.registros.values())
+
+    def conflictos(self):
+        """Altas que la base rechazó, con el motivo"""
+        with self.lock:
+            return [r for r in self.registros.values() if r['estado'] == CONFLICTO]
+
+    def rechazados(self):
+        """Altas que la base no acepta por sus datos, con el error"""
+        with self.lock:
+            return [r for r in self.registros.values() if r['estado'] == RECHAZADO]
+
+    def descartar_conflictos(self):
+        """Olvida los conflictos y rechazos ya informados"""
+        with self.lock:
+            self.registros = {i: r for i, r in self.registros.items()
+                              if r['estado'] not in (CONFLICTO, RECHAZADO)}
+            self._reescribir()
+
+    def reintentar_rechazados(self):
+        """Vuelve a poner en cola las altas rechazadas (p. ej. tras corregir la base)"""
+        with self.lock:
+            for registro in self.registros.values():
+                if registro['estado'] == RECHAZADO:
+                    registro['estado'] = PENDIENTE
+                    registro.pop('motivo', None)
+            self._reescribir()
+        self._despertar.set()
+
+    def vaciar(self):
+        """Envía un lote de pendientes; retorna False si la base no respondió"""
+        with self.lock:
+            lote = [r for r in self.registros.values() if r['estado'] == PENDIENTE][:self.tamano_lote]
+        if not lote:
+            return True
+        return self._enviar(lote)
+
+    def _enviar(self, lote):
+        """Inserta un lote; si la base lo rechaza por sus datos lo parte en mitades"""
+        try:
+            insertados = self.insertar_lote([r['campos'] for r in lote])
+        except Exception as e:
+            print(f"Error al vaciar el diario: {e}")
+            if self.es_transitorio(e):
+                # Puede que la base lo haya guardado y se perdiera la respuesta: se recuerda
+                # para no informarlo después como un duplicado cargado por otra persona
+                with self.lock:
+                    for registro in lote:
+                        registro['intentos'] = registro.get('intentos', 0) + 1
+                return False
+            if len(lote) > 1:
+                mitad = len(lote) // 2
+                return self._enviar(lote[:mitad]) and self._enviar(lote[mitad:])
+            # Un alta sola que la base no acepta: se aparta para no trabar a las siguientes
+            with self.lock:
+                registro = lote[0]
+                registro['estado'] = RECHAZADO
+                registro['motivo'] = (f"La base rechazó el alta de la historia clínica "
+                                      f"{registro['campos']['numero_historia']}: {e}")
+                self._reescribir()
+            return True
+
+        insertados = set(insertados)
+        with self.lock:
+            for registro in lote:
+                historia = registro['campos']['numero_historia']
+                if historia in insertados:
+                    # Cada historia se aplica una sola vez aunque venga repetida en el lote
+                    insertados.discard(historia)
+                    del self.registros[registro['id']]
+                else:
+                    registro['estado'] = CONFLICTO
+                    registro['motivo'] = f"Ya existe un paciente con la historia clínica {historia}"
+                    if registro.get('intentos'):
+                        registro['motivo'] += " (quizás guardado por un envío anterior que no confirmó: verifique los datos)"
+            self._reescribir()
+        return True
+
+    def _trabajar(self):
+        while True:
+            # Con fallos seguidos se espera cada vez más antes de reintentar
+            espera = min(self.intervalo * 2 ** self._fallos, ESPERA_MAXIMA)
+            self._despertar.wait(espera if self.pendientes() else None)
+            self._despertar.clear()
+            while self.pendientes():
+                with metricas.medir('diario.vaciar'):
+                    enviado = self.vaciar()
+                if not enviado:
+                    self._fallos += 1
+                    break
+                self._fallos = 0
+
+    def iniciar(self):
+        """Arranca el hilo de envío (una vez por proceso)"""
+        with self.lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._trabajar, name='diario', daemon=True)
+                self._hilo.start()
+        # Lo que quedó pendiente de una ejecución anterior se envía enseguida
+        self._despertar.set()
@@ -0,0 +1,14 @@
+"""
+Errores de la capa de datos
+Las lecturas devuelven un DataFrame vacío solo cuando no hay filas y las
+escrituras retornan False solo cuando la base respondió que no se aplicaron
+(p. ej. historia clínica repetida); si la base no respondió (o respondió con
+error) levantan ErrorBackend
+"""
+
+class ErrorBackend(Exception):
+    """La base de datos falló (red, timeout o error del servidor), distinto de "sin filas" o "ya existe" """
+    def __init__(self, operacion, causa):
+        super().__init__(f"Error al {operacion}: {causa}")
+        self.operacion = operacion
+        self.causa = causa
@@ -0,0 +1,211 @@
+"""
+Esquema de datos compartido por los backends (Supabase y SQLite)
+"""
+import pandas as pd
+from datetime import datetime
+
+import metricas
+
+# Columnas editables de la tabla pacientes (además de numero_historia)
+COLUMNAS_PACIENTE = [
+    'edad', 'sexo', 'fecha_ingreso', 'diagnostico', 'origen_tec', 'lesiones_asociadas',
+    'requiere_pic', 'requiere_arm', 'requiere_cranectomia', 'dias_uti',
+    'glasgow_ingreso', 'glasgow_actual', 'destino_post_uti', 'tiene_drenaje',
+    'tipo_drenaje', 'llevaba_casco', 'secuelas_motora', 'secuelas_neurologica',
+    'secuelas_cognitiva', 'observaciones', 'fecha_ultima_actualizacion'
+]
+
+COLUMNAS_BOOLEANAS = [
+    'requiere_pic', 'requiere_arm', 'requiere_cranectomia', 'tiene_drenaje',
+    'secuelas_motora', 'secuelas_neurologica', 'secuelas_cognitiva', 'llevaba_casco'
+]
+
+# Columnas que pide cada página. Todas incluyen las claves de paginación
+# (fecha_ingreso, numero_historia) y la marca de sincronización.
+PERFILES_COLUMNAS = {
+    'completo': ['*'],
+    'estadisticas': [
+        'numero_historia', 'fecha_ingreso', 'fecha_ultima_actualizacion',
+        'edad', 'sexo', 'origen_tec', 'dias_uti', 'glasgow_ingreso', 'glasgow_actual',
+        'requiere_pic', 'requiere_arm', 'requiere_cranectomia',
+        'tiene_drenaje', 'tipo_drenaje', 'destino_post_uti', 'llevaba_casco',
+        'secuelas_motora', 'secuelas_neurologica', 'secuelas_cognitiva'
+    ],
+    'selector': [
+        'numero_historia', 'fecha_ingreso', 'fecha_ultima_actualizacion', 'diagnostico'
+    ],
+    # Tabla paginada de "Base de Datos": todo menos las observaciones (texto largo)
+    'tabla': ['id', 'numero_historia'] + [c for c in COLUMNAS_PACIENTE if c != 'observaciones'],
+    # Lo que muestra y edita "Evolucionar Paciente" (evita releer el paciente elegido).
+    # Las notas se leen aparte y de a páginas (obtener_notas_paciente)
+    'evolucion': [
+        'numero_historia', 'fecha_ingreso', 'fecha_ultima_actualizacion', 'diagnostico',
+        'edad', 'origen_tec', 'dias_uti', 'glasgow_ingreso', 'glasgow_actual',
+        'requiere_pic', 'requiere_arm', 'requiere_cranectomia', 'tiene_drenaje',
+        'tipo_drenaje', 'destino_post_uti', 'llevaba_casco', 'secuelas_motora',
+        'secuelas_neurologica', 'secuelas_cognitiva'
+    ]
+}
+
+# Tipos compactos del DataFrame de pacientes en memoria
+TIPOS_COLUMNAS = {
+    'sexo': 'category',
+    'origen_tec': 'category',
+    'destino_post_uti': 'category',
+    'tipo_drenaje': 'category',
+    'edad': 'int16',
+    'dias_uti': 'int16',
+    'glasgow_ingreso': 'int8',
+    'glasgow_actual': 'int8',
+    'fecha_ingreso': 'datetime64',
+    'fecha_ultima_actualizacion': 'datetime64',
+    **{col: 'boolean' for col in COLUMNAS_BOOLEANAS}
+}
+
+# Columnas de evoluciones que usa el motor de trayectorias (sin la observación)
+COLUMNAS_TRAYECTORIA = [
+    'id', 'numero_historia', 'fecha_evolucion', 'dias_uti', 'glasgow_actual',
+    'requiere_pic', 'requiere_arm', 'requiere_cranectomia'
+]
+
+# Resumen mensual de ingresos (tabla ingresos_mensuales, mantenida por triggers):
+# por cada mes ('AAAA-MM') la cantidad de ingresos, intervenciones y desenlaces
+COLUMNAS_INGRESOS_MENSUALES = [
+    'ingresos', 'con_pic', 'con_arm', 'con_cranectomia', 'con_drenaje',
+    'obitos', 'con_secuelas'
+]
+
+TIPOS_EVOLUCIONES = {
+    'id': 'int64',
+    'dias_uti': 'int16',
+    'glasgow_actual': 'int8',
+    'fecha_evolucion': 'datetime64',
+    'requiere_pic': 'boolean',
+    'requiere_arm': 'boolean',
+    'requiere_cranectomia': 'boolean'
+}
+
+# Booleanas donde "sin dato" no es lo mismo que "No" (casco solo aplica a motos)
+BOOLEANAS_TRIESTADO = ['llevaba_casco']
+
+def _convertir(serie, tipo):
+    if tipo == 'boolean':
+        serie = serie.astype('boolean')
+        return serie if serie.name in BOOLEANAS_TRIESTADO else serie.fillna(False)
+    if tipo.startswith('int'):
+        return pd.to_numeric(serie, errors='coerce').fillna(0).astype(tipo)
+    if tipo.startswith('datetime'):
+        return pd.to_datetime(serie, errors='coerce', format='ISO8601')
+    return serie.astype(tipo)
+
+@metricas.instrumentar
+def normalizar_pacientes(df):
+    """Convierte un DataFrame de pacientes a los tipos compactos de TIPOS_COLUMNAS"""
+    if df.empty:
+        return df
+    # Todas las columnas convertidas se asignan juntas
+    return df.assign(**{
+        col: _convertir(df[col], tipo) for col, tipo in TIPOS_COLUMNAS.items() if col in df.columns
+    })
+
+@metricas.instrumentar
+def normalizar_evoluciones(df):
+    """Convierte un DataFrame de evoluciones a los tipos compactos de TIPOS_EVOLUCIONES"""
+    if df.empty:
+        return df
+    return df.assign(**{
+        col: _convertir(df[col], tipo) for col, tipo in TIPOS_EVOLUCIONES.items() if col in df.columns
+    })
+
+def ingresos_mensuales(df):
+    """Calcula sobre un DataFrame de pacientes las mismas filas que la tabla ingresos_mensuales"""
+    columnas = ['mes'] + COLUMNAS_INGRESOS_MENSUALES
+    df = df[df['fecha_ingreso'].notna()] if 'fecha_ingreso' in df.columns else df.iloc[0:0]
+    if df.empty:
+        return pd.DataFrame(columns=columnas)
+    secuelas = ['secuelas_motora', 'secuelas_neurologica', 'secuelas_cognitiva']
+    filas = pd.DataFrame({
+        'mes': pd.to_datetime(df['fecha_ingreso']).dt.strftime('%Y-%m'),
+        'ingresos': 1,
+        'con_pic': es_verdadero(df['requiere_pic']),
+        'con_arm': es_verdadero(df['requiere_arm']),
+        'con_cranectomia': es_verdadero(df['requiere_cranectomia']),
+        'con_drenaje': es_verdadero(df['tiene_drenaje']),
+        'obitos': (df['destino_post_uti'].astype(object) == 'Óbito'),
+        'con_secuelas': pd.concat([es_verdadero(df[c]) for c in secuelas], axis=1).any(axis=1)
+    })
+    return normalizar_ingresos_mensuales(filas.groupby('mes', as_index=False).sum())
+
+def normalizar_ingresos_mensuales(df):
+    """Meses como texto 'AAAA-MM' ordenados y conteos enteros"""
+    if df.empty:
+        return pd.DataFrame(columns=['mes'] + COLUMNAS_INGRESOS_MENSUALES)
+    df = df.astype({'mes': str, **{c: 'int64' for c in COLUMNAS_INGRESOS_MENSUALES}})
+    return df[['mes'] + COLUMNAS_INGRESOS_MENSUALES].sort_values('mes').reset_index(drop=True)
+
+def es_verdadero(serie):
+    """Máscara booleana simple (sin dato cuenta como False) para indexar con .loc"""
+    return serie.fillna(False).astype(bool)
+
+def fila_paciente(df, posicion=0):
+    """Una fila como Series de objetos Python, con None en lugar de NA/NaN/NaT"""
+    fila = df.iloc[posicion].astype(object)
+    return fila.where(fila.notna(), None)
+
+def escapar_like(texto):
+    """Escapa los comodines de LIKE (% y _) para buscar el texto literal"""
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def preparar_paciente(campos):
+    """Arma la fila a insertar en pacientes a partir de los campos del formulario"""
+    return {
+        'numero_historia': campos['numero_historia'],
+        'edad': campos['edad'],
+        'sexo': campos['sexo'],
+        'fecha_ingreso': campos['fecha_ingreso'],
+        'diagnostico': campos['diagnostico'],
+        'origen_tec': campos['origen_tec'],
+        'lesiones_asociadas': campos['lesiones_asociadas'],
+        'requiere_pic': campos['requiere_pic'],
+        'requiere_arm': campos['requiere_arm'],
+        'requiere_cranectomia': campos['requiere_cranectomia'],
+        'dias_uti': campos['dias_uti'],
+        'glasgow_ingreso': campos['glasgow_ingreso'],
+        'glasgow_actual': campos['glasgow_actual'],
+        'destino_post_uti': campos.get('destino_post_uti', ''),
+        'tiene_drenaje': campos.get('tiene_drenaje', False),
+        'tipo_drenaje': campos.get('tipo_drenaje', ''),
+        'llevaba_casco': campos.get('llevaba_casco'),
+        'secuelas_motora': campos.get('secuelas_motora', False),
+        'secuelas_neurologica': campos.get('secuelas_neurologica', False),
+        'secuelas_cognitiva': campos.get('secuelas_cognitiva', False),
+        'observaciones': campos.get('observaciones', ''),
+        'fecha_ultima_actualizacion': datetime.now().isoformat()
+    }
+
+def preparar_actualizacion(numero_historia, campos):
+    """Separa los campos de una actualización en (datos del paciente, fila de evolución)"""
+    # Preparar datos para actualizar (la nota va solo a la evolución, nunca al paciente)
+    datos = {}
+    for key, value in campos.items():
+        if key not in ('numero_historia', 'nota'):
+            datos[key] = value
+    
+    if 'fecha_ultima_actualizacion' not in datos:
+        datos['fecha_ultima_actualizacion'] = datetime.now().isoformat()
+    
+    # Registrar evolución si hay cambios relevantes o una nota nueva
+    evolucion = None
+    if any(k in campos for k in ['dias_uti', 'glasgow_actual', 'requiere_pic', 'requiere_arm', 'requiere_cranectomia', 'nota']):
+        evolucion = {
+            'numero_historia': numero_historia,
+            'dias_uti': campos.get('dias_uti'),
+            'glasgow_actual': campos.get('glasgow_actual'),
+            'requiere_pic': campos.get('requiere_pic'),
+            'requiere_arm': campos.get('requiere_arm'),
+            'requiere_cranectomia': campos.get('requiere_cranectomia'),
+            # Cada evolución guarda solo su propia nota: se agregan, no se reescriben
+            'observacion': campos.get('nota', '')
+        }
+    
+    return datos, evolucion
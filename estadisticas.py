@@ -0,0 +1,98 @@
+"""
+Motor de estadísticas para la página "Ver Estadísticas"
+Calcula todos los agregados en una pasada y los memoriza por versión de datos
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+from esquema import es_verdadero
+from memo import memo_por_version
+
+INTERVENCIONES = {
+    'PIC': 'requiere_pic',
+    'ARM': 'requiere_arm',
+    'Craniectomía': 'requiere_cranectomia',
+    'Drenaje': 'tiene_drenaje'
+}
+
+SECUELAS = {
+    'Motora': 'secuelas_motora',
+    'Neurológica': 'secuelas_neurologica',
+    'Cognitiva': 'secuelas_cognitiva'
+}
+
+@dataclass
+class ResumenEstadistico:
+    """Todos los números que muestra la página de estadísticas"""
+    total: int
+    intervenciones: dict
+    origen_counts: pd.Series
+    sexo_counts: pd.Series
+    edad: dict
+    dias_uti: dict
+    glasgow_ingreso: dict
+    # Columnas crudas para histogramas y box plots (vistas, no copias)
+    distribuciones: dict = field(default_factory=dict)
+    destino_counts: Optional[pd.Series] = None
+    drenaje_counts: Optional[pd.Series] = None
+    total_motos: int = 0
+    casco_counts: Optional[pd.Series] = None
+    secuelas: Optional[dict] = None
+
+def _conteos(serie):
+    """value_counts sin las categorías que no tienen filas (columnas category)"""
+    conteos = serie.value_counts()
+    return conteos[conteos > 0]
+
+def _describir(serie, *medidas):
+    valores = serie.agg(list(medidas))
+    return {medida: valores[medida] for medida in medidas}
+
+def calcular_resumen(df):
+    """Calcula el resumen estadístico completo de un DataFrame de pacientes"""
+    # Todas las sumas de booleanos en una sola operación sobre el bloque de columnas
+    cols_bool = [c for c in list(INTERVENCIONES.values()) + list(SECUELAS.values()) if c in df.columns]
+    sumas = df[cols_bool].sum()
+
+    intervenciones = {nombre: int(sumas[col]) for nombre, col in INTERVENCIONES.items() if col in sumas}
+    secuelas = None
+    if all(col in sumas for col in SECUELAS.values()):
+        secuelas = {nombre: int(sumas[col]) for nombre, col in SECUELAS.items()}
+
+    glasgow = df['glasgow_ingreso']
+    resumen = ResumenEstadistico(
+        total=len(df),
+        intervenciones=intervenciones,
+        origen_counts=_conteos(df['origen_tec']),
+        sexo_counts=_conteos(df['sexo']),
+        edad=_describir(df['edad'], 'mean', 'median', 'min', 'max'),
+        dias_uti=_describir(df['dias_uti'], 'mean', 'median', 'max'),
+        glasgow_ingreso={**_describir(glasgow, 'mean', 'median'), 'mode': glasgow.mode()[0]},
+        distribuciones={'edad': df['edad'], 'glasgow_ingreso': glasgow, 'dias_uti': df['dias_uti']},
+        secuelas=secuelas
+    )
+
+    if 'destino_post_uti' in df.columns:
+        resumen.destino_counts = _conteos(df['destino_post_uti'])
+
+    if 'tipo_drenaje' in df.columns:
+        resumen.drenaje_counts = _conteos(df.loc[es_verdadero(df['tiene_drenaje']), 'tipo_drenaje'])
+
+    if 'llevaba_casco' in df.columns:
+        # Un único recorte de motos alimenta los dos gráficos de casco
+        es_moto = df['origen_tec'].str.contains('moto', case=False, na=False)
+        resumen.total_motos = int(es_moto.sum())
+        casco = df.loc[es_moto, 'llevaba_casco']
+        if casco.notna().any():
+            resumen.casco_counts = casco.value_counts()
+
+    return resumen
+
+# Resúmenes por (perfil, versión de datos), compartidos entre sesiones
+_resumenes = memo_por_version(calcular_resumen)
+
+def obtener_resumen(df, version, perfil='estadisticas'):
+    """Retorna el resumen memorizado para esa versión de datos o lo calcula"""
+    return _resumenes((perfil, version), df)
@@ -0,0 +1,75 @@
+"""
+Exportación de pacientes a CSV y Parquet
+Escribe página por página en un archivo temporal: el DataFrame completo
+nunca se arma, pero el archivo terminado se entrega entero en bytes porque
+st.download_button lo carga en memoria de todos modos
+"""
+import io
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+FORMATOS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/octet-stream')
+}
+
+def escribir_csv(paginas, destino):
+    """Escribe las páginas como un único CSV UTF-8 en el archivo binario destino"""
+    texto = io.TextIOWrapper(destino, encoding='utf-8', newline='')
+    filas = 0
+    for pagina in paginas:
+        pagina.to_csv(texto, index=False, header=(filas == 0))
+        filas += len(pagina)
+    texto.flush()
+    texto.detach()
+    return filas
+
+def _tipo_estable(campo):
+    """Tipo de una columna que sirve para todas las páginas, no solo la primera"""
+    # Columnas vacías en la primera página: tipar como texto para las siguientes
+    if pa.types.is_null(campo.type):
+        return campo.with_type(pa.string())
+    # Las columnas category de cada página traen sus propias categorías
+    # (o ninguna si están vacías): diccionario de textos con índices amplios
+    if pa.types.is_dictionary(campo.type):
+        return campo.with_type(pa.dictionary(pa.int32(), pa.string()))
+    return campo
+
+def escribir_parquet(paginas, destino):
+    """Escribe las páginas como grupos de filas de un único archivo Parquet"""
+    if not PARQUET_AVAILABLE:
+        raise ImportError("pyarrow library not available. Install: pip install pyarrow")
+    
+    escritor = None
+    filas = 0
+    try:
+        for pagina in paginas:
+            if escritor is None:
+                esquema = pa.schema([_tipo_estable(campo) for campo in
+                                     pa.Table.from_pandas(pagina, preserve_index=False).schema])
+                escritor = pq.ParquetWriter(destino, esquema, compression='zstd')
+            escritor.write_table(pa.Table.from_pandas(pagina, schema=esquema, preserve_index=False))
+            filas += len(pagina)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
+
+def exportar(paginas, formato='CSV'):
+    """Exporta las páginas a un archivo temporal en disco.
+    
+    Retorna (contenido del archivo en bytes, cantidad de filas).
+    """
+    with tempfile.TemporaryFile() as destino:
+        if formato == 'Parquet':
+            filas = escribir_parquet(paginas, destino)
+        else:
+            filas = escribir_csv(paginas, destino)
+        destino.seek(0)
+        return destino.read(), filas
@@ -0,0 +1,131 @@
+"""
+Motor de filtros de la página "Base de Datos"
+Precalcula un bitmap empaquetado (np.packbits) por cada valor de las columnas
+categóricas y booleanas, y los valores ordenados de las columnas de rango.
+Combinar filtros es un AND bit a bit sobre n/8 bytes, sin copiar el DataFrame.
+
+Un filtro es un dict {columna: condición}:
+    - lista de valores para las categóricas:  {'sexo': ['Femenino']}
+    - True/False para las booleanas:          {'requiere_pic': True}
+    - (desde, hasta) para los rangos:         {'edad': (18, 65)}
+El mismo dict se puede resolver en memoria o mandar al servidor
+(db.obtener_pacientes_filtrados).
+"""
+import numpy as np
+import pandas as pd
+
+from esquema import BOOLEANAS_TRIESTADO
+from memo import memo_por_version
+
+CATEGORICAS = ['sexo', 'origen_tec', 'destino_post_uti', 'tipo_drenaje']
+
+BOOLEANAS = {
+    'requiere_pic': 'PIC',
+    'requiere_arm': 'ARM',
+    'requiere_cranectomia': 'Craniectomía',
+    'tiene_drenaje': 'Drenaje',
+    'llevaba_casco': 'Casco',
+    'secuelas_motora': 'Secuela motora',
+    'secuelas_neurologica': 'Secuela neurológica',
+    'secuelas_cognitiva': 'Secuela cognitiva'
+}
+
+RANGOS = ['edad', 'glasgow_ingreso', 'glasgow_actual', 'dias_uti', 'fecha_ingreso']
+
+# Columnas por las que se puede ordenar la vista paginada
+ORDENABLES = {
+    'fecha_ingreso': 'Fecha de ingreso',
+    'numero_historia': 'Historia clínica',
+    'edad': 'Edad',
+    'dias_uti': 'Días en UTI',
+    'glasgow_ingreso': 'Glasgow al ingreso',
+    'glasgow_actual': 'Glasgow actual',
+    'fecha_ultima_actualizacion': 'Última actualización'
+}
+
+def _valores_rango(serie):
+    if serie.name == 'fecha_ingreso':
+        return pd.to_datetime(serie, errors='coerce').to_numpy('datetime64[D]')
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+
+class IndiceFiltros:
+    """Bitmaps por valor y columnas de rango ordenadas de un DataFrame de pacientes"""
+    def __init__(self, df):
+        self.total = len(df)
+        self.bitmaps = {}
+        self.rangos = {}
+
+        for col in CATEGORICAS + list(BOOLEANAS):
+            if col not in df.columns:
+                continue
+            # Códigos enteros por valor: una pasada por columna, un bitmap por código
+            codigos, valores = pd.factorize(df[col], use_na_sentinel=True)
+            self.bitmaps[col] = {
+                valor: np.packbits(codigos == i) for i, valor in enumerate(valores)
+            }
+
+        for col in RANGOS:
+            if col not in df.columns:
+                continue
+            valores = _valores_rango(df[col])
+            orden = np.argsort(valores, kind='stable')
+            self.rangos[col] = (orden, valores[orden])
+
+    def valores(self, col):
+        """Valores distintos presentes en una columna categórica"""
+        return sorted(str(v) for v in self.bitmaps.get(col, {}))
+
+    def limites(self, col):
+        """(mínimo, máximo) de una columna de rango, ignorando nulos"""
+        _, ordenados = self.rangos[col]
+        validos = ordenados[~pd.isna(ordenados)]
+        if not len(validos):
+            return None, None
+        return validos[0], validos[-1]
+
+    def _bitmap_rango(self, col, desde, hasta):
+        orden, ordenados = self.rangos[col]
+        if col == 'fecha_ingreso':
+            desde, hasta = np.datetime64(desde, 'D'), np.datetime64(hasta, 'D')
+        inicio = np.searchsorted(ordenados, desde, side='left')
+        fin = np.searchsorted(ordenados, hasta, side='right')
+        mascara = np.zeros(self.total, dtype=bool)
+        mascara[orden[inicio:fin]] = True
+        return np.packbits(mascara)
+
+    def _bitmap(self, col, condicion):
+        if isinstance(condicion, tuple):
+            return self._bitmap_rango(col, *condicion)
+
+        por_valor = self.bitmaps.get(col, {})
+        vacio = np.zeros((self.total + 7) // 8, dtype=np.uint8)
+        if isinstance(condicion, bool):
+            if col in BOOLEANAS_TRIESTADO:
+                # Sin dato no es "Sí" ni "No" (p. ej. casco fuera de los accidentes de moto)
+                return por_valor.get(condicion, vacio)
+            # Sin dato cuenta como "No" (igual que en el servidor)
+            bitmap = por_valor.get(True, vacio)
+            return bitmap if condicion else np.bitwise_not(bitmap)
+        return np.bitwise_or.reduce([por_valor.get(v, vacio) for v in condicion] or [vacio])
+
+    def posiciones(self, filtros):
+        """Posiciones (filas de df) que cumplen todos los filtros"""
+        activos = {col: c for col, c in filtros.items() if col in self.bitmaps or col in self.rangos}
+        if not activos:
+            return np.arange(self.total)
+
+        resultado = np.bitwise_and.reduce([self._bitmap(col, c) for col, c in activos.items()])
+        return np.flatnonzero(np.unpackbits(resultado, count=self.total))
+
+# Índices por (perfil, versión de datos), compartidos entre sesiones
+_indices = memo_por_version(IndiceFiltros, vigente=lambda indice, df: indice.total == len(df))
+
+def obtener_indice(df, version, perfil='completo'):
+    """Retorna el índice memorizado para esa versión de datos o lo construye"""
+    return _indices((perfil, version), df)
+
+def filtrar(df, version, filtros, perfil='completo'):
+    """Filas de df que cumplen los filtros (vista por posición, sin copiar el resto)"""
+    if df.empty or not filtros:
+        return df
+    return df.iloc[obtener_indice(df, version, perfil).posiciones(filtros)]
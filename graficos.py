@@ -0,0 +1,49 @@
+"""
+Caché de figuras Plotly de la página "Ver Estadísticas"
+Guarda el spec JSON de cada gráfico por (nombre, versión de datos, parámetros)
+para no reconstruir las figuras con plotly.express en cada rerun
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+
+MAX_FIGURAS = 48
+# Los histogramas llevan los datos crudos en el spec: acotar también por tamaño
+MAX_BYTES = 32 * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_bytes = 0
+
+def figura(nombre, version, construir, **parametros):
+    """Retorna la figura memorizada o la construye con construir() y guarda su spec"""
+    global _bytes
+    clave = (nombre, version, tuple(sorted(parametros.items())))
+    with _cache_lock:
+        spec = _cache.get(clave)
+        if spec is not None:
+            _cache.move_to_end(clave)
+
+    if spec is not None:
+        # El spec ya se validó al construirlo: rearmar sin volver a validar
+        return go.Figure(json.loads(spec), _validate=False)
+
+    fig = construir()
+    spec = fig.to_json()
+    with _cache_lock:
+        if clave not in _cache:
+            _cache[clave] = spec
+            _bytes += len(spec)
+        while _cache and (len(_cache) > MAX_FIGURAS or _bytes > MAX_BYTES):
+            _, descartado = _cache.popitem(last=False)
+            _bytes -= len(descartado)
+    return fig
+
+def invalidar():
+    """Descarta todas las figuras (se llama cuando la capa de datos registra una escritura)"""
+    global _bytes
+    with _cache_lock:
+        _cache.clear()
+        _bytes = 0
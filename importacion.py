@@ -0,0 +1,188 @@
+"""
+Importación masiva de pacientes desde CSV o Excel
+Lee el archivo por bloques, valida y normaliza cada bloque de forma vectorizada
+e inserta en lotes
+"""
+import pandas as pd
+
+import db_adapter as db
+from esquema import BOOLEANAS_TRIESTADO, COLUMNAS_BOOLEANAS
+
+COLUMNAS_OBLIGATORIAS = [
+    'numero_historia', 'edad', 'sexo', 'fecha_ingreso', 'diagnostico',
+    'origen_tec', 'dias_uti', 'glasgow_ingreso'
+]
+
+VALORES_SI = {'si', 'sí', 's', 'true', 'verdadero', '1', 'x', 'yes', 'y'}
+VALORES_NO = {'no', 'n', 'false', 'falso', '0', ''}
+
+SEXOS = {
+    'm': 'Masculino', 'masculino': 'Masculino', 'masc': 'Masculino', 'hombre': 'Masculino',
+    'f': 'Femenino', 'femenino': 'Femenino', 'fem': 'Femenino', 'mujer': 'Femenino'
+}
+
+def leer_archivo(archivo, nombre, tamano_bloque=5000):
+    """Genera DataFrames de texto de hasta tamano_bloque filas (CSV o XLSX)"""
+    if nombre.lower().endswith(('.xlsx', '.xlsm')):
+        from openpyxl import load_workbook
+
+        # Modo solo lectura: openpyxl recorre la hoja sin cargarla entera
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezado = [str(c).strip() if c is not None else '' for c in next(filas, [])]
+            bloque = []
+            for fila in filas:
+                bloque.append(fila)
+                if len(bloque) == tamano_bloque:
+                    yield pd.DataFrame(bloque, columns=encabezado, dtype=object).astype(str)
+                    bloque = []
+            if bloque:
+                yield pd.DataFrame(bloque, columns=encabezado, dtype=object).astype(str)
+        finally:
+            libro.close()
+    else:
+        yield from pd.read_csv(archivo, dtype=str, keep_default_na=False,
+                               chunksize=tamano_bloque, sep=None, engine='python')
+
+def _texto(df, col, defecto=''):
+    if col not in df.columns:
+        return pd.Series(defecto, index=df.index, dtype=object)
+    return df[col].fillna(defecto).astype(str).str.strip().replace({'None': defecto, 'nan': defecto})
+
+def _booleano(texto):
+    """Convierte texto a True/False/None (None si el valor no se reconoce)"""
+    minus = texto.str.lower()
+    return pd.Series(
+        pd.NA, index=texto.index, dtype=object
+    ).mask(minus.isin(VALORES_SI), True).mask(minus.isin(VALORES_NO), False)
+
+def formatear_lesiones(texto):
+    """Da a lesiones_asociadas el mismo formato que el formulario: 'a, b | otras'"""
+    partes = texto.str.split('|', n=1, expand=True).reindex(columns=[0, 1])
+    listadas = partes[0].fillna('').str.replace(r'\s*[;,\n]\s*', ', ', regex=True).str.strip(' ,')
+    otras = partes[1].fillna('').str.strip()
+    return listadas.where(otras == '', listadas + ' | ' + otras).where(listadas != '', otras)
+
+def normalizar_bloque(df):
+    """Valida y normaliza un bloque leído del archivo.
+
+    Retorna (pacientes válidos como DataFrame, errores como DataFrame con fila y motivo).
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower().replace(' ', '_'))
+    errores = pd.Series('', index=df.index, dtype=object)
+
+    def marcar(mascara, motivo):
+        errores[mascara & (errores == '')] = motivo
+
+    faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in df.columns]
+    if faltantes:
+        errores[:] = f"Faltan columnas: {', '.join(faltantes)}"
+        return pd.DataFrame(), pd.DataFrame({'fila': df.index + 2, 'error': errores})
+
+    salida = pd.DataFrame(index=df.index)
+    salida['numero_historia'] = _texto(df, 'numero_historia')
+    marcar(salida['numero_historia'] == '', "Número de historia vacío")
+
+    salida['diagnostico'] = _texto(df, 'diagnostico')
+    marcar(salida['diagnostico'] == '', "Diagnóstico vacío")
+
+    salida['sexo'] = _texto(df, 'sexo').str.lower().map(SEXOS)
+    marcar(salida['sexo'].isna(), "Sexo no reconocido")
+
+    # Primero ISO (2025-01-31), después formato local (31/01/2025)
+    texto_fecha = _texto(df, 'fecha_ingreso')
+    fechas = pd.to_datetime(texto_fecha, errors='coerce', format='ISO8601')
+    fechas = fechas.fillna(pd.to_datetime(texto_fecha, errors='coerce', dayfirst=True, format='mixed'))
+    marcar(fechas.isna(), "Fecha de ingreso inválida")
+    salida['fecha_ingreso'] = fechas.dt.strftime('%Y-%m-%d')
+
+    rangos = {'edad': (0, 120), 'dias_uti': (0, None), 'glasgow_ingreso': (3, 15), 'glasgow_actual': (3, 15)}
+    for col, (minimo, maximo) in rangos.items():
+        valores = pd.to_numeric(_texto(df, col), errors='coerce')
+        if col == 'glasgow_actual':
+            valores = valores.fillna(salida['glasgow_ingreso'])
+        fuera = valores.isna() | (valores < minimo) | (valores != valores.round())
+        if maximo is not None:
+            fuera |= valores > maximo
+        marcar(fuera, f"{col} fuera de rango")
+        salida[col] = valores
+
+    origen = _texto(df, 'origen_tec')
+    salida['origen_tec'] = origen.where(origen != '', 'Otro')
+    salida['lesiones_asociadas'] = formatear_lesiones(_texto(df, 'lesiones_asociadas'))
+
+    # Igual que el formulario: casco solo en motos y tipo de drenaje solo si hay drenaje
+    aplica = {'llevaba_casco': salida['origen_tec'] == "Accidente de tránsito (moto)"}
+    for col in COLUMNAS_BOOLEANAS:
+        texto = _texto(df, col)
+        valores = _booleano(texto)
+        if col in BOOLEANAS_TRIESTADO:
+            # Vacío (o no aplica) es "sin dato", no "no"
+            cargado = (texto != '') & aplica.get(col, True)
+            marcar(cargado & valores.isna(), f"{col}: valor no reconocido")
+            salida[col] = valores.where(cargado, None)
+        else:
+            marcar(valores.isna(), f"{col}: valor no reconocido")
+            salida[col] = valores.fillna(False)
+
+    tipo = _texto(df, 'tipo_drenaje')
+    salida['tipo_drenaje'] = tipo.where(salida['tiene_drenaje'] & (tipo != ''), None)
+
+    destino = _texto(df, 'destino_post_uti')
+    salida['destino_post_uti'] = destino.where(destino != '', "Aún en UTI")
+    salida['observaciones'] = _texto(df, 'observaciones')
+
+    validos = errores == ''
+    salida = salida[validos].astype({'edad': int, 'dias_uti': int, 'glasgow_ingreso': int, 'glasgow_actual': int})
+    return salida, pd.DataFrame({'fila': df.index[~validos] + 2, 'error': errores[~validos]})
+
+def _a_registros(df):
+    """Convierte a lista de dicts con tipos nativos y None en lugar de NaN"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def importar_pacientes(archivo, nombre, tamano_lote=500, progreso=None):
+    """Importa pacientes desde un archivo CSV/XLSX.
+
+    progreso(filas_leidas, insertados) se llama después de cada lote.
+    Retorna un dict con el resumen y un DataFrame de errores por fila.
+    """
+    resumen = {'leidos': 0, 'insertados': 0, 'existentes': 0, 'invalidos': 0, 'fallidos': 0}
+    errores = []
+
+    existentes = db.obtener_todos_pacientes('selector')
+    vistos = set(existentes['numero_historia']) if not existentes.empty else set()
+
+    for bloque in leer_archivo(archivo, nombre):
+        bloque.index = bloque.index + resumen['leidos']
+        resumen['leidos'] += len(bloque)
+
+        validos, errores_bloque = normalizar_bloque(bloque)
+        resumen['invalidos'] += len(errores_bloque)
+        errores.append(errores_bloque)
+        if validos.empty:
+            if progreso:
+                progreso(resumen['leidos'], resumen['insertados'])
+            continue
+
+        # Deduplicar contra la base y dentro del propio archivo
+        repetidos = validos['numero_historia'].isin(vistos) | validos['numero_historia'].duplicated()
+        resumen['existentes'] += int(repetidos.sum())
+        validos = validos[~repetidos]
+        vistos.update(validos['numero_historia'])
+
+        registros = _a_registros(validos)
+        for inicio in range(0, len(registros), tamano_lote):
+            lote = registros[inicio:inicio + tamano_lote]
+            insertados = db.insertar_pacientes_lote(lote)
+            if insertados is None:
+                resumen['fallidos'] += len(lote)
+            else:
+                resumen['insertados'] += len(insertados)
+                # Insertados en paralelo por otro usuario mientras importábamos
+                resumen['existentes'] += len(lote) - len(insertados)
+            if progreso:
+                progreso(resumen['leidos'], resumen['insertados'])
+
+    errores = pd.concat(errores, ignore_index=True) if errores else pd.DataFrame(columns=['fila', 'error'])
+    return resumen, errores
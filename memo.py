@@ -0,0 +1,37 @@
+"""
+Memo LRU por versión de datos, compartido entre sesiones
+Lo usan los motores que derivan estructuras de los DataFrames del caché
+(resumen de estadísticas, índices de búsqueda y de filtros, trayectorias)
+"""
+import threading
+from collections import OrderedDict
+
+_SIN_VALOR = object()
+
+def memo_por_version(calcular, maximo=4, vigente=None):
+    """Envuelve calcular(*args) en un memo LRU de a lo sumo `maximo` resultados.
+
+    La función resultante se llama como memo(clave, *args): la clave debe incluir
+    la versión de datos. vigente(resultado, *args), si se da, descarta un resultado
+    memorizado que ya no corresponde a los argumentos (se vuelve a calcular).
+    """
+    memo = OrderedDict()
+    lock = threading.Lock()
+
+    def obtener(clave, *args):
+        with lock:
+            resultado = memo.get(clave, _SIN_VALOR)
+            if resultado is not _SIN_VALOR and (vigente is None or vigente(resultado, *args)):
+                memo.move_to_end(clave)
+                return resultado
+
+        # Se calcula fuera del lock: dos sesiones pueden calcular lo mismo a la vez
+        resultado = calcular(*args)
+        with lock:
+            memo[clave] = resultado
+            memo.move_to_end(clave)
+            while len(memo) > maximo:
+                memo.popitem(last=False)
+        return resultado
+
+    return obtener
@@ -0,0 +1,159 @@
+"""
+Métricas de la capa de datos: latencia, filas, bytes y errores por operación
+Mantiene una ventana móvil por operación para calcular percentiles (p50/p95/p99)
+"""
+import contextvars
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+VENTANA = 500
+
+_ventanas = {}
+_totales = {}
+_lock = threading.Lock()
+
+# Medición en curso del hilo/tarea actual (para asociar bytes y errores)
+_actual = contextvars.ContextVar('medicion_actual', default=None)
+
+class Medicion:
+    """Datos de una llamada en curso"""
+    def __init__(self, operacion):
+        self.operacion = operacion
+        self.filas = 0
+        self.bytes = 0
+        self.error = False
+
+def _contar_filas(resultado):
+    if resultado is None or isinstance(resultado, bool):
+        return 0
+    if isinstance(resultado, (pd.DataFrame, list)):
+        return len(resultado)
+    return 1
+
+def _registrar(medicion, segundos):
+    with _lock:
+        if medicion.operacion not in _ventanas:
+            _ventanas[medicion.operacion] = deque(maxlen=VENTANA)
+            _totales[medicion.operacion] = {'llamadas': 0, 'errores': 0, 'bytes': 0}
+        _ventanas[medicion.operacion].append((segundos, medicion.filas, medicion.bytes))
+        totales = _totales[medicion.operacion]
+        totales['llamadas'] += 1
+        totales['errores'] += int(medicion.error)
+        totales['bytes'] += medicion.bytes
+
+@contextmanager
+def medir(operacion):
+    """Mide el bloque como una llamada a la operación indicada"""
+    medicion = Medicion(operacion)
+    token = _actual.set(medicion)
+    inicio = time.perf_counter()
+    try:
+        yield medicion
+    except Exception:
+        medicion.error = True
+        raise
+    finally:
+        _actual.reset(token)
+        _registrar(medicion, time.perf_counter() - inicio)
+
+def registrar_bytes(cantidad):
+    """Suma bytes de respuesta a la medición en curso (si la hay)"""
+    medicion = _actual.get()
+    if medicion is not None:
+        medicion.bytes += cantidad
+
+def marcar_error():
+    """Marca la medición en curso como fallida (para métodos que capturan sus excepciones)"""
+    medicion = _actual.get()
+    if medicion is not None:
+        medicion.error = True
+
+def _nombre(funcion):
+    if '.' in funcion.__qualname__:
+        return funcion.__qualname__
+    return f"{funcion.__module__}.{funcion.__qualname__}"
+
+def instrumentar(funcion):
+    """Decorador: registra tiempo, filas devueltas, bytes y errores de cada llamada"""
+    operacion = _nombre(funcion)
+
+    if inspect.isgeneratorfunction(funcion):
+        # Generadores: se suma el tiempo de producir cada página (no el del consumidor)
+        @functools.wraps(funcion)
+        def generador(*args, **kwargs):
+            medicion = Medicion(operacion)
+            segundos = 0.0
+            interno = funcion(*args, **kwargs)
+            try:
+                while True:
+                    token = _actual.set(medicion)
+                    inicio = time.perf_counter()
+                    try:
+                        pagina = next(interno)
+                    except StopIteration:
+                        break
+                    except Exception:
+                        medicion.error = True
+                        raise
+                    finally:
+                        segundos += time.perf_counter() - inicio
+                        _actual.reset(token)
+                    medicion.filas += _contar_filas(pagina)
+                    yield pagina
+            finally:
+                interno.close()
+                _registrar(medicion, segundos)
+        return generador
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        with medir(operacion) as medicion:
+            resultado = funcion(*args, **kwargs)
+            medicion.filas = _contar_filas(resultado)
+            return resultado
+    return envoltura
+
+def resumen():
+    """Tabla con percentiles de latencia (ms), filas, bytes y errores por operación"""
+    with _lock:
+        copia = {op: (list(ventana), dict(_totales[op])) for op, ventana in _ventanas.items()}
+
+    filas = []
+    for operacion, (ventana, totales) in sorted(copia.items()):
+        valores = np.array(ventana, dtype=float)
+        p50, p95, p99 = np.percentile(valores[:, 0] * 1000, [50, 95, 99])
+        filas.append({
+            'operacion': operacion,
+            'llamadas': totales['llamadas'],
+            'errores': totales['errores'],
+            'p50_ms': round(p50, 2),
+            'p95_ms': round(p95, 2),
+            'p99_ms': round(p99, 2),
+            'filas_promedio': round(valores[:, 1].mean(), 1),
+            'bytes_promedio': int(valores[:, 2].mean()),
+            'bytes_total': totales['bytes']
+        })
+    return pd.DataFrame(filas)
+
+def volcar_json():
+    """Volcado legible por máquina de todas las métricas"""
+    return json.dumps({
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'ventana': VENTANA,
+        'operaciones': resumen().to_dict('records')
+    }, indent=2, ensure_ascii=False)
+
+def reiniciar():
+    """Borra todas las métricas acumuladas"""
+    with _lock:
+        _ventanas.clear()
+        _totales.clear()
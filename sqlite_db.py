@@ -0,0 +1,602 @@
+"""
+Backend SQLite embebido con la misma interfaz que SupabaseDB
+Sirve para operar sin conexión y como destino rápido y determinista para pruebas de carga
+"""
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+import metricas
+from errores import ErrorBackend
+from esquema import (BOOLEANAS_TRIESTADO, COLUMNAS_BOOLEANAS, COLUMNAS_INGRESOS_MENSUALES,
+                     COLUMNAS_PACIENTE, COLUMNAS_TRAYECTORIA, PERFILES_COLUMNAS, escapar_like,
+                     normalizar_evoluciones, normalizar_ingresos_mensuales,
+                     normalizar_pacientes, preparar_paciente, preparar_actualizacion)
+
+def es_transitorio(error):
+    """True si la base estaba ocupada por otra escritura (vale la pena reintentar)"""
+    return isinstance(error, sqlite3.OperationalError) and (
+        'locked' in str(error) or 'busy' in str(error))
+
+ESQUEMA_SQL = """
+CREATE TABLE IF NOT EXISTS pacientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero_historia TEXT NOT NULL UNIQUE,
+    edad INTEGER,
+    sexo TEXT,
+    fecha_ingreso TEXT,
+    diagnostico TEXT,
+    origen_tec TEXT,
+    lesiones_asociadas TEXT,
+    requiere_pic INTEGER,
+    requiere_arm INTEGER,
+    requiere_cranectomia INTEGER,
+    dias_uti INTEGER,
+    glasgow_ingreso INTEGER,
+    glasgow_actual INTEGER,
+    destino_post_uti TEXT,
+    tiene_drenaje INTEGER,
+    tipo_drenaje TEXT,
+    llevaba_casco INTEGER,
+    secuelas_motora INTEGER,
+    secuelas_neurologica INTEGER,
+    secuelas_cognitiva INTEGER,
+    observaciones TEXT,
+    fecha_ultima_actualizacion TEXT
+);
+
+-- Orden y cursor de la paginación por clave
+CREATE INDEX IF NOT EXISTS idx_pacientes_ingreso
+    ON pacientes (fecha_ingreso DESC, numero_historia DESC);
+-- Sincronización incremental
+CREATE INDEX IF NOT EXISTS idx_pacientes_actualizacion
+    ON pacientes (fecha_ultima_actualizacion);
+-- Búsqueda por prefijo: LIKE no distingue mayúsculas y solo usa un índice NOCASE
+CREATE INDEX IF NOT EXISTS idx_pacientes_historia_prefijo
+    ON pacientes (numero_historia COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS evoluciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero_historia TEXT NOT NULL REFERENCES pacientes (numero_historia),
+    fecha_evolucion TEXT NOT NULL,
+    dias_uti INTEGER,
+    glasgow_actual INTEGER,
+    requiere_pic INTEGER,
+    requiere_arm INTEGER,
+    requiere_cranectomia INTEGER,
+    observacion TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_evoluciones_historia
+    ON evoluciones (numero_historia, fecha_evolucion DESC);
+
+-- Notas de un paciente de a páginas, de la más reciente a la más antigua
+CREATE INDEX IF NOT EXISTS idx_evoluciones_notas
+    ON evoluciones (numero_historia, id DESC);
+"""
+
+# Resumen mensual de ingresos: cada columna suma esta expresión por paciente
+# ({f} es NEW u OLD dentro de los triggers, o pacientes al reconstruir)
+EXPRESIONES_INGRESOS_MENSUALES = {
+    'ingresos': '1',
+    'con_pic': 'coalesce({f}.requiere_pic, 0)',
+    'con_arm': 'coalesce({f}.requiere_arm, 0)',
+    'con_cranectomia': 'coalesce({f}.requiere_cranectomia, 0)',
+    'con_drenaje': 'coalesce({f}.tiene_drenaje, 0)',
+    'obitos': "coalesce({f}.destino_post_uti = 'Óbito', 0)",
+    'con_secuelas': ('coalesce({f}.secuelas_motora, 0) OR coalesce({f}.secuelas_neurologica, 0)'
+                     ' OR coalesce({f}.secuelas_cognitiva, 0)')
+}
+
+# Columnas de pacientes que cambian el resumen al modificarse
+COLUMNAS_RESUMEN_MENSUAL = [
+    'fecha_ingreso', 'requiere_pic', 'requiere_arm', 'requiere_cranectomia', 'tiene_drenaje',
+    'destino_post_uti', 'secuelas_motora', 'secuelas_neurologica', 'secuelas_cognitiva'
+]
+
+def _sumar_al_mes(fila, signo):
+    """Sentencia que suma (signo 1) o resta (signo -1) un paciente a su mes"""
+    valores = ', '.join(f"{signo} * ({EXPRESIONES_INGRESOS_MENSUALES[c].format(f=fila)})"
+                        for c in COLUMNAS_INGRESOS_MENSUALES)
+    actualizar = ', '.join(f"{c} = {c} + excluded.{c}" for c in COLUMNAS_INGRESOS_MENSUALES)
+    return f"""
+        INSERT INTO ingresos_mensuales (mes, {', '.join(COLUMNAS_INGRESOS_MENSUALES)})
+        SELECT substr({fila}.fecha_ingreso, 1, 7), {valores}
+        WHERE {fila}.fecha_ingreso IS NOT NULL
+        ON CONFLICT (mes) DO UPDATE SET {actualizar};"""
+
+# La tabla se mantiene con triggers: cada alta, cambio o baja de un paciente
+# ajusta solo la fila de su mes, sin recorrer la tabla pacientes
+ESQUEMA_INGRESOS_MENSUALES = f"""
+CREATE TABLE IF NOT EXISTS ingresos_mensuales (
+    mes TEXT PRIMARY KEY,
+    {', '.join(f'{c} INTEGER NOT NULL DEFAULT 0' for c in COLUMNAS_INGRESOS_MENSUALES)}
+);
+
+CREATE TRIGGER IF NOT EXISTS ingresos_mensuales_alta AFTER INSERT ON pacientes
+BEGIN {_sumar_al_mes('NEW', 1)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingresos_mensuales_baja AFTER DELETE ON pacientes
+BEGIN {_sumar_al_mes('OLD', -1)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS ingresos_mensuales_cambio
+AFTER UPDATE OF {', '.join(COLUMNAS_RESUMEN_MENSUAL)} ON pacientes
+BEGIN {_sumar_al_mes('OLD', -1)} {_sumar_al_mes('NEW', 1)}
+END;
+"""
+
+# Contador de escrituras por tabla, lo suben los triggers: es la firma de la sonda de
+# versión. Cambia con toda escritura, también con una que llega con una
+# fecha_ultima_actualizacion menor que la máxima (filas y máximo quedan iguales)
+ESQUEMA_CAMBIOS = """
+CREATE TABLE IF NOT EXISTS cambios_tablas (
+    tabla TEXT PRIMARY KEY,
+    cambios INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO cambios_tablas (tabla) VALUES ('pacientes'), ('evoluciones');
+""" + ''.join(f"""
+CREATE TRIGGER IF NOT EXISTS cambios_{tabla}_{nombre} AFTER {evento} ON {tabla}
+BEGIN UPDATE cambios_tablas SET cambios = cambios + 1 WHERE tabla = '{tabla}';
+END;
+""" for tabla in ('pacientes', 'evoluciones')
+    for evento, nombre in (('INSERT', 'alta'), ('UPDATE', 'cambio'), ('DELETE', 'baja')))
+
+class SQLiteDB:
+    def __init__(self, ruta, tamano_pagina=1000):
+        """Abre (o crea) la base SQLite en la ruta indicada"""
+        # Streamlit atiende cada sesión en un hilo distinto: una conexión compartida
+        # protegida por un lock; WAL permite leer mientras otro hilo escribe
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+        self.tamano_pagina = tamano_pagina
+
+        with self.lock:
+            self.conexion.execute("PRAGMA journal_mode=WAL")
+            self.conexion.execute("PRAGMA foreign_keys=ON")
+            resumen_creado = self.conexion.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'ingresos_mensuales'"
+            ).fetchone()
+            self.conexion.executescript(ESQUEMA_SQL + ESQUEMA_INGRESOS_MENSUALES + ESQUEMA_CAMBIOS)
+            if not resumen_creado:
+                # Base anterior al resumen: se arma una vez con lo que ya hay
+                self._reconstruir_ingresos_mensuales()
+
+    def _reconstruir_ingresos_mensuales(self):
+        sumas = ', '.join(f"sum({EXPRESIONES_INGRESOS_MENSUALES[c].format(f='pacientes')})"
+                          for c in COLUMNAS_INGRESOS_MENSUALES)
+        with self.lock, self.conexion:
+            self.conexion.execute("DELETE FROM ingresos_mensuales")
+            self.conexion.execute(f"""
+                INSERT INTO ingresos_mensuales (mes, {', '.join(COLUMNAS_INGRESOS_MENSUALES)})
+                SELECT substr(fecha_ingreso, 1, 7), {sumas} FROM pacientes
+                WHERE fecha_ingreso IS NOT NULL
+                GROUP BY substr(fecha_ingreso, 1, 7)
+            """)
+
+    def init_db(self):
+        """Las tablas e índices se crean al abrir la base"""
+        return True
+
+    def _consultar(self, sql, parametros=()):
+        with self.lock:
+            return [dict(fila) for fila in self.conexion.execute(sql, parametros).fetchall()]
+
+    def _a_dataframe(self, registros):
+        """Convierte filas SQLite a DataFrame con booleanos reales (0/1 -> False/True, NULL -> None)"""
+        df = pd.DataFrame(registros)
+        for col in COLUMNAS_BOOLEANAS:
+            if col in df.columns:
+                valores = df[col]
+                df[col] = valores.astype('boolean').astype(object).where(valores.notna(), None)
+        return df
+
+    @metricas.instrumentar
+    def insertar_paciente(self, **campos):
+        """Inserta un nuevo paciente; retorna False si ya existe uno con ese número de historia"""
+        try:
+            return bool(self._insertar([preparar_paciente(campos)]))
+        except Exception as e:
+            print(f"Error al insertar paciente: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('registrar el paciente', e) from e
+
+    es_transitorio = staticmethod(es_transitorio)
+
+    @metricas.instrumentar
+    def insertar_pacientes_lote(self, lista_campos, propagar=False):
+        """Inserta varios pacientes en una sola transacción, ignorando los ya existentes
+
+        Con propagar=True levanta el error en lugar de retornar None.
+        """
+        try:
+            return self._insertar([preparar_paciente(c) for c in lista_campos])
+        except Exception as e:
+            print(f"Error al insertar lote de pacientes: {e}")
+            metricas.marcar_error()
+            if propagar:
+                raise
+            return None
+
+    def _insertar(self, filas):
+        """INSERT ... ON CONFLICT DO NOTHING; retorna los numero_historia insertados"""
+        columnas = list(filas[0].keys())
+        sql = f"""
+            INSERT INTO pacientes ({', '.join(columnas)})
+            VALUES ({', '.join('?' for _ in columnas)})
+            ON CONFLICT (numero_historia) DO NOTHING
+        """
+        insertados = []
+        with self.lock, self.conexion:
+            for fila in filas:
+                cursor = self.conexion.execute(sql, [fila[c] for c in columnas])
+                if cursor.rowcount:
+                    insertados.append(fila['numero_historia'])
+        return insertados
+
+    def _iterar_registros(self, perfil='completo', condicion='', parametros=()):
+        """Recorre pacientes en páginas usando el mismo cursor por clave que SupabaseDB
+
+        Los pacientes sin fecha_ingreso van al final (NULLS LAST).
+        """
+        columnas = ", ".join(PERFILES_COLUMNAS[perfil])
+        cursor = None
+        while True:
+            filtros = [condicion] if condicion else []
+            valores = list(parametros)
+            if cursor and cursor[0] is None:
+                # Ya en el tramo sin fecha: solo quedan nulos con historia menor
+                filtros.append("(fecha_ingreso IS NULL AND numero_historia < ?)")
+                valores.append(cursor[1])
+            elif cursor:
+                filtros.append("(fecha_ingreso < ? OR fecha_ingreso IS NULL"
+                               " OR (fecha_ingreso = ? AND numero_historia < ?))")
+                valores += [cursor[0], cursor[0], cursor[1]]
+
+            where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+            registros = self._consultar(f"""
+                SELECT {columnas} FROM pacientes {where}
+                ORDER BY fecha_ingreso DESC NULLS LAST, numero_historia DESC
+                LIMIT ?
+            """, valores + [self.tamano_pagina])
+
+            if registros:
+                yield registros
+            if len(registros) < self.tamano_pagina:
+                break
+
+            ultima = registros[-1]
+            cursor = (ultima['fecha_ingreso'], ultima['numero_historia'])
+
+    def _leer_pacientes(self, perfil='completo', condicion='', parametros=()):
+        registros = []
+        for pagina in self._iterar_registros(perfil, condicion, parametros):
+            registros.extend(pagina)
+
+        if not registros:
+            return pd.DataFrame()
+
+        return normalizar_pacientes(self._a_dataframe(registros))
+
+    @metricas.instrumentar
+    def iterar_paginas_pacientes(self, perfil='completo'):
+        """Genera los pacientes como DataFrames normalizados de a una página"""
+        try:
+            for pagina in self._iterar_registros(perfil):
+                yield normalizar_pacientes(self._a_dataframe(pagina))
+        except Exception as e:
+            print(f"Error al recorrer pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('recorrer pacientes', e) from e
+
+    @metricas.instrumentar
+    def obtener_todos_pacientes(self, perfil='completo', fecha_desde=None, fecha_hasta=None):
+        """Obtiene los pacientes con las columnas del perfil, opcionalmente solo los ingresados en el período"""
+        try:
+            return self._leer_pacientes(perfil, *self._condicion_periodo(fecha_desde, fecha_hasta))
+        except Exception as e:
+            print(f"Error al obtener pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener pacientes', e) from e
+
+    @metricas.instrumentar
+    def obtener_pacientes_filtrados(self, filtros, perfil='completo'):
+        """Obtiene los pacientes que cumplen los filtros, resueltos en SQL (ver filtros.py)"""
+        try:
+            return self._leer_pacientes(perfil, *self._condicion_filtros(filtros))
+        except Exception as e:
+            print(f"Error al filtrar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('filtrar pacientes', e) from e
+
+    @metricas.instrumentar
+    def contar_pacientes(self, filtros=None):
+        """Cantidad de pacientes que cumplen los filtros"""
+        try:
+            condicion, parametros = self._condicion_filtros(filtros or {})
+            where = f"WHERE {condicion}" if condicion else ""
+            return self._consultar(f"SELECT count(*) AS total FROM pacientes {where}", parametros)[0]['total']
+        except Exception as e:
+            print(f"Error al contar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('contar pacientes', e) from e
+
+    @metricas.instrumentar
+    def obtener_pagina_pacientes(self, filtros=None, orden='fecha_ingreso', descendente=True,
+                                 pagina=0, tamano=50, perfil='tabla'):
+        """Una página de pacientes filtrada y ordenada en SQL"""
+        try:
+            if orden not in COLUMNAS_PACIENTE and orden != 'numero_historia':
+                raise ValueError(f"Columna no ordenable: {orden}")
+            condicion, parametros = self._condicion_filtros(filtros or {})
+            where = f"WHERE {condicion}" if condicion else ""
+            sentido = "DESC" if descendente else "ASC"
+            registros = self._consultar(f"""
+                SELECT {", ".join(PERFILES_COLUMNAS[perfil])} FROM pacientes {where}
+                ORDER BY {orden} {sentido}, numero_historia {sentido}
+                LIMIT ? OFFSET ?
+            """, parametros + (tamano, pagina * tamano))
+            if not registros:
+                return pd.DataFrame()
+
+            return normalizar_pacientes(self._a_dataframe(registros))
+        except Exception as e:
+            print(f"Error al obtener página de pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener página de pacientes', e) from e
+
+    @staticmethod
+    def _condicion_periodo(fecha_desde=None, fecha_hasta=None):
+        """Condición sobre fecha_ingreso para el período (cualquiera de los extremos puede faltar)"""
+        condiciones, parametros = [], []
+        if fecha_desde:
+            condiciones.append("fecha_ingreso >= ?")
+            parametros.append(str(fecha_desde))
+        if fecha_hasta:
+            condiciones.append("fecha_ingreso <= ?")
+            parametros.append(str(fecha_hasta))
+        return ' AND '.join(condiciones), tuple(parametros)
+
+    def _condicion_filtros(self, filtros):
+        """Traduce {columna: condición} a una cláusula WHERE con parámetros"""
+        condiciones, parametros = [], []
+        for col, condicion in filtros.items():
+            if col not in COLUMNAS_PACIENTE:
+                raise ValueError(f"Columna no filtrable: {col}")
+            if isinstance(condicion, tuple):
+                condiciones.append(f"{col} BETWEEN ? AND ?")
+                parametros += [str(v) if col == 'fecha_ingreso' else v for v in condicion]
+            elif isinstance(condicion, bool) and col in BOOLEANAS_TRIESTADO:
+                # Sin dato no es "Sí" ni "No" (NULL no cumple la igualdad)
+                condiciones.append(f"{col} = ?")
+                parametros.append(int(condicion))
+            elif isinstance(condicion, bool):
+                # Sin dato cuenta como "No", igual que en el filtrado en memoria
+                condiciones.append(f"coalesce({col}, 0) = ?")
+                parametros.append(int(condicion))
+            else:
+                condiciones.append(f"{col} IN ({', '.join('?' for _ in condicion)})")
+                parametros += list(condicion)
+        return ' AND '.join(condiciones), tuple(parametros)
+
+    @metricas.instrumentar
+    def obtener_pacientes_modificados_desde(self, marca, perfil='completo'):
+        """Obtiene solo los pacientes insertados o modificados desde la marca dada"""
+        try:
+            return self._leer_pacientes(perfil, "fecha_ultima_actualizacion >= ?", (marca,))
+        except Exception as e:
+            print(f"Error al sincronizar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('sincronizar pacientes', e) from e
+
+    @metricas.instrumentar
+    def buscar_pacientes(self, prefijo, limite=20, perfil='evolucion'):
+        """Pacientes cuyo numero_historia empieza con el prefijo (sin distinguir mayúsculas)"""
+        columnas = ", ".join(PERFILES_COLUMNAS[perfil])
+        try:
+            if prefijo:
+                registros = self._consultar(f"""
+                    SELECT {columnas} FROM pacientes
+                    WHERE numero_historia LIKE ? ESCAPE '\\'
+                    ORDER BY numero_historia LIMIT ?
+                """, (f"{escapar_like(prefijo)}%", limite))
+            else:
+                registros = self._consultar(f"""
+                    SELECT {columnas} FROM pacientes
+                    ORDER BY fecha_ingreso DESC, numero_historia DESC LIMIT ?
+                """, (limite,))
+            if not registros:
+                return pd.DataFrame()
+
+            return normalizar_pacientes(self._a_dataframe(registros))
+        except Exception as e:
+            print(f"Error al buscar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('buscar pacientes', e) from e
+
+    @metricas.instrumentar
+    def obtener_paciente_por_historia(self, numero_historia):
+        """Obtiene un paciente específico"""
+        try:
+            registros = self._consultar(
+                "SELECT * FROM pacientes WHERE numero_historia = ?", (str(numero_historia),)
+            )
+            if not registros:
+                return pd.DataFrame()
+
+            return self._a_dataframe(registros)
+        except Exception as e:
+            print(f"Error al obtener paciente: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener paciente', e) from e
+
+    @metricas.instrumentar
+    def actualizar_paciente(self, numero_historia, **campos):
+        """Actualiza un paciente y registra su evolución en una sola transacción"""
+        datos, evolucion = preparar_actualizacion(numero_historia, campos)
+        columnas = [c for c in datos if c in COLUMNAS_PACIENTE]
+        try:
+            with self.lock, self.conexion:
+                cursor = self.conexion.execute(
+                    f"UPDATE pacientes SET {', '.join(f'{c} = ?' for c in columnas)} "
+                    "WHERE numero_historia = ?",
+                    [datos[c] for c in columnas] + [numero_historia]
+                )
+                if not cursor.rowcount:
+                    return False
+
+                if evolucion:
+                    evolucion = dict(evolucion, fecha_evolucion=datetime.now().isoformat())
+                    self.conexion.execute(
+                        f"INSERT INTO evoluciones ({', '.join(evolucion)}) "
+                        f"VALUES ({', '.join('?' for _ in evolucion)})",
+                        list(evolucion.values())
+                    )
+            return True
+        except Exception as e:
+            print(f"Error al actualizar paciente: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('actualizar el paciente', e) from e
+
+    @metricas.instrumentar
+    def obtener_evoluciones_paciente(self, numero_historia):
+        """Obtiene el historial de evoluciones"""
+        try:
+            registros = self._consultar(
+                "SELECT * FROM evoluciones WHERE numero_historia = ? ORDER BY fecha_evolucion DESC",
+                (str(numero_historia),)
+            )
+            if not registros:
+                return pd.DataFrame()
+
+            return self._a_dataframe(registros)
+        except Exception as e:
+            print(f"Error al obtener evoluciones: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener evoluciones', e) from e
+
+    @metricas.instrumentar
+    def obtener_notas_paciente(self, numero_historia, antes_de_id=None, limite=20):
+        """Una página de notas de evolución, de la más reciente a la más antigua
+
+        Para la página siguiente se pasa el id de la última nota recibida.
+        """
+        try:
+            condicion = "AND id < ?" if antes_de_id is not None else ""
+            parametros = (str(numero_historia),) + ((antes_de_id,) if antes_de_id is not None else ())
+            registros = self._consultar(f"""
+                SELECT id, fecha_evolucion, observacion FROM evoluciones
+                WHERE numero_historia = ? AND observacion <> '' {condicion}
+                ORDER BY id DESC LIMIT ?
+            """, parametros + (limite,))
+            return pd.DataFrame(registros, columns=['id', 'fecha_evolucion', 'observacion'])
+        except Exception as e:
+            print(f"Error al obtener notas: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener notas', e) from e
+
+    @metricas.instrumentar
+    def obtener_evoluciones(self, desde_id=0):
+        """Obtiene todas las evoluciones con id mayor a desde_id (sin la observación)"""
+        try:
+            registros = []
+            ultimo = desde_id
+            while True:
+                pagina = self._consultar(f"""
+                    SELECT {', '.join(COLUMNAS_TRAYECTORIA)} FROM evoluciones
+                    WHERE id > ? ORDER BY id LIMIT ?
+                """, (ultimo, self.tamano_pagina))
+                registros.extend(pagina)
+                if len(pagina) < self.tamano_pagina:
+                    break
+                ultimo = pagina[-1]['id']
+
+            if not registros:
+                return pd.DataFrame()
+
+            return normalizar_evoluciones(self._a_dataframe(registros))
+        except Exception as e:
+            print(f"Error al obtener evoluciones: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener evoluciones', e) from e
+
+    @metricas.instrumentar
+    def obtener_ingresos_mensuales(self, fecha_desde=None, fecha_hasta=None):
+        """Resumen mensual de ingresos (tabla ingresos_mensuales) de los meses del período"""
+        try:
+            condiciones, parametros = ["ingresos > 0"], []
+            if fecha_desde:
+                condiciones.append("mes >= ?")
+                parametros.append(str(fecha_desde)[:7])
+            if fecha_hasta:
+                condiciones.append("mes <= ?")
+                parametros.append(str(fecha_hasta)[:7])
+            registros = self._consultar(f"""
+                SELECT mes, {', '.join(COLUMNAS_INGRESOS_MENSUALES)} FROM ingresos_mensuales
+                WHERE {' AND '.join(condiciones)} ORDER BY mes
+            """, parametros)
+            return normalizar_ingresos_mensuales(pd.DataFrame(registros))
+        except Exception as e:
+            print(f"Error al obtener ingresos mensuales: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener ingresos mensuales', e) from e
+
+    @metricas.instrumentar
+    def sondear_version(self):
+        """Firma de cada tabla (contador de escrituras), igual que version_datos() de Postgres"""
+        try:
+            return {
+                fila['tabla']: {'cambios': fila['cambios']}
+                for fila in self._consultar("SELECT tabla, cambios FROM cambios_tablas")
+            }
+        except Exception as e:
+            print(f"Error al consultar la versión de los datos: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('consultar la versión de los datos', e) from e
+
+    @metricas.instrumentar
+    def obtener_estadisticas(self):
+        """Resumen agregado calculado en SQL, con las mismas claves que estadisticas_pacientes()"""
+        try:
+            fila = self._consultar("""
+                SELECT
+                    count(*) AS total_pacientes,
+                    count(*) FILTER (WHERE requiere_pic) AS con_pic,
+                    count(*) FILTER (WHERE requiere_arm) AS con_arm,
+                    count(*) FILTER (WHERE requiere_cranectomia) AS con_cranectomia,
+                    count(*) FILTER (WHERE tiene_drenaje) AS con_drenaje,
+                    coalesce(avg(coalesce(edad, 0)), 0) AS edad_promedio,
+                    coalesce(sum(coalesce(edad, 0) * coalesce(edad, 0)), 0) AS edad_cuadrados,
+                    coalesce(min(coalesce(edad, 0)), 0) AS edad_min,
+                    coalesce(max(coalesce(edad, 0)), 0) AS edad_max,
+                    coalesce(avg(coalesce(dias_uti, 0)), 0) AS dias_uti_promedio,
+                    coalesce(sum(coalesce(dias_uti, 0) * coalesce(dias_uti, 0)), 0) AS dias_uti_cuadrados,
+                    coalesce(max(coalesce(dias_uti, 0)), 0) AS dias_uti_max
+                FROM pacientes
+            """)[0]
+
+            # SQLite no trae stddev: desvío muestral a partir de la suma de cuadrados
+            n = fila['total_pacientes']
+            for medida in ['edad', 'dias_uti']:
+                cuadrados = fila.pop(f'{medida}_cuadrados')
+                promedio = fila[f'{medida}_promedio']
+                varianza = (cuadrados - n * promedio ** 2) / (n - 1) if n > 1 else 0
+                fila[f'{medida}_desvio'] = max(varianza, 0) ** 0.5
+
+            for col in ['origen_tec', 'sexo', 'destino_post_uti']:
+                fila[f'por_{col}'] = {
+                    r['valor']: r['cantidad'] for r in self._consultar(
+                        f"SELECT {col} AS valor, count(*) AS cantidad FROM pacientes "
+                        f"WHERE {col} IS NOT NULL GROUP BY {col}"
+                    )
+                }
+            return fila
+        except Exception as e:
+            print(f"Error al obtener estadísticas: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener estadísticas', e) from e
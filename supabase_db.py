@@ -3,22 +3,89 @@ Backend de Supabase para persistencia en cloud
 Mucho más simple que Google Sheets
 """
 import pandas as pd
-from datetime import datetime
 import os
+import random
+import time
 
 try:
-    from supabase import create_client, Client
+    import httpx
+    from supabase import create_client, Client, ClientOptions
+    from postgrest.exceptions import APIError
     SUPABASE_AVAILABLE = True
 except ImportError:
     SUPABASE_AVAILABLE = False
 
+import metricas
+from errores import ErrorBackend
+from esquema import (BOOLEANAS_TRIESTADO, COLUMNAS_INGRESOS_MENSUALES, COLUMNAS_TRAYECTORIA,
+                     PERFILES_COLUMNAS, escapar_like, normalizar_evoluciones, normalizar_ingresos_mensuales,
+                     normalizar_pacientes, preparar_paciente, preparar_actualizacion)
+
+# Respuestas que vale la pena reintentar: gateway caído o saturado y los errores
+# de PostgREST por no poder conectarse a Postgres (PGRST000-003)
+HTTP_TRANSITORIOS = {408, 429, 502, 503, 504, 520, 522, 524}
+PGRST_TRANSITORIOS = {'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003'}
+
+# Espera base entre reintentos (segundos); se duplica en cada intento
+ESPERA_BASE = 0.25
+
+def es_transitorio(error):
+    """True si el error es de red/timeout o una respuesta que puede salir bien al reintentar"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, APIError):
+        return error.code in PGRST_TRANSITORIOS or str(error.code) in {str(c) for c in HTTP_TRANSITORIOS}
+    return False
+
 class SupabaseDB:
-    def __init__(self, url, key):
+    def __init__(self, url, key, tamano_pagina=1000, conexiones=10, timeout_conexion=5,
+                 timeout_lectura=15, reintentos=3):
         """Inicializa conexión con Supabase"""
         if not SUPABASE_AVAILABLE:
             raise ImportError("Supabase library not available. Install: pip install supabase")
         
-        self.supabase: Client = create_client(url, key)
+        # Un solo cliente HTTP por proceso: las conexiones keep-alive se reutilizan
+        # entre reruns y sesiones, y ninguna petición espera sin límite
+        timeout = httpx.Timeout(timeout_lectura, connect=timeout_conexion, pool=timeout_conexion)
+        self.http = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=conexiones, max_keepalive_connections=conexiones,
+                                keepalive_expiry=60),
+            follow_redirects=True
+        )
+        self.supabase: Client = create_client(url, key, options=ClientOptions(
+            httpx_client=self.http, postgrest_client_timeout=timeout
+        ))
+        self.reintentos = reintentos
+        # Tamaño de cada respuesta de PostgREST, atribuido a la operación en curso
+        self.supabase.postgrest.session.event_hooks['response'].append(self._registrar_respuesta)
+        # No debe superar el max-rows de PostgREST (1000 por defecto)
+        self.tamano_pagina = tamano_pagina
+        # Se desactiva si la función actualizar_paciente_con_evolucion no está instalada
+        self._rpc_actualizar = True
+        # Se desactiva si falta la restricción UNIQUE de numero_historia (ver _insertar)
+        self._upsert = True
+    
+    def _leer(self, consulta):
+        """Ejecuta una consulta de lectura reintentando los fallos transitorios
+
+        Espera exponencial con jitter completo (entre 0 y ESPERA_BASE * 2^intento)
+        para que las sesiones no reintenten todas a la vez. Solo para lecturas:
+        repetir una escritura podría aplicarla dos veces.
+        """
+        for intento in range(self.reintentos + 1):
+            try:
+                # Los reintentos propios de postgrest esperan hasta 30 s y sin jitter
+                return consulta.retry(False).execute()
+            except Exception as e:
+                if intento == self.reintentos or not es_transitorio(e):
+                    raise
+            time.sleep(random.uniform(0, ESPERA_BASE * 2 ** intento))
+    
+    @staticmethod
+    def _registrar_respuesta(response):
+        response.read()
+        metricas.registrar_bytes(len(response.content))
     
     def init_db(self):
         """Las tablas se crean desde el dashboard de Supabase"""
@@ -31,86 +98,252 @@ class SupabaseDB:
             print(f"Error: {e}")
             return True  # Retornar True para que la app no falle
     
+    @metricas.instrumentar
     def insertar_paciente(self, **campos):
-        """Inserta un nuevo paciente"""
+        """Inserta un nuevo paciente; retorna False si ya existe uno con ese número de historia"""
         try:
-            # Verificar si ya existe
-            existing = self.supabase.table('pacientes')\
-                .select("*")\
-                .eq('numero_historia', campos['numero_historia'])\
-                .execute()
+            return bool(self._insertar([preparar_paciente(campos)]))
+        except Exception as e:
+            print(f"Error al insertar paciente: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('registrar el paciente', e) from e
+    
+    es_transitorio = staticmethod(es_transitorio)
+    
+    @metricas.instrumentar
+    def insertar_pacientes_lote(self, lista_campos, propagar=False):
+        """Inserta varios pacientes en una sola petición, ignorando los ya existentes.
+        
+        Retorna la lista de numero_historia realmente insertados, o None si falló el lote.
+        Con propagar=True levanta el error para que quien llama decida si reintentar.
+        """
+        try:
+            return self._insertar([preparar_paciente(c) for c in lista_campos])
+        except Exception as e:
+            print(f"Error al insertar lote de pacientes: {e}")
+            metricas.marcar_error()
+            if propagar:
+                raise
+            return None
+    
+    def _insertar(self, filas):
+        """Inserta ignorando los numero_historia ya existentes; retorna los insertados
+        
+        Un solo viaje: la restricción UNIQUE de numero_historia detecta el duplicado
+        y PostgREST devuelve solo las filas que realmente se insertaron.
+        """
+        if self._upsert:
+            try:
+                response = self.supabase.table('pacientes')\
+                    .upsert(filas, on_conflict='numero_historia', ignore_duplicates=True)\
+                    .execute()
+                return [fila['numero_historia'] for fila in response.data]
+            except APIError as e:
+                # 42P10: falta la restricción UNIQUE (supabase_funciones.sql)
+                if e.code != '42P10':
+                    raise
+                self._upsert = False
+        return self._insertar_en_dos_pasos(filas)
+    
+    def _insertar_en_dos_pasos(self, filas):
+        """Equivalente sin la restricción: busca las historias existentes e inserta el resto (no atómico)"""
+        existentes = self._leer(self.supabase.table('pacientes')
+            .select('numero_historia')
+            .in_('numero_historia', [fila['numero_historia'] for fila in filas]))
+        vistas = {fila['numero_historia'] for fila in existentes.data}
+        nuevas = []
+        for fila in filas:
+            # Una historia repetida dentro del mismo lote se inserta una sola vez
+            if fila['numero_historia'] not in vistas:
+                vistas.add(fila['numero_historia'])
+                nuevas.append(fila)
+        if not nuevas:
+            return []
+        response = self.supabase.table('pacientes').insert(nuevas).execute()
+        return [fila['numero_historia'] for fila in response.data]
+    
+    def _iterar_registros(self, perfil='completo', filtrar=None):
+        """Recorre la tabla pacientes en páginas de tamano_pagina filas.
+        
+        Usa paginación por clave (fecha_ingreso, numero_historia) en lugar de
+        offset, así cada página es una consulta indexada de tamaño acotado y
+        no se pierde ninguna fila por el límite de max-rows de PostgREST.
+        Los pacientes sin fecha_ingreso van al final (nullslast).
+        """
+        cursor = None
+        while True:
+            consulta = self.supabase.table('pacientes').select(",".join(PERFILES_COLUMNAS[perfil]))
+            if filtrar:
+                consulta = filtrar(consulta)
+            if cursor:
+                fecha, historia = cursor
+                if fecha is None:
+                    # Ya en el tramo sin fecha: solo quedan nulos con historia menor
+                    consulta = consulta.is_('fecha_ingreso', 'null').lt('numero_historia', historia)
+                else:
+                    consulta = consulta.or_(
+                        f'fecha_ingreso.lt."{fecha}",'
+                        f'fecha_ingreso.is.null,'
+                        f'and(fecha_ingreso.eq."{fecha}",numero_historia.lt."{historia}")'
+                    )
             
-            if existing.data:
-                return False
+            response = self._leer(consulta
+                .order('fecha_ingreso', desc=True, nullsfirst=False)
+                .order('numero_historia', desc=True)
+                .limit(self.tamano_pagina))
             
-            # Preparar datos
-            datos = {
-                'numero_historia': campos['numero_historia'],
-                'edad': campos['edad'],
-                'sexo': campos['sexo'],
-                'fecha_ingreso': campos['fecha_ingreso'],
-                'diagnostico': campos['diagnostico'],
-                'origen_tec': campos['origen_tec'],
-                'lesiones_asociadas': campos['lesiones_asociadas'],
-                'requiere_pic': campos['requiere_pic'],
-                'requiere_arm': campos['requiere_arm'],
-                'requiere_cranectomia': campos['requiere_cranectomia'],
-                'dias_uti': campos['dias_uti'],
-                'glasgow_ingreso': campos['glasgow_ingreso'],
-                'glasgow_actual': campos['glasgow_actual'],
-                'destino_post_uti': campos.get('destino_post_uti', ''),
-                'tiene_drenaje': campos.get('tiene_drenaje', False),
-                'tipo_drenaje': campos.get('tipo_drenaje', ''),
-                'llevaba_casco': campos.get('llevaba_casco'),
-                'secuelas_motora': campos.get('secuelas_motora', False),
-                'secuelas_neurologica': campos.get('secuelas_neurologica', False),
-                'secuelas_cognitiva': campos.get('secuelas_cognitiva', False),
-                'observaciones': campos.get('observaciones', '')
-            }
+            if response.data:
+                yield response.data
+            if len(response.data) < self.tamano_pagina:
+                break
             
-            self.supabase.table('pacientes').insert(datos).execute()
-            return True
+            ultima = response.data[-1]
+            cursor = (ultima['fecha_ingreso'], ultima['numero_historia'])
+    
+    def _leer_pacientes(self, perfil='completo', filtrar=None):
+        """Arma un único DataFrame normalizado con todas las páginas"""
+        registros = []
+        for pagina in self._iterar_registros(perfil, filtrar):
+            registros.extend(pagina)
+        
+        if not registros:
+            return pd.DataFrame()
+        
+        return normalizar_pacientes(pd.DataFrame(registros))
+    
+    @metricas.instrumentar
+    def iterar_paginas_pacientes(self, perfil='completo'):
+        """Genera los pacientes como DataFrames normalizados de a una página"""
+        try:
+            for pagina in self._iterar_registros(perfil):
+                yield normalizar_pacientes(pd.DataFrame(pagina))
         except Exception as e:
-            print(f"Error al insertar paciente: {e}")
-            return False
+            print(f"Error al recorrer pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('recorrer pacientes', e) from e
+    
+    @metricas.instrumentar
+    def obtener_todos_pacientes(self, perfil='completo', fecha_desde=None, fecha_hasta=None):
+        """Obtiene los pacientes con las columnas del perfil, opcionalmente solo los ingresados en el período"""
+        try:
+            return self._leer_pacientes(
+                perfil,
+                lambda consulta: self._filtrar_periodo(consulta, fecha_desde, fecha_hasta)
+            )
+        except Exception as e:
+            print(f"Error al obtener pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener pacientes', e) from e
+    
+    @metricas.instrumentar
+    def obtener_pacientes_filtrados(self, filtros, perfil='completo'):
+        """Obtiene los pacientes que cumplen los filtros, resueltos en el servidor (ver filtros.py)"""
+        try:
+            return self._leer_pacientes(perfil, lambda consulta: self._aplicar_filtros(consulta, filtros))
+        except Exception as e:
+            print(f"Error al filtrar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('filtrar pacientes', e) from e
+    
+    @metricas.instrumentar
+    def contar_pacientes(self, filtros=None):
+        """Cantidad de pacientes que cumplen los filtros (HEAD con count exacto, sin traer filas)"""
+        try:
+            consulta = self.supabase.table('pacientes').select('numero_historia', count='exact', head=True)
+            return self._leer(self._aplicar_filtros(consulta, filtros or {})).count or 0
+        except Exception as e:
+            print(f"Error al contar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('contar pacientes', e) from e
     
-    def obtener_todos_pacientes(self):
-        """Obtiene todos los pacientes"""
+    @metricas.instrumentar
+    def obtener_pagina_pacientes(self, filtros=None, orden='fecha_ingreso', descendente=True,
+                                 pagina=0, tamano=50, perfil='tabla'):
+        """Una página de pacientes filtrada y ordenada en el servidor"""
         try:
-            response = self.supabase.table('pacientes')\
-                .select("*")\
-                .order('fecha_ingreso', desc=True)\
-                .execute()
+            inicio = pagina * tamano
+            consulta = self.supabase.table('pacientes').select(",".join(PERFILES_COLUMNAS[perfil]))
+            response = self._leer(self._aplicar_filtros(consulta, filtros or {})
+                .order(orden, desc=descendente)
+                .order('numero_historia', desc=descendente)
+                .range(inicio, inicio + tamano - 1))
             
             if not response.data:
                 return pd.DataFrame()
             
-            df = pd.DataFrame(response.data)
+            return normalizar_pacientes(pd.DataFrame(response.data))
+        except Exception as e:
+            print(f"Error al obtener página de pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener página de pacientes', e) from e
+    
+    @staticmethod
+    def _filtrar_periodo(consulta, fecha_desde=None, fecha_hasta=None):
+        """Restringe fecha_ingreso al período (cualquiera de los extremos puede faltar)"""
+        if fecha_desde:
+            consulta = consulta.gte('fecha_ingreso', str(fecha_desde))
+        if fecha_hasta:
+            consulta = consulta.lte('fecha_ingreso', str(fecha_hasta))
+        return consulta
+    
+    def _aplicar_filtros(self, consulta, filtros):
+        """Traduce {columna: condición} a filtros de PostgREST"""
+        for col, condicion in filtros.items():
+            if isinstance(condicion, tuple):
+                desde, hasta = (str(v) for v in condicion)
+                consulta = consulta.gte(col, desde).lte(col, hasta)
+            elif isinstance(condicion, bool) and col in BOOLEANAS_TRIESTADO:
+                # Sin dato no es "Sí" ni "No" (NULL no cumple eq)
+                consulta = consulta.eq(col, condicion)
+            elif isinstance(condicion, bool):
+                # Sin dato cuenta como "No", igual que en el filtrado en memoria
+                consulta = consulta.is_(col, 'true') if condicion else consulta.not_.is_(col, 'true')
+            else:
+                consulta = consulta.in_(col, list(condicion))
+        return consulta
+    
+    @metricas.instrumentar
+    def obtener_pacientes_modificados_desde(self, marca, perfil='completo'):
+        """Obtiene solo los pacientes insertados o modificados desde la marca dada"""
+        try:
+            return self._leer_pacientes(
+                perfil,
+                lambda consulta: consulta.gte('fecha_ultima_actualizacion', marca)
+            )
+        except Exception as e:
+            print(f"Error al sincronizar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('sincronizar pacientes', e) from e
+    
+    @metricas.instrumentar
+    def buscar_pacientes(self, prefijo, limite=20, perfil='evolucion'):
+        """Pacientes cuyo numero_historia empieza con el prefijo (ilike en el servidor)"""
+        try:
+            consulta = self.supabase.table('pacientes').select(",".join(PERFILES_COLUMNAS[perfil]))
+            if prefijo:
+                consulta = consulta\
+                    .ilike('numero_historia', f"{escapar_like(prefijo)}%")\
+                    .order('numero_historia')
+            else:
+                consulta = consulta.order('fecha_ingreso', desc=True)
             
-            # Convertir tipos de datos
-            if not df.empty:
-                for col in ['requiere_pic', 'requiere_arm', 'requiere_cranectomia', 
-                           'tiene_drenaje', 'secuelas_motora', 'secuelas_neurologica', 
-                           'secuelas_cognitiva', 'llevaba_casco']:
-                    if col in df.columns:
-                        df[col] = df[col].fillna(False)
-                
-                for col in ['edad', 'dias_uti', 'glasgow_ingreso', 'glasgow_actual']:
-                    if col in df.columns:
-                        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+            response = self._leer(consulta.limit(limite))
+            if not response.data:
+                return pd.DataFrame()
             
-            return df
+            return normalizar_pacientes(pd.DataFrame(response.data))
         except Exception as e:
-            print(f"Error al obtener pacientes: {e}")
-            return pd.DataFrame()
+            print(f"Error al buscar pacientes: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('buscar pacientes', e) from e
     
+    @metricas.instrumentar
     def obtener_paciente_por_historia(self, numero_historia):
         """Obtiene un paciente específico"""
         try:
-            response = self.supabase.table('pacientes')\
-                .select("*")\
-                .eq('numero_historia', str(numero_historia))\
-                .execute()
+            response = self._leer(self.supabase.table('pacientes')
+                .select("*")
+                .eq('numero_historia', str(numero_historia)))
             
             if not response.data:
                 return pd.DataFrame()
@@ -118,53 +351,57 @@ class SupabaseDB:
             return pd.DataFrame(response.data)
         except Exception as e:
             print(f"Error al obtener paciente: {e}")
-            return pd.DataFrame()
+            metricas.marcar_error()
+            raise ErrorBackend('obtener paciente', e) from e
     
+    @metricas.instrumentar
     def actualizar_paciente(self, numero_historia, **campos):
-        """Actualiza un paciente existente"""
+        """Actualiza un paciente y registra su evolución en una sola transacción"""
+        datos, evolucion = preparar_actualizacion(numero_historia, campos)
         try:
-            # Preparar datos para actualizar
-            datos = {}
-            for key, value in campos.items():
-                if key != 'numero_historia':
-                    datos[key] = value
-            
-            if 'fecha_ultima_actualizacion' not in datos:
-                datos['fecha_ultima_actualizacion'] = datetime.now().isoformat()
-            
-            # Actualizar
-            self.supabase.table('pacientes')\
-                .update(datos)\
-                .eq('numero_historia', numero_historia)\
-                .execute()
-            
-            # Registrar evolución si hay cambios relevantes
-            if any(k in campos for k in ['dias_uti', 'glasgow_actual', 'requiere_pic', 'requiere_arm', 'requiere_cranectomia']):
-                evolucion = {
-                    'numero_historia': numero_historia,
-                    'dias_uti': campos.get('dias_uti'),
-                    'glasgow_actual': campos.get('glasgow_actual'),
-                    'requiere_pic': campos.get('requiere_pic'),
-                    'requiere_arm': campos.get('requiere_arm'),
-                    'requiere_cranectomia': campos.get('requiere_cranectomia'),
-                    'observacion': campos.get('observaciones', '')
-                }
-                
-                self.supabase.table('evoluciones').insert(evolucion).execute()
+            if self._rpc_actualizar:
+                try:
+                    response = self.supabase.rpc('actualizar_paciente_con_evolucion', {
+                        'p_numero_historia': numero_historia,
+                        'p_datos': datos,
+                        'p_evolucion': evolucion
+                    }).execute()
+                    return bool(response.data)
+                except APIError as e:
+                    # PGRST202: la función no está instalada en este proyecto
+                    if e.code != 'PGRST202':
+                        raise
+                    self._rpc_actualizar = False
             
-            return True
+            return self._actualizar_en_dos_pasos(numero_historia, datos, evolucion)
         except Exception as e:
             print(f"Error al actualizar paciente: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('actualizar el paciente', e) from e
+    
+    def _actualizar_en_dos_pasos(self, numero_historia, datos, evolucion):
+        """Equivalente sin RPC: update y luego insert (no atómico)"""
+        response = self.supabase.table('pacientes')\
+            .update(datos)\
+            .eq('numero_historia', numero_historia)\
+            .execute()
+        if not response.data:
+            # La historia no existe: no hay evolución que registrar
             return False
+        
+        if evolucion:
+            self.supabase.table('evoluciones').insert(evolucion).execute()
+        
+        return True
     
+    @metricas.instrumentar
     def obtener_evoluciones_paciente(self, numero_historia):
         """Obtiene el historial de evoluciones"""
         try:
-            response = self.supabase.table('evoluciones')\
-                .select("*")\
-                .eq('numero_historia', str(numero_historia))\
-                .order('fecha_evolucion', desc=True)\
-                .execute()
+            response = self._leer(self.supabase.table('evoluciones')
+                .select("*")
+                .eq('numero_historia', str(numero_historia))
+                .order('fecha_evolucion', desc=True))
             
             if not response.data:
                 return pd.DataFrame()
@@ -172,4 +409,115 @@ class SupabaseDB:
             return pd.DataFrame(response.data)
         except Exception as e:
             print(f"Error al obtener evoluciones: {e}")
-            return pd.DataFrame()
+            metricas.marcar_error()
+            raise ErrorBackend('obtener evoluciones', e) from e
+    
+    @metricas.instrumentar
+    def obtener_notas_paciente(self, numero_historia, antes_de_id=None, limite=20):
+        """Una página de notas de evolución, de la más reciente a la más antigua
+
+        Para la página siguiente se pasa el id de la última nota recibida.
+        """
+        try:
+            consulta = self.supabase.table('evoluciones')\
+                .select('id,fecha_evolucion,observacion')\
+                .eq('numero_historia', str(numero_historia))\
+                .neq('observacion', '')
+            if antes_de_id is not None:
+                consulta = consulta.lt('id', antes_de_id)
+            
+            response = self._leer(consulta.order('id', desc=True).limit(limite))
+            return pd.DataFrame(response.data, columns=['id', 'fecha_evolucion', 'observacion'])
+        except Exception as e:
+            print(f"Error al obtener notas: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener notas', e) from e
+    
+    @metricas.instrumentar
+    def obtener_ingresos_mensuales(self, fecha_desde=None, fecha_hasta=None):
+        """Resumen mensual de ingresos (tabla ingresos_mensuales) de los meses del período
+        
+        Retorna None si la tabla no está creada (supabase_funciones.sql).
+        """
+        try:
+            consulta = self.supabase.table('ingresos_mensuales')\
+                .select(",".join(['mes'] + COLUMNAS_INGRESOS_MENSUALES))\
+                .gt('ingresos', 0)
+            if fecha_desde:
+                consulta = consulta.gte('mes', str(fecha_desde)[:7])
+            if fecha_hasta:
+                consulta = consulta.lte('mes', str(fecha_hasta)[:7])
+            # Un mes por fila: aun con décadas de datos entra en una página
+            response = self._leer(consulta.order('mes'))
+            return normalizar_ingresos_mensuales(pd.DataFrame(response.data))
+        except Exception as e:
+            # PGRST205 / 42P01: la tabla no existe, se calcula en la app
+            if isinstance(e, APIError) and e.code in ('PGRST205', '42P01'):
+                return None
+            print(f"Error al obtener ingresos mensuales: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener ingresos mensuales', e) from e
+    
+    @metricas.instrumentar
+    def obtener_evoluciones(self, desde_id=0):
+        """Obtiene todas las evoluciones con id mayor a desde_id (sin la observación)
+
+        Las evoluciones solo se agregan, así que alcanza con paginar por id y
+        pedir las nuevas a partir del último id conocido.
+        """
+        try:
+            registros = []
+            ultimo = desde_id
+            while True:
+                response = self._leer(self.supabase.table('evoluciones')
+                    .select(",".join(COLUMNAS_TRAYECTORIA))
+                    .gt('id', ultimo)
+                    .order('id')
+                    .limit(self.tamano_pagina))
+                
+                registros.extend(response.data)
+                if len(response.data) < self.tamano_pagina:
+                    break
+                ultimo = response.data[-1]['id']
+            
+            if not registros:
+                return pd.DataFrame()
+            
+            return normalizar_evoluciones(pd.DataFrame(registros))
+        except Exception as e:
+            print(f"Error al obtener evoluciones: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener evoluciones', e) from e
+    
+    @metricas.instrumentar
+    def sondear_version(self):
+        """Firma de cada tabla (contador de escrituras) para saber si cambió sin descargarla
+
+        Usa la RPC version_datos(); si no está instalada retorna None y el caché
+        se refresca como siempre (filas y última modificación no alcanzan: una
+        escritura que confirma tarde no cambia ninguna de las dos).
+        """
+        try:
+            return self._leer(self.supabase.rpc('version_datos')).data
+        except Exception as e:
+            # PGRST202: la función no está instalada, se sigue sin sonda
+            if isinstance(e, APIError) and e.code == 'PGRST202':
+                return None
+            print(f"Error al consultar la versión de los datos: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('consultar la versión de los datos', e) from e
+    
+    @metricas.instrumentar
+    def obtener_estadisticas(self):
+        """Obtiene el resumen agregado calculado en Postgres (RPC estadisticas_pacientes)"""
+        try:
+            # La función es STABLE: se puede reintentar aunque vaya por POST
+            response = self._leer(self.supabase.rpc('estadisticas_pacientes'))
+            return response.data
+        except Exception as e:
+            # PGRST202: la función no está instalada, se calcula en la app
+            if isinstance(e, APIError) and e.code == 'PGRST202':
+                return None
+            print(f"Error al obtener estadísticas: {e}")
+            metricas.marcar_error()
+            raise ErrorBackend('obtener estadísticas', e) from e
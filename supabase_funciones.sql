@@ -0,0 +1,318 @@
+-- Funciones y vistas del lado del servidor para la app
+-- Ejecutar en el SQL Editor de Supabase después de crear las tablas
+-- (es seguro volver a ejecutarlo: todo es idempotente)
+
+-- ==================== RESTRICCIONES ====================
+-- numero_historia único: permite insertar con detección de conflicto en
+-- un solo viaje (INSERT ... ON CONFLICT DO NOTHING desde la app)
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'pacientes_numero_historia_key'
+    ) THEN
+        ALTER TABLE pacientes
+            ADD CONSTRAINT pacientes_numero_historia_key UNIQUE (numero_historia);
+    END IF;
+END $$;
+
+-- ==================== PAGINACIÓN ====================
+-- Orden y cursor de la lectura por clave (fecha_ingreso, numero_historia);
+-- los pacientes sin fecha van al final, igual que en la consulta de la app
+
+CREATE INDEX IF NOT EXISTS idx_pacientes_ingreso
+    ON pacientes (fecha_ingreso DESC NULLS LAST, numero_historia DESC);
+
+-- ==================== BÚSQUEDA POR PREFIJO ====================
+-- El selector de "Evolucionar Paciente" con busqueda_en_servidor filtra
+-- numero_historia ILIKE 'prefijo%'. Un btree (ni con text_pattern_ops) no
+-- sirve para ILIKE con letras; un índice de trigramas sí
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+
+CREATE INDEX IF NOT EXISTS idx_pacientes_historia_trgm
+    ON pacientes USING gin (numero_historia extensions.gin_trgm_ops);
+
+-- ==================== ESTADÍSTICAS ====================
+-- Resumen agregado de pacientes en una sola respuesta pequeña.
+-- Los nulos se tratan igual que en la app: booleanos como FALSE y
+-- numéricos como 0.
+
+CREATE OR REPLACE FUNCTION estadisticas_pacientes()
+RETURNS json
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT json_build_object(
+        'total_pacientes', count(*),
+        'con_pic', count(*) FILTER (WHERE requiere_pic),
+        'con_arm', count(*) FILTER (WHERE requiere_arm),
+        'con_cranectomia', count(*) FILTER (WHERE requiere_cranectomia),
+        'con_drenaje', count(*) FILTER (WHERE tiene_drenaje),
+        'edad_promedio', coalesce(avg(coalesce(edad, 0)), 0),
+        'edad_desvio', coalesce(stddev_samp(coalesce(edad, 0)), 0),
+        'edad_min', coalesce(min(coalesce(edad, 0)), 0),
+        'edad_max', coalesce(max(coalesce(edad, 0)), 0),
+        'dias_uti_promedio', coalesce(avg(coalesce(dias_uti, 0)), 0),
+        'dias_uti_desvio', coalesce(stddev_samp(coalesce(dias_uti, 0)), 0),
+        'dias_uti_max', coalesce(max(coalesce(dias_uti, 0)), 0),
+        'por_origen_tec', (
+            SELECT coalesce(json_object_agg(origen_tec, cantidad), '{}'::json)
+            FROM (SELECT origen_tec, count(*) AS cantidad FROM pacientes
+                  WHERE origen_tec IS NOT NULL GROUP BY origen_tec) o
+        ),
+        'por_sexo', (
+            SELECT coalesce(json_object_agg(sexo, cantidad), '{}'::json)
+            FROM (SELECT sexo, count(*) AS cantidad FROM pacientes
+                  WHERE sexo IS NOT NULL GROUP BY sexo) s
+        ),
+        'por_destino_post_uti', (
+            SELECT coalesce(json_object_agg(destino_post_uti, cantidad), '{}'::json)
+            FROM (SELECT destino_post_uti, count(*) AS cantidad FROM pacientes
+                  WHERE destino_post_uti IS NOT NULL GROUP BY destino_post_uti) d
+        )
+    )
+    FROM pacientes;
+$$;
+
+GRANT EXECUTE ON FUNCTION estadisticas_pacientes() TO anon;
+
+-- ==================== VERSIÓN DE LOS DATOS ====================
+-- Firma de cada tabla en una respuesta de pocos bytes: la app la consulta
+-- antes de refrescar su caché y, si no cambió, no vuelve a descargar las
+-- tablas. La firma es un contador de escrituras que suben los triggers:
+-- filas y max(fecha_ultima_actualizacion) no alcanzan, porque una escritura
+-- que confirma después de otra con marca posterior no cambia ninguna de las dos.
+
+-- La sincronización incremental filtra por fecha_ultima_actualizacion >= marca
+CREATE INDEX IF NOT EXISTS idx_pacientes_actualizacion
+    ON pacientes (fecha_ultima_actualizacion);
+
+CREATE TABLE IF NOT EXISTS cambios_tablas (
+    tabla text PRIMARY KEY,
+    cambios bigint NOT NULL DEFAULT 0
+);
+
+INSERT INTO cambios_tablas (tabla) VALUES ('pacientes'), ('evoluciones')
+ON CONFLICT (tabla) DO NOTHING;
+
+-- Sin políticas: la app lo lee solo a través de version_datos()
+ALTER TABLE cambios_tablas ENABLE ROW LEVEL SECURITY;
+
+-- SECURITY DEFINER: suma al contador aunque la app no pueda escribirlo
+CREATE OR REPLACE FUNCTION contar_cambios()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    UPDATE cambios_tablas SET cambios = cambios + 1 WHERE tabla = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS cambios_pacientes_trigger ON pacientes;
+CREATE TRIGGER cambios_pacientes_trigger
+AFTER INSERT OR UPDATE OR DELETE ON pacientes
+FOR EACH STATEMENT
+EXECUTE FUNCTION contar_cambios();
+
+DROP TRIGGER IF EXISTS cambios_evoluciones_trigger ON evoluciones;
+CREATE TRIGGER cambios_evoluciones_trigger
+AFTER INSERT OR UPDATE OR DELETE ON evoluciones
+FOR EACH STATEMENT
+EXECUTE FUNCTION contar_cambios();
+
+REVOKE EXECUTE ON FUNCTION contar_cambios() FROM PUBLIC, anon;
+
+-- SECURITY DEFINER: lee cambios_tablas, que la app no puede leer directo
+CREATE OR REPLACE FUNCTION version_datos()
+RETURNS json
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT json_object_agg(tabla, json_build_object('cambios', cambios))
+    FROM cambios_tablas;
+$$;
+
+GRANT EXECUTE ON FUNCTION version_datos() TO anon;
+
+-- ==================== INGRESOS MENSUALES ====================
+-- Resumen por mes ('AAAA-MM') de ingresos, intervenciones y desenlaces.
+-- Lo mantiene un trigger: cada alta, cambio o baja de un paciente ajusta
+-- solo la fila de su mes, así el gráfico de tendencia lee una fila por mes
+-- en lugar de la tabla pacientes completa.
+
+CREATE TABLE IF NOT EXISTS ingresos_mensuales (
+    mes text PRIMARY KEY,
+    ingresos bigint NOT NULL DEFAULT 0,
+    con_pic bigint NOT NULL DEFAULT 0,
+    con_arm bigint NOT NULL DEFAULT 0,
+    con_cranectomia bigint NOT NULL DEFAULT 0,
+    con_drenaje bigint NOT NULL DEFAULT 0,
+    obitos bigint NOT NULL DEFAULT 0,
+    con_secuelas bigint NOT NULL DEFAULT 0
+);
+
+-- Solo lectura para la app: escribe únicamente el trigger
+ALTER TABLE ingresos_mensuales ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Lectura para aplicación" ON ingresos_mensuales;
+CREATE POLICY "Lectura para aplicación"
+ON ingresos_mensuales
+FOR SELECT
+USING (auth.role() = 'anon');
+
+-- Suma (signo 1) o resta (signo -1) un paciente a la fila de su mes
+CREATE OR REPLACE FUNCTION sumar_ingreso_mensual(p pacientes, signo integer)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO ingresos_mensuales AS m (mes, ingresos, con_pic, con_arm, con_cranectomia,
+                                         con_drenaje, obitos, con_secuelas)
+    SELECT to_char(p.fecha_ingreso::date, 'YYYY-MM'),
+           signo,
+           signo * coalesce(p.requiere_pic, FALSE)::int,
+           signo * coalesce(p.requiere_arm, FALSE)::int,
+           signo * coalesce(p.requiere_cranectomia, FALSE)::int,
+           signo * coalesce(p.tiene_drenaje, FALSE)::int,
+           signo * coalesce(p.destino_post_uti = 'Óbito', FALSE)::int,
+           signo * coalesce(p.secuelas_motora OR p.secuelas_neurologica OR p.secuelas_cognitiva, FALSE)::int
+    WHERE p.fecha_ingreso IS NOT NULL
+    ON CONFLICT (mes) DO UPDATE SET
+        ingresos = m.ingresos + excluded.ingresos,
+        con_pic = m.con_pic + excluded.con_pic,
+        con_arm = m.con_arm + excluded.con_arm,
+        con_cranectomia = m.con_cranectomia + excluded.con_cranectomia,
+        con_drenaje = m.con_drenaje + excluded.con_drenaje,
+        obitos = m.obitos + excluded.obitos,
+        con_secuelas = m.con_secuelas + excluded.con_secuelas;
+$$;
+
+-- SECURITY DEFINER: escribe el resumen aunque la app solo pueda leerlo
+CREATE OR REPLACE FUNCTION actualizar_ingresos_mensuales()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM sumar_ingreso_mensual(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM sumar_ingreso_mensual(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS ingresos_mensuales_trigger ON pacientes;
+CREATE TRIGGER ingresos_mensuales_trigger
+AFTER INSERT OR DELETE OR UPDATE OF fecha_ingreso, requiere_pic, requiere_arm,
+    requiere_cranectomia, tiene_drenaje, destino_post_uti, secuelas_motora,
+    secuelas_neurologica, secuelas_cognitiva
+ON pacientes
+FOR EACH ROW
+EXECUTE FUNCTION actualizar_ingresos_mensuales();
+
+-- Arma el resumen desde cero con los pacientes existentes. Bloquea las
+-- escrituras en pacientes mientras tanto para no perder ni duplicar filas.
+CREATE OR REPLACE FUNCTION reconstruir_ingresos_mensuales()
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    LOCK TABLE pacientes IN SHARE MODE;
+    DELETE FROM ingresos_mensuales;
+    INSERT INTO ingresos_mensuales (mes, ingresos, con_pic, con_arm, con_cranectomia,
+                                    con_drenaje, obitos, con_secuelas)
+    SELECT to_char(fecha_ingreso::date, 'YYYY-MM'),
+           count(*),
+           count(*) FILTER (WHERE requiere_pic),
+           count(*) FILTER (WHERE requiere_arm),
+           count(*) FILTER (WHERE requiere_cranectomia),
+           count(*) FILTER (WHERE tiene_drenaje),
+           count(*) FILTER (WHERE destino_post_uti = 'Óbito'),
+           count(*) FILTER (WHERE secuelas_motora OR secuelas_neurologica OR secuelas_cognitiva)
+    FROM pacientes
+    WHERE fecha_ingreso IS NOT NULL
+    GROUP BY 1;
+END;
+$$;
+
+-- Solo desde el SQL Editor: la app no debe poder bloquear la tabla
+REVOKE EXECUTE ON FUNCTION reconstruir_ingresos_mensuales() FROM PUBLIC, anon;
+REVOKE EXECUTE ON FUNCTION sumar_ingreso_mensual(pacientes, integer) FROM PUBLIC, anon;
+
+SELECT reconstruir_ingresos_mensuales();
+
+-- ==================== EVOLUCIONES ====================
+-- Las notas de evolución se guardan una por fila en evoluciones.observacion
+-- (solo se agregan) y se leen de a páginas por id descendente
+
+CREATE INDEX IF NOT EXISTS idx_evoluciones_notas
+    ON evoluciones (numero_historia, id DESC);
+
+-- Actualiza el paciente y agrega la fila de evolución en una sola
+-- transacción y un solo viaje. Solo se modifican las columnas presentes
+-- en p_datos. Retorna FALSE si el paciente no existe.
+
+CREATE OR REPLACE FUNCTION actualizar_paciente_con_evolucion(
+    p_numero_historia text,
+    p_datos jsonb,
+    p_evolucion jsonb DEFAULT NULL
+)
+RETURNS boolean
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    filas integer;
+BEGIN
+    UPDATE pacientes p SET
+        edad = CASE WHEN p_datos ? 'edad' THEN r.edad ELSE p.edad END,
+        sexo = CASE WHEN p_datos ? 'sexo' THEN r.sexo ELSE p.sexo END,
+        fecha_ingreso = CASE WHEN p_datos ? 'fecha_ingreso' THEN r.fecha_ingreso ELSE p.fecha_ingreso END,
+        diagnostico = CASE WHEN p_datos ? 'diagnostico' THEN r.diagnostico ELSE p.diagnostico END,
+        origen_tec = CASE WHEN p_datos ? 'origen_tec' THEN r.origen_tec ELSE p.origen_tec END,
+        lesiones_asociadas = CASE WHEN p_datos ? 'lesiones_asociadas' THEN r.lesiones_asociadas ELSE p.lesiones_asociadas END,
+        requiere_pic = CASE WHEN p_datos ? 'requiere_pic' THEN r.requiere_pic ELSE p.requiere_pic END,
+        requiere_arm = CASE WHEN p_datos ? 'requiere_arm' THEN r.requiere_arm ELSE p.requiere_arm END,
+        requiere_cranectomia = CASE WHEN p_datos ? 'requiere_cranectomia' THEN r.requiere_cranectomia ELSE p.requiere_cranectomia END,
+        dias_uti = CASE WHEN p_datos ? 'dias_uti' THEN r.dias_uti ELSE p.dias_uti END,
+        glasgow_ingreso = CASE WHEN p_datos ? 'glasgow_ingreso' THEN r.glasgow_ingreso ELSE p.glasgow_ingreso END,
+        glasgow_actual = CASE WHEN p_datos ? 'glasgow_actual' THEN r.glasgow_actual ELSE p.glasgow_actual END,
+        destino_post_uti = CASE WHEN p_datos ? 'destino_post_uti' THEN r.destino_post_uti ELSE p.destino_post_uti END,
+        tiene_drenaje = CASE WHEN p_datos ? 'tiene_drenaje' THEN r.tiene_drenaje ELSE p.tiene_drenaje END,
+        tipo_drenaje = CASE WHEN p_datos ? 'tipo_drenaje' THEN r.tipo_drenaje ELSE p.tipo_drenaje END,
+        llevaba_casco = CASE WHEN p_datos ? 'llevaba_casco' THEN r.llevaba_casco ELSE p.llevaba_casco END,
+        secuelas_motora = CASE WHEN p_datos ? 'secuelas_motora' THEN r.secuelas_motora ELSE p.secuelas_motora END,
+        secuelas_neurologica = CASE WHEN p_datos ? 'secuelas_neurologica' THEN r.secuelas_neurologica ELSE p.secuelas_neurologica END,
+        secuelas_cognitiva = CASE WHEN p_datos ? 'secuelas_cognitiva' THEN r.secuelas_cognitiva ELSE p.secuelas_cognitiva END,
+        observaciones = CASE WHEN p_datos ? 'observaciones' THEN r.observaciones ELSE p.observaciones END,
+        fecha_ultima_actualizacion = CASE WHEN p_datos ? 'fecha_ultima_actualizacion' THEN r.fecha_ultima_actualizacion ELSE p.fecha_ultima_actualizacion END
+    FROM jsonb_populate_record(NULL::pacientes, p_datos) r
+    WHERE p.numero_historia = p_numero_historia;
+    
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    IF filas = 0 THEN
+        RETURN FALSE;
+    END IF;
+    
+    IF p_evolucion IS NOT NULL THEN
+        INSERT INTO evoluciones (numero_historia, dias_uti, glasgow_actual, requiere_pic,
+                                 requiere_arm, requiere_cranectomia, observacion)
+        SELECT p_numero_historia, e.dias_uti, e.glasgow_actual, e.requiere_pic,
+               e.requiere_arm, e.requiere_cranectomia, e.observacion
+        FROM jsonb_populate_record(NULL::evoluciones, p_evolucion) e;
+    END IF;
+    
+    RETURN TRUE;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION actualizar_paciente_con_evolucion(text, jsonb, jsonb) TO anon;
@@ -0,0 +1,34 @@
+"""
+Altas sintéticas y deterministas para las pruebas
+"""
+from datetime import date, timedelta
+
+ORIGENES = ["Accidente de tránsito (moto)", "Caída de altura", "Agresión"]
+DESTINOS = ["Aún en UTI", "UTIM", "Óbito"]
+
+def paciente(i, **cambios):
+    """Campos de un alta como los arma el formulario de carga"""
+    campos = {
+        'numero_historia': f"HC{i:04d}",
+        'edad': 20 + i % 60,
+        'sexo': "Femenino" if i % 3 else "Masculino",
+        'fecha_ingreso': (date(2025, 1, 1) + timedelta(days=7 * i)).isoformat(),
+        'diagnostico': f"TEC grave caso {i}",
+        'origen_tec': ORIGENES[i % len(ORIGENES)],
+        'lesiones_asociadas': "Hematoma subdural",
+        'requiere_pic': i % 2 == 0,
+        'requiere_arm': i % 3 == 0,
+        'requiere_cranectomia': i % 5 == 0,
+        'dias_uti': i % 20,
+        'glasgow_ingreso': 3 + i % 13,
+        'glasgow_actual': 3 + (i + 4) % 13,
+        'destino_post_uti': DESTINOS[i % len(DESTINOS)],
+        'tiene_drenaje': i % 4 == 0,
+        'tipo_drenaje': "Aspirativo" if i % 4 == 0 else "",
+        'llevaba_casco': i % 2 == 0 if i % len(ORIGENES) == 0 else None,
+        'secuelas_motora': i % 7 == 0,
+        'secuelas_neurologica': False,
+        'secuelas_cognitiva': i % 11 == 0,
+    }
+    campos.update(cambios)
+    return campos
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+from streamlit import config as st_config
+
+CARPETA = os.path.dirname(os.path.abspath(__file__))
+
+# Los módulos de la app están en la raíz del repositorio (sin paquete)
+sys.path.insert(0, os.path.dirname(CARPETA))
+
+# config.py lee st.secrets al importarse: las pruebas usan su propio secrets.toml
+st_config.set_option('secrets.files', [os.path.join(CARPETA, 'secrets.toml')])
+
+@pytest.fixture
+def sqlite_cohorte():
+    """Base SQLite en memoria con 40 altas y páginas de 7 filas"""
+    from cohorte import paciente
+    from sqlite_db import SQLiteDB
+
+    db = SQLiteDB(':memory:', tamano_pagina=7)
+    for i in range(40):
+        campos = paciente(i)
+        if i % 9 == 0:
+            # Algunos sin fecha de ingreso: van al final de la paginación
+            campos['fecha_ingreso'] = None
+        assert db.insertar_paciente(**campos)
+    return db
+
+@pytest.fixture
+def adaptador(sqlite_cohorte, monkeypatch):
+    """db_adapter sobre la base de sqlite_cohorte, con el caché vacío"""
+    import db_adapter
+
+    monkeypatch.setattr(db_adapter, '_db', sqlite_cohorte)
+    db_adapter.invalidar_cache()
+    yield db_adapter
+    db_adapter.invalidar_cache()
@@ -0,0 +1,23 @@
+"""
+Pruebas del índice de prefijos del selector frente a la búsqueda en el servidor
+"""
+import pandas as pd
+import pytest
+
+import buscador
+
+@pytest.mark.parametrize('prefijo', ['HC00', 'hc001', 'HC0039', 'HC5', 'X', '%', '_C'])
+def test_indice_igual_a_la_busqueda_en_sql(sqlite_cohorte, prefijo):
+    pacientes = sqlite_cohorte.obtener_todos_pacientes('evolucion')
+
+    en_memoria = buscador.buscar(pacientes, object(), prefijo, limite=100)
+    en_sql = sqlite_cohorte.buscar_pacientes(prefijo, limite=100)
+
+    historias_sql = list(en_sql['numero_historia']) if not en_sql.empty else []
+    assert list(en_memoria['numero_historia']) == historias_sql
+
+def test_limite_y_orden_sin_distinguir_mayusculas():
+    df = pd.DataFrame({'numero_historia': ['hc10', 'HC2', 'Hc1', 'AB1', 'hc11']})
+
+    encontrados = buscador.buscar(df, object(), 'HC1', limite=2)
+    assert list(encontrados['numero_historia']) == ['Hc1', 'hc10']
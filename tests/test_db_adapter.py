@@ -0,0 +1,98 @@
+"""
+Pruebas del caché, la sincronización incremental y la sonda de versión del adaptador
+Usan el backend SQLite en memoria (tests/secrets.toml), una base nueva por prueba
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import config
+import db_adapter as db
+from cohorte import paciente
+from sqlite_db import SQLiteDB
+
+@pytest.fixture(autouse=True)
+def base(monkeypatch):
+    monkeypatch.setattr(db, '_db', SQLiteDB(':memory:', tamano_pagina=7))
+    db.invalidar_cache()
+    yield db._db
+    db.invalidar_cache()
+
+@pytest.fixture
+def sin_sonda(monkeypatch):
+    monkeypatch.setattr(config, 'SONDA_VERSION', False)
+
+def dias_uti(historia):
+    return db.obtener_todos_pacientes().set_index('numero_historia').loc[historia, 'dias_uti']
+
+def test_sincronizacion_ve_una_escritura_que_confirma_tarde(sin_sonda):
+    assert db.insertar_paciente(**paciente(1))
+    assert len(db.obtener_todos_pacientes()) == 1
+
+    # La actualización de HC0001 tomó su marca antes que el alta de HC0002 pero confirma después
+    marca_tardia = (datetime.now() - timedelta(seconds=1)).isoformat()
+    assert db.insertar_paciente(**paciente(2))
+    assert len(db.obtener_todos_pacientes()) == 2
+    assert db.actualizar_paciente('HC0001', dias_uti=7, fecha_ultima_actualizacion=marca_tardia)
+
+    assert dias_uti('HC0001') == 7
+
+def test_solapamiento_sin_cambios_conserva_la_version(sin_sonda):
+    assert db.insertar_paciente(**paciente(1))
+    version = db.version_de(db.obtener_todos_pacientes())
+
+    db.marcar_cache_vencido()
+    # Vuelve a traer HC0001 por el solapamiento, con la misma marca: no es un cambio
+    assert db.version_de(db.obtener_todos_pacientes()) == version
+
+@pytest.fixture
+def siempre_vencido(monkeypatch):
+    # Cada lectura consulta la sonda, sin compartirla entre lecturas
+    monkeypatch.setattr(config, 'CACHE_TTL_SEGUNDOS', 0)
+    monkeypatch.setattr(db, 'SONDA_VALIDEZ_SEGUNDOS', 0)
+
+def test_sonda_sin_cambios_no_vuelve_a_leer(base, siempre_vencido, monkeypatch):
+    assert db.insertar_paciente(**paciente(1))
+    db.obtener_todos_pacientes()
+
+    def no_leer(*args):
+        raise AssertionError("la sonda no vio cambios: no debería leer la tabla")
+    monkeypatch.setattr(base, 'obtener_pacientes_modificados_desde', no_leer)
+    monkeypatch.setattr(base, 'obtener_todos_pacientes', no_leer)
+    assert len(db.obtener_todos_pacientes()) == 1
+
+def test_sonda_ve_una_escritura_externa_que_confirma_tarde(base, siempre_vencido):
+    # Escrituras de otra instancia de la app: no pasan por este adaptador
+    assert base.insertar_paciente(**paciente(1))
+    marca_tardia = (datetime.now() - timedelta(seconds=1)).isoformat()
+    assert base.insertar_paciente(**paciente(2))
+    assert len(db.obtener_todos_pacientes()) == 2
+    # No cambia ni la cantidad de filas ni la mayor fecha_ultima_actualizacion
+    assert base.actualizar_paciente('HC0001', dias_uti=7, fecha_ultima_actualizacion=marca_tardia)
+
+    assert dias_uti('HC0001') == 7
+
+def test_tabla_vacia_conserva_la_version(sin_sonda, siempre_vencido):
+    versiones = {db.version_de(db.obtener_todos_pacientes()) for _ in range(3)}
+    versiones_evoluciones = {db.version_de(db.obtener_todas_evoluciones()) for _ in range(3)}
+
+    # Sin datos nuevos, releer no invalida los cálculos memorizados por versión
+    assert len(versiones) == 1 and len(versiones_evoluciones) == 1
+
+    assert db.insertar_paciente(**paciente(1))
+    assert db.version_de(db.obtener_todos_pacientes()) not in versiones
+
+def test_cache_acotado_por_memoria(monkeypatch):
+    for i in range(20):
+        assert db.insertar_paciente(**paciente(i))
+    completo = db.obtener_todos_pacientes()
+    tamano = completo.memory_usage(deep=True).sum()
+    # Entra el perfil completo o el del selector, pero no los dos
+    monkeypatch.setattr(config, 'CACHE_MAX_MB', tamano * 1.2 / 1024 / 1024)
+
+    db.invalidar_cache()
+    db.obtener_todos_pacientes()
+    db.obtener_todos_pacientes('selector')
+
+    assert list(db._cache) == [('pacientes', 'selector')]
+    assert db._cache_bytes == db._cache[('pacientes', 'selector')][3]
@@ -0,0 +1,34 @@
+"""
+Pruebas del resumen de estadísticas calculado en la base frente al cálculo en pandas
+"""
+import pytest
+
+import estadisticas
+
+def test_estadisticas_sql_igual_a_resumen_en_pandas(sqlite_cohorte):
+    stats = sqlite_cohorte.obtener_estadisticas()
+    resumen = estadisticas.obtener_resumen(sqlite_cohorte.obtener_todos_pacientes('estadisticas'), version=object())
+
+    assert stats['total_pacientes'] == resumen.total
+    assert stats['con_pic'] == resumen.intervenciones['PIC']
+    assert stats['con_arm'] == resumen.intervenciones['ARM']
+    assert stats['con_cranectomia'] == resumen.intervenciones['Craniectomía']
+    assert stats['con_drenaje'] == resumen.intervenciones['Drenaje']
+    assert stats['edad_promedio'] == pytest.approx(resumen.edad['mean'])
+    assert stats['edad_min'] == resumen.edad['min']
+    assert stats['edad_max'] == resumen.edad['max']
+    assert stats['dias_uti_promedio'] == pytest.approx(resumen.dias_uti['mean'])
+    assert stats['dias_uti_max'] == resumen.dias_uti['max']
+    assert stats['por_origen_tec'] == resumen.origen_counts.to_dict()
+    assert stats['por_sexo'] == resumen.sexo_counts.to_dict()
+    assert stats['por_destino_post_uti'] == resumen.destino_counts.to_dict()
+
+def test_sin_funcion_sql_calcula_lo_mismo_en_memoria(adaptador, sqlite_cohorte, monkeypatch):
+    esperado = sqlite_cohorte.obtener_estadisticas()
+    # Como un proyecto de Supabase sin estadisticas_pacientes() instalada
+    monkeypatch.setattr(sqlite_cohorte, 'obtener_estadisticas', lambda: None)
+
+    stats = adaptador.obtener_estadisticas()
+    assert stats.keys() == esperado.keys()
+    for clave, valor in esperado.items():
+        assert stats[clave] == (valor if isinstance(valor, dict) else pytest.approx(valor)), clave
@@ -0,0 +1,40 @@
+"""
+Pruebas del motor de filtros por bitmaps frente al mismo filtro resuelto en SQL
+"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import filtros
+
+CASOS = [
+    {'sexo': ['Femenino']},
+    {'origen_tec': ['Caída de altura', 'Agresión'], 'requiere_pic': True},
+    {'requiere_arm': False, 'edad': (30, 50)},
+    # Casco es triestado: fuera de los accidentes de moto no es "Sí" ni "No"
+    {'llevaba_casco': False},
+    {'llevaba_casco': True, 'destino_post_uti': ['Aún en UTI', 'Óbito']},
+    {'fecha_ingreso': (date(2025, 3, 1), date(2025, 6, 30)), 'glasgow_ingreso': (3, 8)},
+    {'sexo': []},
+]
+
+@pytest.mark.parametrize('condiciones', CASOS)
+def test_filtro_en_memoria_igual_al_filtro_en_sql(sqlite_cohorte, condiciones):
+    pacientes = sqlite_cohorte.obtener_todos_pacientes()
+
+    en_memoria = filtros.filtrar(pacientes, object(), condiciones)
+    en_sql = sqlite_cohorte.obtener_pacientes_filtrados(condiciones)
+
+    historias_sql = sorted(en_sql['numero_historia']) if not en_sql.empty else []
+    assert sorted(en_memoria['numero_historia']) == historias_sql
+    assert sqlite_cohorte.contar_pacientes(condiciones) == len(en_memoria)
+
+def test_indice_de_otra_version_no_se_reusa():
+    version = object()
+    corto = pd.DataFrame({'sexo': ['Femenino', 'Masculino']})
+    largo = pd.DataFrame({'sexo': ['Femenino', 'Masculino', 'Femenino']})
+
+    assert len(filtros.filtrar(corto, version, {'sexo': ['Femenino']})) == 1
+    # Misma versión pero otra cantidad de filas: el índice se reconstruye
+    assert len(filtros.filtrar(largo, version, {'sexo': ['Femenino']})) == 2
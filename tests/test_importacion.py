@@ -0,0 +1,62 @@
+"""
+Pruebas de la importación masiva: validación por bloque e inserción en lotes
+"""
+import io
+
+import pandas as pd
+
+import importacion
+
+ENCABEZADO = "numero_historia,edad,sexo,fecha_ingreso,diagnostico,origen_tec,dias_uti,glasgow_ingreso,llevaba_casco,requiere_pic"
+
+def bloque(*filas):
+    texto = "\n".join((ENCABEZADO,) + filas)
+    return pd.read_csv(io.StringIO(texto), dtype=str, keep_default_na=False)
+
+def test_validacion_por_fila():
+    validos, errores = importacion.normalizar_bloque(bloque(
+        "A1,30,m,2025-01-31,TEC,Accidente de tránsito (moto),2,8,sí,x",
+        "A2,40,F,31/01/2025,TEC,Caída de altura,0,15,si,",
+        "A3,50,f,2025-02-01,TEC,Accidente de tránsito (moto),1,9,,no",
+        "A4,200,m,2025-02-01,TEC,Agresión,1,9,,",
+        "A5,30,x,2025-02-01,TEC,Agresión,1,9,,",
+        "A6,30,m,2025-02-01,TEC,Accidente de tránsito (moto),1,9,quizás,",
+        "A7,30,m,2025-02-01,TEC,Agresión,1,2,,",
+    ))
+
+    por_historia = validos.set_index('numero_historia')
+    assert list(por_historia.index) == ['A1', 'A2', 'A3']
+    assert por_historia.loc['A2', 'fecha_ingreso'] == '2025-01-31'
+    assert list(por_historia['requiere_pic']) == [True, False, False]
+    # Casco: solo en motos, y vacío es "sin dato"
+    assert por_historia.loc['A1', 'llevaba_casco'] is True
+    assert por_historia.loc['A2', 'llevaba_casco'] is None
+    assert por_historia.loc['A3', 'llevaba_casco'] is None
+    assert dict(zip(errores['fila'], errores['error'])) == {
+        5: "edad fuera de rango",
+        6: "Sexo no reconocido",
+        7: "llevaba_casco: valor no reconocido",
+        8: "glasgow_ingreso fuera de rango",
+    }
+
+def test_faltan_columnas_obligatorias():
+    validos, errores = importacion.normalizar_bloque(pd.DataFrame({'numero_historia': ['A1']}))
+    assert validos.empty
+    assert errores.iloc[0]['error'].startswith("Faltan columnas: edad, sexo")
+
+def test_importar_omite_existentes_y_repetidos(adaptador):
+    archivo = io.BytesIO("\n".join((
+        ENCABEZADO,
+        "HC0001,30,m,2025-01-31,TEC,Agresión,2,8,,",
+        "N1,30,m,2025-01-31,TEC,Agresión,2,8,,",
+        "N1,31,m,2025-01-31,TEC,Agresión,2,8,,",
+        "N2,30,m,2025-01-31,TEC,Agresión,2,8,,si",
+        "N3,30,m,fecha,TEC,Agresión,2,8,,",
+    )).encode())
+
+    resumen, errores = importacion.importar_pacientes(archivo, 'pacientes.csv', tamano_lote=1)
+
+    assert resumen == {'leidos': 5, 'insertados': 2, 'existentes': 2, 'invalidos': 1, 'fallidos': 0}
+    assert list(errores['fila']) == [6]
+    assert adaptador.obtener_paciente_por_historia('N2').iloc[0]['requiere_pic']
+    assert len(adaptador.obtener_todos_pacientes()) == 42
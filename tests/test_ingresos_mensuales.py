@@ -0,0 +1,38 @@
+"""
+Pruebas del resumen mensual de ingresos mantenido por triggers y del período
+que se resuelve en la consulta en lugar de filtrar en memoria
+"""
+import pandas as pd
+
+from cohorte import paciente
+from esquema import ingresos_mensuales
+
+def test_ingresos_mensuales_iguales_al_calculo_en_pandas(sqlite_cohorte):
+    base = sqlite_cohorte
+
+    def comparar():
+        esperado = ingresos_mensuales(base.obtener_todos_pacientes('estadisticas'))
+        pd.testing.assert_frame_equal(base.obtener_ingresos_mensuales(), esperado)
+
+    comparar()
+    assert base.insertar_paciente(**paciente(100, fecha_ingreso='2025-03-15'))
+    comparar()
+    # Cambia de mes y de desenlace: el trigger resta del mes viejo y suma al nuevo
+    assert base.actualizar_paciente('HC0004', fecha_ingreso='2024-12-31', destino_post_uti='Óbito',
+                                    requiere_pic=False, secuelas_motora=True)
+    comparar()
+    # Pierde la fecha: sale del resumen
+    assert base.actualizar_paciente('HC0010', fecha_ingreso=None)
+    comparar()
+
+def test_periodo_se_resuelve_en_la_consulta(adaptador):
+    todos = adaptador.obtener_todos_pacientes('estadisticas')
+    fechas = todos['fecha_ingreso']
+    esperado = todos[(fechas >= '2025-03-01') & (fechas <= '2025-05-31')]
+
+    periodo = adaptador.obtener_todos_pacientes('estadisticas', '2025-03-01', '2025-05-31')
+    assert sorted(periodo['numero_historia']) == sorted(esperado['numero_historia'])
+
+    meses = adaptador.obtener_ingresos_mensuales('2025-03-10', '2025-05-05')
+    assert list(meses['mes']) == ['2025-03', '2025-04', '2025-05']
+    assert meses['ingresos'].sum() == len(esperado)
@@ -0,0 +1,21 @@
+"""
+Pruebas del memo LRU por versión de datos que comparten los motores
+"""
+from memo import memo_por_version
+
+def test_memo_descarta_el_menos_usado_y_los_no_vigentes():
+    llamadas = []
+    def calcular(n):
+        llamadas.append(n)
+        return [n]
+    memo = memo_por_version(calcular, maximo=2, vigente=lambda resultado, n: resultado == [n])
+
+    assert memo('v1', 1) == [1] and memo('v2', 2) == [2]
+    assert memo('v1', 1) == [1]
+    memo('v3', 3)
+    # v2 era el menos usado: se recalcula; v1 sigue memorizado
+    assert memo('v2', 2) == [2] and memo('v3', 3) == [3]
+    # Misma clave con otros argumentos: el resultado ya no está vigente
+    assert memo('v3', 4) == [4]
+
+    assert llamadas == [1, 2, 3, 2, 4]
@@ -0,0 +1,21 @@
+"""
+Pruebas de la lectura paginada por clave (fecha_ingreso, numero_historia)
+Las páginas de 7 filas obligan a recorrer varias, con pacientes sin fecha al final
+"""
+from cohorte import paciente
+
+HISTORIAS = sorted(paciente(i)['numero_historia'] for i in range(40))
+
+def test_paginacion_devuelve_cada_fila_una_vez(sqlite_cohorte):
+    historias = [h for pagina in sqlite_cohorte.iterar_paginas_pacientes() for h in pagina['numero_historia']]
+
+    assert sorted(historias) == HISTORIAS
+    assert len(historias) == len(set(historias))
+    # Los pacientes sin fecha de ingreso quedan al final
+    assert historias[-5:] == ['HC0036', 'HC0027', 'HC0018', 'HC0009', 'HC0000']
+
+def test_carga_completa_junta_todas_las_paginas(adaptador):
+    for perfil in ('completo', 'selector'):
+        df = adaptador.obtener_todos_pacientes(perfil)
+        assert sorted(df['numero_historia']) == HISTORIAS
+        assert df['fecha_ingreso'].isna().sum() == 5
@@ -0,0 +1,51 @@
+"""
+Pruebas del backend SQLite sobre una base en memoria
+Cubren las altas y las actualizaciones con su evolución
+"""
+import inspect
+
+import pytest
+
+from cohorte import paciente
+from errores import ErrorBackend
+from sqlite_db import SQLiteDB
+from supabase_db import SupabaseDB
+
+@pytest.fixture
+def base(sqlite_cohorte):
+    return sqlite_cohorte
+
+def firmas(clase):
+    return {nombre: inspect.signature(funcion) for nombre, funcion in vars(clase).items()
+            if callable(funcion) and not nombre.startswith('_')}
+
+def test_misma_interfaz_que_supabase():
+    # db_adapter usa cualquiera de los dos backends sin distinguirlos
+    assert firmas(SQLiteDB) == firmas(SupabaseDB)
+
+def test_insertar_duplicado_retorna_false(base):
+    assert not base.insertar_paciente(**paciente(3))
+    assert len(base.obtener_todos_pacientes()) == 40
+
+def test_insertar_rechazado_levanta_error_backend(base):
+    # Un error de la base no es un duplicado: no debe informarse como False
+    with pytest.raises(ErrorBackend):
+        base.insertar_paciente(**paciente(50, numero_historia=None))
+
+def test_actualizar_registra_una_sola_evolucion(base):
+    assert base.actualizar_paciente('HC0005', dias_uti=12, glasgow_actual=14, nota="Mejora")
+
+    evoluciones = base.obtener_evoluciones_paciente('HC0005')
+    assert len(evoluciones) == 1
+    assert evoluciones.iloc[0]['observacion'] == "Mejora"
+    assert base.obtener_paciente_por_historia('HC0005').iloc[0]['dias_uti'] == 12
+    assert base.obtener_evoluciones_paciente('HC0006').empty
+
+def test_actualizar_historia_inexistente_no_registra_evolucion(base):
+    assert not base.actualizar_paciente('HC9999', dias_uti=3)
+    assert base.obtener_evoluciones().empty
+
+def test_actualizar_fallido_levanta_error_backend(base):
+    base.conexion.close()
+    with pytest.raises(ErrorBackend):
+        base.actualizar_paciente('HC0005', dias_uti=3)
@@ -0,0 +1,54 @@
+"""
+Pruebas del motor de trayectorias sobre cohortes chicas armadas a mano
+"""
+import pandas as pd
+
+import trayectorias
+from esquema import normalizar_evoluciones, normalizar_pacientes
+
+def pacientes(*filas):
+    return normalizar_pacientes(pd.DataFrame(
+        [{'numero_historia': h, 'fecha_ingreso': f, 'glasgow_ingreso': g} for h, f, g in filas]
+    ))
+
+def evoluciones(*filas):
+    return normalizar_evoluciones(pd.DataFrame([
+        {'id': i, 'numero_historia': h, 'fecha_evolucion': f, 'glasgow_actual': g,
+         'requiere_arm': arm, 'requiere_pic': pic, 'dias_uti': 0}
+        for i, (h, f, g, arm, pic) in enumerate(filas, start=1)
+    ]))
+
+def test_episodios_y_mejoria():
+    cohorte = pacientes(('HC1', '2025-01-01', 6), ('HC2', '2025-01-01', 12))
+    evols = evoluciones(
+        ('HC1', '2025-01-02T08:00:00', 6, True, False),
+        ('HC1', '2025-01-04T08:00:00', 9, False, True),
+        ('HC1', '2025-01-06T08:00:00', 10, False, True),
+        ('HC2', '2025-01-03T08:00:00', 13, False, False),
+    )
+
+    tray = trayectorias.calcular_trayectorias(evols, cohorte)
+
+    assert (tray.pacientes, tray.evoluciones) == (2, 4)
+    arm = tray.episodios['ARM']
+    assert list(arm['numero_historia']) == ['HC1']
+    assert arm.iloc[0]['dias'] == 2 and not arm.iloc[0]['en_curso']
+    pic = tray.episodios['PIC']
+    # Sigue con PIC en la última evolución: se mide hasta ella
+    assert pic.iloc[0]['dias'] == 2 and pic.iloc[0]['en_curso']
+
+    por_paciente = tray.por_paciente.set_index('numero_historia')
+    assert por_paciente.loc['HC1', 'dias_hasta_mejoria'] == 3
+    assert pd.isna(por_paciente.loc['HC2', 'dias_hasta_mejoria'])
+    assert tray.curva_mejoria.set_index('dia').loc[3, 'porcentaje'] == 50
+
+def test_sin_pacientes_ubicables_da_resumen_vacio():
+    evols = evoluciones(('HC1', '2025-01-03T10:00:00', 10, True, False))
+
+    # Evoluciones de un paciente sin fecha de ingreso, o de nadie en el período
+    for cohorte in (pacientes(('HC1', None, 7)), pacientes(('HC2', '2025-01-01', 7))):
+        tray = trayectorias.calcular_trayectorias(evols, cohorte)
+        assert tray.pacientes == 0 and tray.evoluciones == 0
+        assert tray.por_paciente.empty and tray.curva_glasgow.empty
+        assert (tray.curva_mejoria['porcentaje'] == 0).all()
+        assert all(episodios.empty for episodios in tray.episodios.values())
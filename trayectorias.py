@@ -0,0 +1,157 @@
+"""
+Motor de trayectorias de la cohorte sobre la tabla evoluciones
+Arma la línea de tiempo de cada paciente (ingreso + evoluciones) y calcula con
+operaciones agrupadas, sin recorrer pacientes uno por uno:
+    - curvas de Glasgow por día de internación según gravedad al ingreso
+    - episodios y días acumulados en ARM y con PIC
+    - días hasta la mejoría del Glasgow y curva acumulada de mejoría
+Los resultados se memorizan por versión de datos
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from memo import memo_por_version
+
+# Puntos de Glasgow por encima del ingreso que cuentan como mejoría
+MEJORA_GLASGOW = 2
+
+# Días de internación que muestran las curvas
+DIAS_MAX = 30
+
+# Pacientes mínimos por día para graficar un punto de la curva
+MIN_PACIENTES = 3
+
+GRAVEDAD = pd.CategoricalDtype(['Grave (3-8)', 'Moderado (9-12)', 'Leve (13-15)'], ordered=True)
+
+SOPORTES = {'ARM': 'requiere_arm', 'PIC': 'requiere_pic'}
+
+@dataclass
+class ResumenTrayectorias:
+    """Todo lo que muestra la sección de trayectorias de "Ver Estadísticas" """
+    pacientes: int
+    evoluciones: int
+    # Por paciente: grupo, dias_arm, dias_pic, dias_hasta_mejoria (NaN si no mejoró)
+    por_paciente: pd.DataFrame
+    # (grupo, dia, mediana, q1, q3, pacientes)
+    curva_glasgow: pd.DataFrame
+    # (dia, porcentaje) de pacientes que ya mejoraron
+    curva_mejoria: pd.DataFrame
+    # {'ARM': episodios, 'PIC': episodios} con inicio, fin, dias y en_curso
+    episodios: dict
+
+def _sin_zona(serie):
+    """Fechas sin zona horaria para poder restarlas a fecha_ingreso"""
+    serie = pd.to_datetime(serie, errors='coerce', format='ISO8601')
+    return serie.dt.tz_convert(None) if serie.dt.tz is not None else serie
+
+def gravedad(glasgow):
+    """Grupo de gravedad del TEC según el Glasgow al ingreso"""
+    grupos = pd.cut(glasgow, bins=[2, 8, 12, 15], labels=GRAVEDAD.categories)
+    return grupos.astype(GRAVEDAD)
+
+def armar_linea_de_tiempo(evoluciones, pacientes):
+    """Evoluciones ordenadas por paciente y fecha, con el día de internación y el Glasgow de ingreso"""
+    ingreso = pacientes[['numero_historia', 'fecha_ingreso', 'glasgow_ingreso']].assign(
+        fecha_ingreso=_sin_zona(pacientes['fecha_ingreso'])
+    )
+    # inner: descarta evoluciones de pacientes que ya no están
+    t = evoluciones.merge(ingreso, on='numero_historia', how='inner', sort=False)
+    t['fecha_evolucion'] = _sin_zona(t['fecha_evolucion'])
+    dias = (t['fecha_evolucion'] - t['fecha_ingreso']).dt.days
+    # Sin fecha de ingreso o de evolución no se pueden ubicar en la línea de tiempo
+    t = t[dias.notna()].assign(dia=dias.dropna().clip(lower=0).astype(int))
+    t = t.sort_values(['numero_historia', 'fecha_evolucion', 'id'], kind='stable', ignore_index=True)
+    # Código entero por paciente: agrupar por enteros evita factorizar el texto en cada groupby
+    t['paciente'] = pd.factorize(t['numero_historia'])[0]
+    return t
+
+def intervalos(t, columna):
+    """Episodios continuos con el soporte activo: cada uno dura hasta la evolución que lo retira
+
+    Si el paciente sigue con el soporte en su última evolución el episodio
+    queda en_curso y se mide hasta esa evolución.
+    """
+    activo = t[columna].fillna(False).astype(bool)
+    previo = activo.groupby(t['paciente']).shift(1, fill_value=False)
+    posterior = activo.groupby(t['paciente']).shift(-1, fill_value=False)
+    siguiente = t.groupby('paciente')['fecha_evolucion'].shift(-1)
+
+    # Cada episodio empieza donde se activa y termina donde la próxima evolución
+    # ya no lo tiene: los inicios y los finales quedan en el mismo orden
+    inicios = t.loc[activo & ~previo]
+    finales = activo & ~posterior
+    episodios = pd.DataFrame({
+        'numero_historia': inicios['numero_historia'].to_numpy(),
+        'paciente': inicios['paciente'].to_numpy(),
+        'inicio': inicios['fecha_evolucion'].to_numpy(),
+        'fin': siguiente[finales].to_numpy()
+    })
+    episodios['en_curso'] = episodios['fin'].isna()
+    # Los episodios en curso se miden hasta la última evolución
+    hasta = episodios['fin'].fillna(pd.Series(t.loc[finales, 'fecha_evolucion'].to_numpy()))
+    episodios['dias'] = (hasta - episodios['inicio']).dt.total_seconds() / 86400
+    return episodios
+
+def _curva_glasgow(t, ingreso):
+    """Mediana y cuartiles del Glasgow por día y grupo de gravedad (última medición del día)"""
+    puntos = pd.concat([
+        ingreso.assign(dia=0, glasgow=ingreso['glasgow_ingreso'])[['paciente', 'grupo', 'dia', 'glasgow']],
+        t[['paciente', 'grupo', 'dia', 'glasgow_actual']].rename(columns={'glasgow_actual': 'glasgow'})
+    ], ignore_index=True)
+    puntos = puntos[puntos['dia'] <= DIAS_MAX]
+    puntos = puntos.drop_duplicates(['paciente', 'dia'], keep='last')
+
+    curva = puntos.groupby(['grupo', 'dia'], observed=True)['glasgow'].agg(
+        mediana='median',
+        q1=lambda g: g.quantile(0.25),
+        q3=lambda g: g.quantile(0.75),
+        pacientes='count'
+    ).reset_index()
+    curva = curva[curva['pacientes'] >= MIN_PACIENTES]
+    curva['dia'] = curva['dia'].astype(int)
+    return curva.reset_index(drop=True)
+
+def _curva_mejoria(dias_hasta_mejoria, total):
+    """Porcentaje acumulado de pacientes que mejoraron hasta cada día"""
+    dias = np.arange(DIAS_MAX + 1)
+    conteos = dias_hasta_mejoria.dropna().astype(int).value_counts()
+    acumulado = conteos.reindex(dias, fill_value=0).cumsum()
+    # Mejorías después de DIAS_MAX no entran en la curva
+    return pd.DataFrame({'dia': dias, 'porcentaje': (acumulado.to_numpy() / total * 100) if total else 0.0})
+
+def calcular_trayectorias(evoluciones, pacientes, mejora=MEJORA_GLASGOW):
+    """Calcula el resumen de trayectorias de los pacientes que tienen evoluciones"""
+    t = armar_linea_de_tiempo(evoluciones, pacientes)
+    t['grupo'] = gravedad(t['glasgow_ingreso'])
+
+    # Una fila por paciente con evoluciones
+    ingreso = t.drop_duplicates('paciente')[['numero_historia', 'paciente', 'grupo', 'glasgow_ingreso']]
+    por_paciente = ingreso.set_index('paciente')
+
+    episodios = {}
+    for nombre, columna in SOPORTES.items():
+        episodios[nombre] = intervalos(t, columna)
+        dias = episodios[nombre].groupby('paciente')['dias'].sum()
+        por_paciente[f'dias_{nombre.lower()}'] = dias.reindex(por_paciente.index, fill_value=0.0)
+
+    mejoro = t['glasgow_actual'] >= t['glasgow_ingreso'] + mejora
+    primera = t.loc[mejoro].groupby('paciente')['dia'].min()
+    por_paciente['dias_hasta_mejoria'] = primera.reindex(por_paciente.index).astype(float)
+
+    return ResumenTrayectorias(
+        pacientes=len(por_paciente),
+        evoluciones=len(t),
+        por_paciente=por_paciente.reset_index(drop=True),
+        curva_glasgow=_curva_glasgow(t, ingreso),
+        curva_mejoria=_curva_mejoria(por_paciente['dias_hasta_mejoria'], len(por_paciente)),
+        episodios=episodios
+    )
+
+# Trayectorias por (umbral de mejoría, versión de datos), compartidas entre sesiones
+_trayectorias = memo_por_version(calcular_trayectorias)
+
+def obtener_trayectorias(evoluciones, pacientes, version, mejora=MEJORA_GLASGOW):
+    """Retorna las trayectorias memorizadas para esa versión de datos o las calcula"""
+    return _trayectorias((mejora, version), evoluciones, pacientes, mejora)